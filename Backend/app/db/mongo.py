@@ -29,6 +29,49 @@ async def get_db() -> AsyncIOMotorDatabase:
   return client[MONGODB_DB]
 
 
+# Keyset paging on the log collections sorts by (timestamp, _id), optionally
+# after an equality match on userId.
+LOG_COLLECTIONS = ("ml_predictions", "nlp_analyses", "interactions")
+
+
+async def ensure_indexes() -> None:
+  """Create the indexes the routes rely on (no-op if they already exist)."""
+  db = await get_db()
+  for name in LOG_COLLECTIONS:
+    col = db[name]
+    await col.create_index([("timestamp", -1), ("_id", -1)])
+    await col.create_index([("userId", 1), ("timestamp", -1), ("_id", -1)])
+
+  # Filtered counts on the dashboards (see repository.COUNTS)
+  await db["interactions"].create_index([("isCorrect", 1)])
+  await db["interactions"].create_index([("confusionFlag", 1)])
+  # Covers the whole difficulty-distribution aggregation
+  await db["interactions"].create_index([("difficultyRating", 1)])
+
+  await db["users"].create_index([("email", 1)])
+
+  # Client-generated submit ids, so retried uploads are stored once
+  await db["interactions"].create_index(
+    [("clientId", 1)],
+    unique=True,
+    partialFilterExpression={"clientId": {"$type": "string"}},
+  )
+
+  # Interactions still waiting for background sentiment (feedback_enricher.py)
+  await db["interactions"].create_index(
+    [("sentimentPending", 1), ("timestamp", 1)],
+    partialFilterExpression={"sentimentPending": True},
+  )
+
+  # Running prediction-outcome counters, one doc per (model version, user or None)
+  await db["model_metrics"].create_index([("model_version", 1), ("userId", 1)], unique=True)
+  # Latest counters of any version (globally or per user)
+  await db["model_metrics"].create_index([("userId", 1), ("updated_at", -1)])
+
+  # Approximate-analytics sketches, one doc per (day, module)
+  await db["sketches"].create_index([("day", 1), ("moduleId", 1)])
+
+
 def close_client() -> None:
   global _client
   if _client is not None:
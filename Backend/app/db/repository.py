@@ -0,0 +1,633 @@
+"""
+Named read queries over the Mongo collections (plus the progress-record
+writes).
+
+Route handlers and background services read through these functions instead
+of raw collections. Each query declares the minimal projection, sort and
+limit it needs in a QuerySpec, and every spec is listed in QUERIES (counts in
+COUNTS, aggregation pipelines in AGGREGATIONS) so the index-coverage check
+can explain them all. tests/test_repository_indexes.py runs the check
+against a real server, as does
+
+    python -m app.db.repository --check-indexes
+
+which exits non-zero if any query's winning plan is a collection scan.
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.results import BulkWriteResult, UpdateResult
+
+from .mongo import LOG_COLLECTIONS, close_client, ensure_indexes, get_db
+
+
+class QuerySpec:
+  __slots__ = ("name", "collection", "projection", "sort", "limit", "sample_filter")
+
+  def __init__(
+    self,
+    name: str,
+    collection: str,
+    projection: Optional[Dict[str, int]],
+    sort: Optional[List[Tuple[str, int]]] = None,
+    limit: int = 0,
+    sample_filter: Optional[Dict[str, Any]] = None,
+  ):
+    self.name = name
+    self.collection = collection
+    self.projection = projection
+    self.sort = sort
+    self.limit = limit
+    # Representative filter used by the index-coverage check
+    self.sample_filter = sample_filter or {}
+
+  def find(self, db: AsyncIOMotorDatabase, query: Dict[str, Any]):
+    cursor = db[self.collection].find(query, self.projection)
+    if self.sort:
+      cursor = cursor.sort(self.sort)
+    if self.limit:
+      cursor = cursor.limit(self.limit)
+    return cursor
+
+
+# Fields feature_builder.build_features averages, plus what /next needs to
+# find the learner's place in the module sequence
+FEATURE_FIELDS = (
+  "isCorrect", "timeTaken", "difficultyRating", "focusRating",
+  "attentionScore", "sentimentScore", "confusionFlag",
+)
+RECENT_INTERACTIONS = QuerySpec(
+  "recent_interactions",
+  "interactions",
+  {"_id": 0, **{f: 1 for f in FEATURE_FIELDS}, "activityId": 1, "lessonId": 1},
+  sort=[("timestamp", -1), ("_id", -1)],
+  limit=50,
+  sample_filter={"userId": "sample"},
+)
+
+EARLIER_INTERACTION = QuerySpec(
+  "earlier_interaction",
+  "interactions",
+  {"_id": 1},
+  limit=1,
+  sample_filter={"userId": "sample", "_id": {"$lt": ObjectId("000000000000000000000000")}},
+)
+
+MODEL_ANALYTICS_INTERACTIONS = QuerySpec(
+  "model_analytics_interactions",
+  "interactions",
+  {"_id": 0, "difficultyRating": 1, "isCorrect": 1, "sentimentScore": 1, "confusionFlag": 1},
+  sample_filter={"timestamp": {"$gte": datetime(2000, 1, 1)}},
+)
+
+USER_BY_EMAIL = QuerySpec(
+  "user_by_email",
+  "users",
+  None,
+  limit=1,
+  sample_filter={"email": "sample@example.com"},
+)
+
+USER_PROFILE = QuerySpec(
+  "user_profile",
+  "users",
+  {"neuroFlags": 1, "neuroType": 1},
+  limit=1,
+  sample_filter={"_id": ObjectId("000000000000000000000000")},
+)
+
+INTERACTIONS_BY_CLIENT_ID = QuerySpec(
+  "interactions_by_client_id",
+  "interactions",
+  {"_id": 0, "clientId": 1},
+  # $type matches the partial index's filter, so the index can be used
+  sample_filter={"clientId": {"$in": ["sample"], "$type": "string"}},
+)
+
+# Admin log pages (see log_export.py): newest first, optionally for one user
+LOG_PAGES = {
+  name: QuerySpec(
+    f"{name}_log_page",
+    name,
+    None,
+    sort=[("timestamp", -1), ("_id", -1)],
+    sample_filter={"userId": "sample"},
+  )
+  for name in LOG_COLLECTIONS
+}
+
+USER_PROGRESS = QuerySpec(
+  "user_progress",
+  "user_progress",
+  None,
+  limit=1,
+  sample_filter={"_id": "sample"},
+)
+
+PROGRESS_RECORDS = QuerySpec(
+  "progress_records",
+  "user_progress",
+  None,
+  sample_filter={"_id": {"$in": ["sample"]}},
+)
+
+# Model training (model_trainer.py): every attributed interaction, grouped
+# by user in time order (a reverse walk of the (userId, timestamp, _id) index)
+TRAINING_INTERACTIONS = QuerySpec(
+  "training_interactions",
+  "interactions",
+  {"_id": 0, "userId": 1, "activityId": 1, **{f: 1 for f in FEATURE_FIELDS}},
+  sort=[("userId", -1), ("timestamp", 1), ("_id", 1)],
+  sample_filter={"userId": {"$ne": None}},
+)
+
+# Background sentiment (feedback_enricher.py), on the partial
+# (sentimentPending, timestamp) index
+PENDING_FEEDBACK = QuerySpec(
+  "pending_feedback",
+  "interactions",
+  {"_id": 1, "userId": 1, "feedbackText": 1, "timestamp": 1},
+  sort=[("timestamp", 1)],
+  sample_filter={"sentimentPending": True, "timestamp": {"$lt": datetime(2000, 1, 1)}},
+)
+
+OLDEST_PENDING_FEEDBACK = QuerySpec(
+  "oldest_pending_feedback",
+  "interactions",
+  {"timestamp": 1},
+  sort=[("timestamp", 1)],
+  limit=1,
+  sample_filter={"sentimentPending": True},
+)
+
+# Prediction outcomes (outcome_joiner.py)
+OPEN_PREDICTIONS = QuerySpec(
+  "open_predictions",
+  "ml_predictions",
+  {"userId": 1, "timestamp": 1, "prediction": 1, "model_version": 1},
+  sort=[("timestamp", -1)],
+  sample_filter={"userId": {"$in": ["sample"]}, "actual_outcome": None, "timestamp": {"$gte": datetime(2000, 1, 1)}},
+)
+
+JOINED_PREDICTIONS = QuerySpec(
+  "joined_predictions",
+  "ml_predictions",
+  {"_id": 1},
+  sample_filter={"_id": {"$in": [ObjectId("000000000000000000000000")]}, "outcome_batch": "sample"},
+)
+
+MODEL_COUNTERS = QuerySpec(
+  "model_counters",
+  "model_metrics",
+  None,
+  limit=1,
+  sample_filter={"model_version": "sample", "userId": None},
+)
+
+LATEST_MODEL_COUNTERS = QuerySpec(
+  "latest_model_counters",
+  "model_metrics",
+  None,
+  sort=[("updated_at", -1)],
+  limit=1,
+  sample_filter={"userId": None},
+)
+
+# Approximate analytics (sketches.py), one document per (day, module)
+SKETCH = QuerySpec(
+  "sketch",
+  "sketches",
+  None,
+  limit=1,
+  sample_filter={"_id": "2000-01-01:M1"},
+)
+
+SKETCHES_FOR_DAYS = QuerySpec(
+  "sketches_for_days",
+  "sketches",
+  None,
+  sample_filter={"day": {"$in": ["2000-01-01"]}, "moduleId": "M1"},
+)
+
+# Parquet export (columnar_store.py): one UTC day at a time, oldest first
+EXPORT_DAYS = {
+  name: QuerySpec(
+    f"{name}_export_day",
+    name,
+    None,
+    sort=[("timestamp", 1)],
+    sample_filter={"timestamp": {"$gte": datetime(2000, 1, 1), "$lt": datetime(2000, 1, 2)}},
+  )
+  for name in LOG_COLLECTIONS
+}
+
+OLDEST_LOGS = {
+  name: QuerySpec(f"{name}_oldest", name, {"timestamp": 1}, sort=[("timestamp", 1)], limit=1)
+  for name in LOG_COLLECTIONS
+}
+
+NEWEST_LOG_IDS = {
+  name: QuerySpec(f"{name}_newest_id", name, {"_id": 1}, sort=[("_id", -1)], limit=1)
+  for name in LOG_COLLECTIONS
+}
+
+# Counts are explained with the same machinery (a count plan over the filter)
+COUNTS = {
+  "interactions_by_user": ("interactions", {"userId": "sample"}),
+  "correct_interactions": ("interactions", {"isCorrect": True}),
+  "confused_interactions": ("interactions", {"confusionFlag": True}),
+  "pending_feedback": ("interactions", {"sentimentPending": True}),
+}
+
+def progress_totals_pipeline(user_ids: List[str]) -> List[Dict[str, Any]]:
+  """Per user: attempts, correct, correctly answered activityIds and the newest _id."""
+  return [
+    {"$match": {"userId": {"$in": user_ids}}},
+    {"$group": {
+      "_id": "$userId",
+      "attempts": {"$sum": 1},
+      "correct": {"$sum": {"$cond": ["$isCorrect", 1, 0]}},
+      "activities": {"$addToSet": {"$cond": ["$isCorrect", "$activityId", None]}},
+      "newest": {"$max": "$_id"},
+    }},
+  ]
+
+
+def accuracy_by_day_pipeline(since: datetime, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+  """Per UTC day since `since` (of one user, or everyone): total and correct, oldest day first."""
+  query: Dict[str, Any] = {"timestamp": {"$gte": since}}
+  if user_id:
+    query["userId"] = user_id
+  return [
+    {"$match": query},
+    {"$group": {
+      "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+      "total": {"$sum": 1},
+      "correct": {"$sum": {"$cond": [{"$eq": ["$isCorrect", True]}, 1, 0]}},
+    }},
+    {"$sort": {"_id": 1}},
+  ]
+
+
+def _every_interaction_by_user() -> Dict[str, Any]:
+  # No filter to plan with: sorting on userId walks the (userId, timestamp,
+  # _id) index instead of scanning the collection
+  return {"$sort": {"userId": 1}}
+
+
+def user_stats_pipeline() -> List[Dict[str, Any]]:
+  """Per user: activity count, correct answers, averages and last activity, busiest first."""
+  return [
+    _every_interaction_by_user(),
+    {"$group": {
+      "_id": "$userId",
+      "total_activities": {"$sum": 1},
+      "correct_answers": {"$sum": {"$cond": [{"$eq": ["$isCorrect", True]}, 1, 0]}},
+      "avg_time": {"$avg": "$timeTaken"},
+      "avg_difficulty": {"$avg": "$difficultyRating"},
+      "avg_focus": {"$avg": "$focusRating"},
+      "last_activity": {"$max": "$timestamp"},
+    }},
+    {"$sort": {"total_activities": -1}},
+  ]
+
+
+def user_totals_pipeline(since: Optional[datetime]) -> List[Dict[str, Any]]:
+  """
+  Per user sums and counts (so they add up across sources) of the
+  interactions since `since`, or of all of them.
+  """
+  def counted(field: str):
+    return {"$sum": {"$cond": [{"$isNumber": f"${field}"}, 1, 0]}}
+
+  first = {"$match": {"timestamp": {"$gte": since}}} if since is not None else _every_interaction_by_user()
+  return [
+    first,
+    {"$group": {
+      "_id": "$userId",
+      "total": {"$sum": 1},
+      "correct": {"$sum": {"$cond": [{"$eq": ["$isCorrect", True]}, 1, 0]}},
+      "time_sum": {"$sum": "$timeTaken"},
+      "time_n": counted("timeTaken"),
+      "difficulty_sum": {"$sum": "$difficultyRating"},
+      "difficulty_n": counted("difficultyRating"),
+      "focus_sum": {"$sum": "$focusRating"},
+      "focus_n": counted("focusRating"),
+      "last_activity": {"$max": "$timestamp"},
+    }},
+  ]
+
+
+def difficulty_distribution_pipeline() -> List[Dict[str, Any]]:
+  """Interactions per difficultyRating, counted from the difficultyRating index alone."""
+  return [
+    {"$sort": {"difficultyRating": 1}},
+    {"$group": {"_id": "$difficultyRating", "count": {"$sum": 1}}},
+  ]
+
+
+def days_inserted_since_pipeline(after_id: ObjectId, before: datetime) -> List[Dict[str, Any]]:
+  """UTC days (YYYY-MM-DD) before `before` that got documents with an _id after `after_id`."""
+  return [
+    {"$match": {"_id": {"$gt": after_id}, "timestamp": {"$lt": before}}},
+    {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}}},
+  ]
+
+
+# Aggregations are explained too (their first stage must use an index)
+AGGREGATIONS = {
+  "progress_totals": ("interactions", progress_totals_pipeline(["sample"])),
+  "accuracy_by_day": ("interactions", accuracy_by_day_pipeline(datetime(2000, 1, 1), "sample")),
+  "accuracy_by_day_all_users": ("interactions", accuracy_by_day_pipeline(datetime(2000, 1, 1))),
+  "user_stats": ("interactions", user_stats_pipeline()),
+  "user_totals_since": ("interactions", user_totals_pipeline(datetime(2000, 1, 1))),
+  "user_totals": ("interactions", user_totals_pipeline(None)),
+  "difficulty_distribution": ("interactions", difficulty_distribution_pipeline()),
+  **{
+    f"{name}_days_inserted_since": (
+      name, days_inserted_since_pipeline(ObjectId("000000000000000000000000"), datetime(2000, 1, 1))
+    )
+    for name in LOG_COLLECTIONS
+  },
+}
+
+QUERIES = [
+  RECENT_INTERACTIONS, EARLIER_INTERACTION, MODEL_ANALYTICS_INTERACTIONS, INTERACTIONS_BY_CLIENT_ID,
+  TRAINING_INTERACTIONS, PENDING_FEEDBACK, OLDEST_PENDING_FEEDBACK,
+  OPEN_PREDICTIONS, JOINED_PREDICTIONS, MODEL_COUNTERS, LATEST_MODEL_COUNTERS,
+  SKETCH, SKETCHES_FOR_DAYS,
+  *LOG_PAGES.values(), *EXPORT_DAYS.values(), *OLDEST_LOGS.values(), *NEWEST_LOG_IDS.values(),
+  USER_BY_EMAIL, USER_PROFILE, USER_PROGRESS, PROGRESS_RECORDS,
+]
+
+
+# ------------- QUERIES -------------
+
+async def recent_interactions(db: AsyncIOMotorDatabase, user_id: Optional[str]) -> List[Dict[str, Any]]:
+  """The latest interactions (of one user, or everyone) with just the feature fields."""
+  query = {"userId": user_id} if user_id else {}
+  return await RECENT_INTERACTIONS.find(db, query).to_list(RECENT_INTERACTIONS.limit)
+
+
+def progress_totals(db: AsyncIOMotorDatabase, user_ids: List[str]):
+  """One aggregation over the interactions of many users, grouped by userId."""
+  return db["interactions"].aggregate(progress_totals_pipeline(user_ids))
+
+
+async def has_earlier_interaction(db: AsyncIOMotorDatabase, user_id: str, before: ObjectId) -> bool:
+  """Whether the user stored any interaction before the one with _id `before`."""
+  query = {"userId": user_id, "_id": {"$lt": before}}
+  return await db[EARLIER_INTERACTION.collection].find_one(query, EARLIER_INTERACTION.projection) is not None
+
+
+async def model_analytics_interactions(
+  db: AsyncIOMotorDatabase, since: datetime, user_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+  query: Dict[str, Any] = {"timestamp": {"$gte": since}}
+  if user_id:
+    query["userId"] = user_id
+  return await MODEL_ANALYTICS_INTERACTIONS.find(db, query).to_list(None)
+
+
+async def user_by_email(db: AsyncIOMotorDatabase, email: str) -> Optional[Dict[str, Any]]:
+  return await db[USER_BY_EMAIL.collection].find_one({"email": email}, USER_BY_EMAIL.projection)
+
+
+async def user_profile(db: AsyncIOMotorDatabase, user_id: ObjectId) -> Optional[Dict[str, Any]]:
+  """Just the fields requests personalise on, by user _id."""
+  return await db[USER_PROFILE.collection].find_one({"_id": user_id}, USER_PROFILE.projection)
+
+
+async def stored_client_ids(db: AsyncIOMotorDatabase, client_ids: List[str]) -> Set[str]:
+  """Which of these submit clientIds are already stored."""
+  query = {"clientId": {"$in": client_ids, "$type": "string"}}
+  return {doc["clientId"] async for doc in INTERACTIONS_BY_CLIENT_ID.find(db, query)}
+
+
+def log_collection(db: AsyncIOMotorDatabase, name: str) -> AsyncIOMotorCollection:
+  """A log collection for keyset paging in LOG_PAGES order (KeyError if not one)."""
+  return db[LOG_PAGES[name].collection]
+
+
+async def user_progress(db: AsyncIOMotorDatabase, user_id: str) -> Optional[Dict[str, Any]]:
+  return await db[USER_PROGRESS.collection].find_one({"_id": user_id}, USER_PROGRESS.projection)
+
+
+def progress_records(db: AsyncIOMotorDatabase, user_ids: List[str]):
+  return PROGRESS_RECORDS.find(db, {"_id": {"$in": user_ids}})
+
+
+def training_interactions(db: AsyncIOMotorDatabase):
+  """Every interaction with a userId, grouped by user, oldest first within each."""
+  return TRAINING_INTERACTIONS.find(db, {"userId": {"$ne": None}})
+
+
+def pending_feedback(db: AsyncIOMotorDatabase, before: datetime, limit: int):
+  """The oldest interactions still waiting for sentiment, stored before `before`."""
+  return PENDING_FEEDBACK.find(db, {"sentimentPending": True, "timestamp": {"$lt": before}}).limit(limit)
+
+
+async def oldest_pending_feedback(db: AsyncIOMotorDatabase) -> Optional[Dict[str, Any]]:
+  cursor = OLDEST_PENDING_FEEDBACK.find(db, {"sentimentPending": True})
+  docs = await cursor.to_list(OLDEST_PENDING_FEEDBACK.limit)
+  return docs[0] if docs else None
+
+
+def open_predictions(db: AsyncIOMotorDatabase, user_ids: List[str], since: datetime):
+  """Predictions for these users since `since` still without an outcome, newest first."""
+  query = {"userId": {"$in": user_ids}, "actual_outcome": None, "timestamp": {"$gte": since}}
+  return OPEN_PREDICTIONS.find(db, query)
+
+
+async def joined_prediction_ids(db: AsyncIOMotorDatabase, ids: List[Any], batch_id: str) -> Set[Any]:
+  """Which of these predictions got their outcome from join batch `batch_id`."""
+  query = {"_id": {"$in": ids}, "outcome_batch": batch_id}
+  return {doc["_id"] async for doc in JOINED_PREDICTIONS.find(db, query)}
+
+
+async def model_counters(
+  db: AsyncIOMotorDatabase, model_version: str, user_id: Optional[str]
+) -> Optional[Dict[str, Any]]:
+  query = {"model_version": model_version, "userId": user_id}
+  return await db[MODEL_COUNTERS.collection].find_one(query, MODEL_COUNTERS.projection)
+
+
+async def latest_model_counters(db: AsyncIOMotorDatabase, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+  """The most recently updated counters of any model version, globally (None) or for one user."""
+  return await db[LATEST_MODEL_COUNTERS.collection].find_one(
+    {"userId": user_id}, LATEST_MODEL_COUNTERS.projection, sort=LATEST_MODEL_COUNTERS.sort
+  )
+
+
+async def sketch(db: AsyncIOMotorDatabase, doc_id: str) -> Optional[Dict[str, Any]]:
+  return await db[SKETCH.collection].find_one({"_id": doc_id}, SKETCH.projection)
+
+
+def sketches_for_days(db: AsyncIOMotorDatabase, days: List[str], module: Optional[str] = None):
+  query: Dict[str, Any] = {"day": {"$in": days}}
+  if module:
+    query["moduleId"] = module
+  return SKETCHES_FOR_DAYS.find(db, query)
+
+
+def export_day(db: AsyncIOMotorDatabase, collection: str, start: datetime, end: datetime):
+  """A log collection's documents with start <= timestamp < end, oldest first."""
+  return EXPORT_DAYS[collection].find(db, {"timestamp": {"$gte": start, "$lt": end}})
+
+
+async def oldest_log(db: AsyncIOMotorDatabase, collection: str) -> Optional[Dict[str, Any]]:
+  spec = OLDEST_LOGS[collection]
+  docs = await spec.find(db, {}).to_list(spec.limit)
+  return docs[0] if docs else None
+
+
+async def newest_log_id(db: AsyncIOMotorDatabase, collection: str) -> Optional[ObjectId]:
+  spec = NEWEST_LOG_IDS[collection]
+  docs = await spec.find(db, {}).to_list(spec.limit)
+  return docs[0]["_id"] if docs else None
+
+
+async def days_inserted_since(
+  db: AsyncIOMotorDatabase, collection: str, after_id: ObjectId, before: datetime
+) -> List[str]:
+  pipeline = days_inserted_since_pipeline(after_id, before)
+  return sorted([row["_id"] async for row in db[collection].aggregate(pipeline)])
+
+
+def accuracy_by_day(db: AsyncIOMotorDatabase, since: datetime, user_id: Optional[str] = None):
+  return db["interactions"].aggregate(accuracy_by_day_pipeline(since, user_id))
+
+
+def user_stats(db: AsyncIOMotorDatabase):
+  return db["interactions"].aggregate(user_stats_pipeline())
+
+
+def user_totals(db: AsyncIOMotorDatabase, since: Optional[datetime]):
+  return db["interactions"].aggregate(user_totals_pipeline(since))
+
+
+def difficulty_distribution(db: AsyncIOMotorDatabase):
+  return db["interactions"].aggregate(difficulty_distribution_pipeline())
+
+
+async def count_pending_feedback(db: AsyncIOMotorDatabase) -> int:
+  return await db["interactions"].count_documents({"sentimentPending": True})
+
+
+async def collection_size(db: AsyncIOMotorDatabase, collection: str) -> int:
+  """Document count from collection metadata (no scan)."""
+  return await db[collection].estimated_document_count()
+
+
+async def count_interactions(
+  db: AsyncIOMotorDatabase,
+  user_id: Optional[str] = None,
+  correct: Optional[bool] = None,
+  confused: Optional[bool] = None,
+) -> int:
+  """
+  Count interactions. The unfiltered total comes from collection metadata
+  instead of a scan.
+  """
+  query: Dict[str, Any] = {}
+  if user_id:
+    query["userId"] = user_id
+  if correct is not None:
+    query["isCorrect"] = correct
+  if confused is not None:
+    query["confusionFlag"] = confused
+  if not query:
+    return await collection_size(db, "interactions")
+  return await db["interactions"].count_documents(query)
+
+
+# ------------- PROGRESS RECORD WRITES -------------
+
+async def update_progress(
+  db: AsyncIOMotorDatabase, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False
+) -> UpdateResult:
+  return await db[USER_PROGRESS.collection].update_one(query, update, upsert=upsert)
+
+
+async def bulk_write_progress(db: AsyncIOMotorDatabase, requests: List[Any]) -> BulkWriteResult:
+  """Unordered bulk write of progress-record operations."""
+  return await db[USER_PROGRESS.collection].bulk_write(requests, ordered=False)
+
+
+# ------------- INDEX COVERAGE CHECK -------------
+
+def _stages(plan: Dict[str, Any]):
+  yield plan.get("stage")
+  for key in ("inputStage", "queryPlan"):
+    if key in plan:
+      yield from _stages(plan[key])
+  for child in plan.get("inputStages", []):
+    yield from _stages(child)
+
+
+def _collection_scans(explain: Dict[str, Any]) -> bool:
+  if "queryPlanner" not in explain and explain.get("stages"):
+    # Aggregations not pushed down into the query engine nest the plan in $cursor
+    explain = explain["stages"][0].get("$cursor", {})
+  winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+  return "COLLSCAN" in set(_stages(winning))
+
+
+async def check_index_coverage(db: AsyncIOMotorDatabase) -> List[str]:
+  """Explain every registered query. Returns the names of those that scan the collection."""
+  uncovered = []
+  for spec in QUERIES:
+    command: Dict[str, Any] = {"find": spec.collection, "filter": spec.sample_filter}
+    if spec.projection:
+      command["projection"] = spec.projection
+    if spec.sort:
+      command["sort"] = dict(spec.sort)
+    if spec.limit:
+      command["limit"] = spec.limit
+    explain = await db.command("explain", command, verbosity="queryPlanner")
+    if _collection_scans(explain):
+      uncovered.append(spec.name)
+
+  for name, (collection, query) in COUNTS.items():
+    explain = await db.command("explain", {"count": collection, "query": query}, verbosity="queryPlanner")
+    if _collection_scans(explain):
+      uncovered.append(name)
+
+  for name, (collection, pipeline) in AGGREGATIONS.items():
+    explain = await db.command(
+      "explain", {"aggregate": collection, "pipeline": pipeline, "cursor": {}}, verbosity="queryPlanner"
+    )
+    if _collection_scans(explain):
+      uncovered.append(name)
+  return uncovered
+
+
+async def _main_check() -> int:
+  await ensure_indexes()
+  db = await get_db()
+  try:
+    uncovered = await check_index_coverage(db)
+  finally:
+    close_client()
+  total = len(QUERIES) + len(COUNTS) + len(AGGREGATIONS)
+  if uncovered:
+    print(f"❌ {len(uncovered)}/{total} queries are not covered by an index: {', '.join(uncovered)}")
+    return 1
+  print(f"✅ All {total} queries are covered by an index")
+  return 0
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Repository query utilities")
+  parser.add_argument("--check-indexes", action="store_true", help="Fail if any query plan is a collection scan")
+  args = parser.parse_args()
+  if not args.check_indexes:
+    parser.print_help()
+    sys.exit(0)
+  sys.exit(asyncio.run(_main_check()))
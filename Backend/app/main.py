@@ -1,12 +1,21 @@
+import asyncio
 from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 
 from .routes import activity, auth, progress, rephrase, attention, analytics, admin, tts
-from .db.mongo import close_client
+from .db.mongo import close_client, ensure_indexes, get_db
+from .services import columnar_store, feedback_enricher, live_feed, metrics, ml_engine
+from .services.outcome_joiner import joiner
+from .services.password_hasher import password_hasher
+from .services.sketches import sketch_store
+from .services.speech_assets import SPEECH_ASSETS_DIR, speech_manifest
+from .services.tts_engine import tts_pool
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,13 +23,46 @@ load_dotenv()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-  # Nothing to start on boot for now; close DB client on shutdown.
+  try:
+    await ensure_indexes()
+  except Exception as e:
+    # Don't block startup if Mongo isn't reachable yet; queries still work unindexed.
+    print(f"Warning: could not create indexes: {e}")
+  try:
+    await ml_engine.preload()
+  except Exception as e:
+    # /next loads them on first use instead
+    print(f"⚠️ Could not load models at startup: {e}")
+  if speech_manifest.load():
+    print(f"Speech assets: {len(speech_manifest.assets)} utterances")
+
+  db = await get_db()
+  background = [
+    asyncio.create_task(joiner.run(db)),
+    asyncio.create_task(sketch_store.run(db)),
+    asyncio.create_task(ml_engine.registry.run_watch()),
+    asyncio.create_task(tts_pool.start()),
+  ]
+  if not feedback_enricher.inline_enabled():
+    background.append(asyncio.create_task(feedback_enricher.enricher.run(db)))
+  if live_feed.LIVE_FEED_SOURCE == "changestream":
+    background.append(asyncio.create_task(live_feed.run_change_stream(db)))
+  if columnar_store.EXPORT_INTERVAL_MINUTES > 0 and columnar_store.PYARROW_AVAILABLE:
+    background.append(asyncio.create_task(columnar_store.run_periodic_export(db)))
+
   yield
+
+  for task in background:
+    task.cancel()
+  await asyncio.gather(*background, return_exceptions=True)
+  password_hasher.shutdown()
+  tts_pool.shutdown()
   close_client()
 
 
 app = FastAPI(title="Neurodiverse Learning Backend", lifespan=lifespan)
 
+app.add_middleware(metrics.MetricsMiddleware)
 app.add_middleware(
   CORSMiddleware,
   allow_origins=["*"],
@@ -38,8 +80,17 @@ app.include_router(analytics.router, prefix="/api", tags=["analytics"])
 app.include_router(admin.router, prefix="/api", tags=["admin"])
 app.include_router(tts.router, prefix="/api", tags=["tts"])
 
+# Pre-rendered catalog speech (python -m app.services.speech_assets)
+if SPEECH_ASSETS_DIR.is_dir():
+  app.mount("/static/speech", StaticFiles(directory=SPEECH_ASSETS_DIR), name="speech")
+
 
 @app.get("/")
 async def root():
   return {"message": "backend running"}
 
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+  return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
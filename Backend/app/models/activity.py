@@ -32,6 +32,7 @@ class ActivityOption(BaseModel):
     label: str
     isCorrect: bool
     ttsText: Optional[str] = None
+    ttsAudioUrl: Optional[str] = None  # Pre-rendered ttsText, if built
     imageUrl: Optional[str] = None
     imageAlt: Optional[str] = None
     tags: Optional[List[str]] = None
@@ -56,6 +57,7 @@ class ActivityItem(BaseModel):
     # What the student sees / hears
     instruction: str
     instructionTts: Optional[str] = None
+    instructionAudioUrl: Optional[str] = None  # Pre-rendered instructionTts, if built
     stimulusImageUrl: Optional[str] = None
     stimulusImageAlt: Optional[str] = None
     stimulusEmoji: Optional[str] = None
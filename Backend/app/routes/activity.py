@@ -1,13 +1,24 @@
-from datetime import datetime
-from typing import Optional
+import asyncio
+from datetime import datetime, timezone
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
+from ..db import repository
 from ..db.mongo import get_db
-from ..services import ml_engine, nlp_engine, feature_builder
-from ..services.model_logger import log_ml_prediction, log_nlp_analysis
+from ..services import ml_engine, nlp_engine, feature_builder, feedback_enricher, metrics
+from ..services.model_logger import log_ml_prediction, log_nlp_analyses, log_nlp_analysis
+from ..services.live_feed import publish_local
+from ..services.outcome_joiner import joiner
+from ..services.sketches import sketch_store
+from ..services.response_cache import response_cache
+from ..services.progress_store import record_interaction, record_interactions
+from ..services.group_commit import group_commit
+from ..services.sessions import UserProfile, optional_user, resolve_user_id
+from ..services.speech_assets import speech_manifest
 
 # Try to import new ActivityItem models, fallback to old format if not available
 try:
@@ -123,6 +134,22 @@ class SubmitRequest(BaseModel):
   breakReason: Optional[str] = None
   consecutiveWrong: Optional[int] = None
   wrongInLast5: Optional[int] = None
+  # Client-generated id; a retried submit with the same id is stored once
+  clientId: Optional[str] = None
+
+
+class BatchSubmitItem(SubmitRequest):
+  clientId: str
+  # When the answer was given (offline clients upload later); defaults to now
+  answeredAt: Optional[datetime] = None
+
+
+class BatchSubmitRequest(BaseModel):
+  items: List[BatchSubmitItem]
+
+
+SUBMIT_BATCH_MAX_ITEMS = 500
+DUPLICATE_KEY = 11000
 
 
 @router.get("/next")
@@ -130,6 +157,7 @@ async def get_next_activity(
     userId: Optional[str] = None,
     moduleId: Optional[str] = None,  # Filter by module: M1, M2, or M3 (or module-1, module-2, module-3)
     db: AsyncIOMotorDatabase = Depends(get_db),
+    user: Optional[UserProfile] = Depends(optional_user),
 ):
     """
     Get next activity using ML recommendation.
@@ -138,26 +166,39 @@ async def get_next_activity(
     Args:
         userId: Optional user ID for personalization
         moduleId: Optional module filter (M1, M2, M3). If provided, returns activities only from that module.
+
+    With a session token the token's user is used and userId may be omitted.
     """
-    interactions_col = db["interactions"]
+    userId = resolve_user_id(user, userId)
 
     # 1) Get last N interactions for this user (or all if no user)
-    query = {"userId": userId} if userId else {}
-    logs = await interactions_col.find(query).sort("timestamp", -1).to_list(50)
+    with metrics.span("next.fetch_interactions"):
+        logs = await repository.recent_interactions(db, userId)
 
     # 2) Build feature vector from logs
-    features = feature_builder.build_features(logs)
+    with metrics.span("next.build_features"):
+        features = feature_builder.build_features(logs)
 
     # 3) Ask ML engine what to do next
-    reco = ml_engine.recommend_next(features)  # uses RandomForest/MLP later
+    with metrics.span("next.recommend"):
+        reco = ml_engine.recommend_next(features)  # uses RandomForest/MLP later
     
     # Log ML prediction for performance tracking
-    await log_ml_prediction(
-        db,
-        userId,
-        features,
-        {"topic": reco.topic, "difficulty": reco.difficulty, "modality": reco.modality}
-    )
+    with metrics.span("next.log_prediction"):
+        await log_ml_prediction(
+            db,
+            userId,
+            features,
+            {"topic": reco.topic, "difficulty": reco.difficulty, "modality": reco.modality},
+            model_version=reco.model_version,
+        )
+
+    with metrics.span("next.select_activity"):
+        return await _select_activity(db, userId, moduleId, logs, reco)
+
+
+async def _select_activity(db: AsyncIOMotorDatabase, userId: Optional[str], moduleId: Optional[str], logs, reco) -> dict:
+    """Pick the catalog activity (or legacy question) for a recommendation."""
 
     # 4) Try to use new ActivityItem schema if available
     if USE_NEW_SCHEMA:
@@ -258,7 +299,8 @@ async def get_next_activity(
 
             # Convert Pydantic model to dict for JSON response
             if chosen:
-                return chosen.dict() if hasattr(chosen, 'dict') else chosen.model_dump()
+                payload = chosen.dict() if hasattr(chosen, 'dict') else chosen.model_dump()
+                return speech_manifest.annotate(payload)
         except Exception as e:
             print(f"Error using new schema, falling back to legacy: {e}")
             import traceback
@@ -278,7 +320,7 @@ async def get_next_activity(
 
     # fallback if nothing matches exactly
     if chosen is None:
-        count = await interactions_col.count_documents(query)
+        count = await repository.count_interactions(db, user_id=userId)
         idx = count % len(QUESTIONS)
         chosen = QUESTIONS[idx]
 
@@ -296,30 +338,162 @@ async def get_next_activity(
 async def submit_activity(
     payload: SubmitRequest,
     db: AsyncIOMotorDatabase = Depends(get_db),
+    user: Optional[UserProfile] = Depends(optional_user),
 ):
-    interactions = db["interactions"]
+    payload.userId = resolve_user_id(user, payload.userId)
     # Use model_dump() for Pydantic v2, fallback to dict() for v1
     doc = payload.model_dump() if hasattr(payload, 'model_dump') else payload.dict()
     doc["timestamp"] = datetime.utcnow()
 
-    # 🔹 Run pretrained NLP (or simple version) on feedback text
-    if payload.feedbackText:
-        sentiment_score, confusion_flag = nlp_engine.analyze_feedback(
-            payload.feedbackText
-        )
+    # 🔹 Sentiment on feedback text: scored in the background by default
+    # (see feedback_enricher.py), or here before the insert in inline mode
+    if payload.feedbackText and not feedback_enricher.inline_enabled():
+        doc[feedback_enricher.PENDING_FIELD] = True
+    elif payload.feedbackText:
+        with metrics.span("submit.analyze_feedback"):
+            sentiment_score, confusion_flag = nlp_engine.analyze_feedback(
+                payload.feedbackText
+            )
         doc["sentimentScore"] = sentiment_score
         doc["confusionFlag"] = confusion_flag
         
         # Log NLP analysis for performance tracking
-        await log_nlp_analysis(
-            db,
-            payload.userId,
-            payload.feedbackText,
-            sentiment_score,
-            confusion_flag
-        )
+        with metrics.span("submit.log_nlp"):
+            await log_nlp_analysis(
+                db,
+                payload.userId,
+                payload.feedbackText,
+                sentiment_score,
+                confusion_flag
+            )
 
-    await interactions.insert_one(doc)
+    with metrics.span("submit.insert"):
+        # Shares an insert_many with concurrent submits
+        try:
+            await group_commit.insert(db, "interactions", doc)
+        except (DuplicateKeyError, BulkWriteError) as e:
+            if payload.clientId and _is_duplicate_key(e):
+                # A retry of a submit that was already stored
+                return {"success": True, "duplicate": True}
+            raise
+    with metrics.span("submit.record_progress"):
+        await record_interaction(db, doc)
+    with metrics.span("submit.fanout"):
+        _after_interaction_written(doc)
+        if doc.get(feedback_enricher.PENDING_FIELD):
+            feedback_enricher.enricher.enqueue(doc)
 
     return {"success": True}
 
+
+@router.post("/submit/batch")
+async def submit_activity_batch(
+    payload: BatchSubmitRequest,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    user: Optional[UserProfile] = Depends(optional_user),
+):
+    """
+    Store answers queued by an offline client in one round trip.
+
+    Items are written in order with one unordered insert_many. Items whose
+    clientId is already stored (a retried upload) or repeated within the
+    batch are reported as "duplicate" and not written again. Feedback texts
+    are scored together in one sentiment batch.
+    """
+    if len(payload.items) > SUBMIT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {SUBMIT_BATCH_MAX_ITEMS} items per batch")
+    for item in payload.items:
+        item.userId = resolve_user_id(user, item.userId)
+
+    now = datetime.utcnow()
+    statuses: List[dict] = [{"clientId": item.clientId, "status": "created"} for item in payload.items]
+
+    existing = await repository.stored_client_ids(db, [item.clientId for item in payload.items])
+
+    docs: List[dict] = []
+    positions: List[int] = []  # docs[i] is payload.items[positions[i]]
+    seen = set()
+    for position, item in enumerate(payload.items):
+        if item.clientId in existing or item.clientId in seen:
+            statuses[position]["status"] = "duplicate"
+            continue
+        seen.add(item.clientId)
+        doc = item.model_dump() if hasattr(item, 'model_dump') else item.dict()
+        answered_at = doc.pop("answeredAt", None)
+        doc["timestamp"] = min(_naive_utc(answered_at), now) if answered_at else now
+        docs.append(doc)
+        positions.append(position)
+
+    # 🔹 One sentiment batch for every feedback text in the upload
+    scored = [doc for doc in docs if doc.get("feedbackText")]
+    if scored:
+        with metrics.span("submit_batch.analyze_feedback"):
+            scores = await asyncio.to_thread(
+                nlp_engine.analyze_feedback_batch, [doc["feedbackText"] for doc in scored]
+            )
+        for doc, (sentiment_score, confusion_flag) in zip(scored, scores):
+            doc["sentimentScore"] = sentiment_score
+            doc["confusionFlag"] = confusion_flag
+
+    failed = set()
+    if docs:
+        with metrics.span("submit_batch.insert"):
+            try:
+                await db["interactions"].insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                # Unordered: everything except the reported indexes was written
+                for error in e.details.get("writeErrors", []):
+                    index = error["index"]
+                    failed.add(index)
+                    status = statuses[positions[index]]
+                    if error.get("code") == DUPLICATE_KEY:
+                        # Raced with another upload of the same item
+                        status["status"] = "duplicate"
+                    else:
+                        status["status"] = "error"
+                        status["error"] = error.get("errmsg", "write failed")
+
+    created = [doc for i, doc in enumerate(docs) if i not in failed]
+    if created:
+        with metrics.span("submit_batch.record_progress"):
+            await record_interactions(db, created)
+        await log_nlp_analyses(db, [
+            {
+                "userId": doc.get("userId"),
+                "text": doc["feedbackText"],
+                "sentiment_score": doc["sentimentScore"],
+                "confusion_flag": doc["confusionFlag"],
+            }
+            for doc in created
+            if doc.get("feedbackText")
+        ])
+        for doc in created:
+            _after_interaction_written(doc)
+
+    counts = {"created": 0, "duplicate": 0, "error": 0}
+    for status in statuses:
+        counts[status["status"]] += 1
+    return {"success": counts["error"] == 0, **counts, "results": statuses}
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """Stored timestamps are naive UTC, like datetime.utcnow()."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _is_duplicate_key(error: Exception) -> bool:
+    if isinstance(error, DuplicateKeyError):
+        return True
+    write_errors = error.details.get("writeErrors", []) if isinstance(error, BulkWriteError) else []
+    return bool(write_errors) and all(e.get("code") == DUPLICATE_KEY for e in write_errors)
+
+
+def _after_interaction_written(doc: dict) -> None:
+    """Fan a stored interaction out to the live feed, outcome joiner, sketches and caches."""
+    publish_local("interactions", doc)
+    joiner.enqueue(doc)
+    sketch_store.record(doc)
+    response_cache.bump("interactions")
+
@@ -3,128 +3,184 @@ Admin analytics endpoint for monitoring ML/NLP model performance
 Provides detailed logs, user-based analytics, and visualization data
 """
 
-from typing import Optional, List, Dict, Any
+import asyncio
+from collections import defaultdict
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from ..db import repository
 from ..db.mongo import get_db
+from ..services import columnar_store, decision_table, ml_engine
+from ..services.feedback_enricher import enricher
+from ..services.model_registry import ModelRegistryError, UnknownModelVersion
+from ..services.live_feed import hub
+from ..services.response_cache import response_cache
+from ..services.log_export import build_projection, fetch_page, stream_ndjson
 
 router = APIRouter()
 
 
+MAX_PAGE_SIZE = 500
+DEFAULT_PAGE_SIZE = 50
+
+
+async def _log_response(
+    col_name: str,
+    query: Dict[str, Any],
+    result_key: str,
+    limit: Optional[int],
+    cursor: Optional[str],
+    fields: Optional[str],
+    include: Optional[str],
+    format: str,
+    gzip: bool,
+    db: AsyncIOMotorDatabase,
+    default_limit: int = DEFAULT_PAGE_SIZE,
+):
+    """
+    Shared body for the log endpoints.
+    JSON mode returns one keyset page; ndjson mode streams the whole match.
+    """
+    col = repository.log_collection(db, col_name)
+    projection = build_projection(col_name, fields, include)
+
+    if format == "ndjson":
+        body = stream_ndjson(col, query, projection, limit=limit, cursor=cursor, gzip=gzip)
+        filename = f"{col_name}.ndjson" + (".gz" if gzip else "")
+        return StreamingResponse(
+            body,
+            media_type="application/gzip" if gzip else "application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+        )
+
+    page_size = min(limit or default_limit, MAX_PAGE_SIZE)
+    page = await fetch_page(col, query, projection, page_size, cursor)
+    return {
+        "total": len(page["docs"]),
+        result_key: page["docs"],
+        "next_cursor": page["next_cursor"],
+    }
+
+
 @router.get("/admin/ml-logs")
 async def get_ml_logs(
     userId: Optional[str] = Query(None, description="Filter by user ID"),
-    limit: int = Query(50, description="Number of logs to return"),
+    limit: Optional[int] = Query(None, ge=1, description="Page size (json, max 500) or export cap (ndjson)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    include: Optional[str] = Query(None, description="Heavy fields to include, e.g. 'features'"),
+    format: Literal["json", "ndjson"] = Query("json"),
+    gzip: bool = Query(False, description="Gzip the ndjson export"),
     db: AsyncIOMotorDatabase = Depends(get_db),
 ):
     """
     Get ML model prediction logs with user filtering.
     Returns detailed prediction data for monitoring.
     """
-    predictions_col = db["ml_predictions"]
-    
     query = {}
     if userId:
         query["userId"] = userId
-    
-    # Get predictions sorted by timestamp (newest first)
-    cursor = predictions_col.find(query).sort("timestamp", -1).limit(limit)
-    predictions = await cursor.to_list(length=limit)
-    
-    # Convert ObjectId to string
-    for pred in predictions:
-        pred["_id"] = str(pred["_id"])
-        if "timestamp" in pred:
-            pred["timestamp"] = pred["timestamp"].isoformat()
-    
-    return {
-        "total": len(predictions),
-        "logs": predictions
-    }
+
+    return await _log_response(
+        "ml_predictions", query, "logs", limit, cursor, fields, include, format, gzip, db
+    )
 
 
 @router.get("/admin/nlp-logs")
 async def get_nlp_logs(
     userId: Optional[str] = Query(None, description="Filter by user ID"),
-    limit: int = Query(50, description="Number of logs to return"),
+    limit: Optional[int] = Query(None, ge=1, description="Page size (json, max 500) or export cap (ndjson)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    include: Optional[str] = Query(None, description="Heavy fields to include"),
+    format: Literal["json", "ndjson"] = Query("json"),
+    gzip: bool = Query(False, description="Gzip the ndjson export"),
     db: AsyncIOMotorDatabase = Depends(get_db),
 ):
     """
     Get NLP analysis logs with user filtering.
     Returns sentiment analysis and confusion detection data.
     """
-    nlp_col = db["nlp_analyses"]
-    
     query = {}
     if userId:
         query["userId"] = userId
-    
-    cursor = nlp_col.find(query).sort("timestamp", -1).limit(limit)
-    analyses = await cursor.to_list(length=limit)
-    
-    for analysis in analyses:
-        analysis["_id"] = str(analysis["_id"])
-        if "timestamp" in analysis:
-            analysis["timestamp"] = analysis["timestamp"].isoformat()
-    
-    return {
-        "total": len(analyses),
-        "logs": analyses
-    }
+
+    return await _log_response(
+        "nlp_analyses", query, "logs", limit, cursor, fields, include, format, gzip, db
+    )
+
+
+def _require_columnar():
+    if not columnar_store.PYARROW_AVAILABLE:
+        raise HTTPException(
+            status_code=501,
+            detail="Columnar analytics not configured. Install pyarrow (pip install pyarrow)",
+        )
 
 
 @router.get("/admin/accuracy-trends")
 async def get_accuracy_trends(
+    request: Request,
     userId: Optional[str] = Query(None, description="Filter by user ID"),
     days: int = Query(7, description="Number of days to analyze"),
+    source: Literal["mongo", "columnar"] = Query("mongo", description="Answer from exported Parquet files where possible"),
     db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    """
+    Cached wrapper around the accuracy trends report (ETag / If-None-Match aware).
+    """
+    return await response_cache.respond(
+        request, ("interactions",), lambda: _accuracy_trends(userId, days, source, db)
+    )
+
+
+async def _accuracy_trends(
+    userId: Optional[str],
+    days: int,
+    source: str,
+    db: AsyncIOMotorDatabase,
 ):
     """
     Get accuracy trends over time for visualization.
     Returns daily accuracy rates.
+
+    With source=columnar, exported days are read from the Parquet store and
+    only the days after the export watermark are aggregated in Mongo.
     """
-    interactions = db["interactions"]
-    
     # Calculate start date
     start_date = datetime.utcnow() - timedelta(days=days)
-    
-    query = {"timestamp": {"$gte": start_date}}
-    if userId:
-        query["userId"] = userId
+
+    by_day: Dict[str, Dict[str, int]] = defaultdict(lambda: {"total": 0, "correct": 0})
+    mongo_start = start_date
+    if source == "columnar":
+        _require_columnar()
+        watermark = columnar_store.export_watermark("interactions")
+        if watermark is not None and watermark > start_date:
+            exported = await asyncio.to_thread(
+                columnar_store.daily_accuracy, start_date, watermark, userId
+            )
+            for date, counts in exported.items():
+                by_day[date]["total"] += counts["total"]
+                by_day[date]["correct"] += counts["correct"]
+            mongo_start = watermark
     
     # Aggregate by day
-    pipeline = [
-        {"$match": query},
-        {
-            "$group": {
-                "_id": {
-                    "$dateToString": {
-                        "format": "%Y-%m-%d",
-                        "date": "$timestamp"
-                    }
-                },
-                "total": {"$sum": 1},
-                "correct": {
-                    "$sum": {
-                        "$cond": [{"$eq": ["$isCorrect", True]}, 1, 0]
-                    }
-                }
-            }
-        },
-        {"$sort": {"_id": 1}}
-    ]
-    
-    result = await interactions.aggregate(pipeline).to_list(None)
+    result = await repository.accuracy_by_day(db, mongo_start, userId).to_list(None)
+    for day in result:
+        by_day[day["_id"]]["total"] += day["total"]
+        by_day[day["_id"]]["correct"] += day["correct"]
     
     # Calculate accuracy for each day
     trends = []
-    for day in result:
+    for date in sorted(by_day):
+        day = by_day[date]
         accuracy = (day["correct"] / day["total"]) * 100 if day["total"] > 0 else 0
         trends.append({
-            "date": day["_id"],
+            "date": date,
             "accuracy": round(accuracy, 2),
             "total": day["total"],
             "correct": day["correct"]
@@ -136,37 +192,68 @@ async def get_accuracy_trends(
     }
 
 
+async def _columnar_user_stats(db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
+    """Per-user totals from the Parquet store, topped up from Mongo after the watermark."""
+    watermark = columnar_store.export_watermark("interactions")
+    totals: Dict[Optional[str], Dict[str, Any]] = {}
+    if watermark is not None:
+        totals = await asyncio.to_thread(columnar_store.user_totals, watermark)
+
+    async for row in repository.user_totals(db, watermark):
+        user_id = row.pop("_id")
+        if user_id not in totals:
+            totals[user_id] = row
+            continue
+        merged = totals[user_id]
+        for key, value in row.items():
+            if key == "last_activity":
+                merged[key] = max(filter(None, (merged.get(key), value)), default=None)
+            else:
+                merged[key] = merged.get(key, 0) + value
+
+    users = []
+    for user_id, t in totals.items():
+        users.append({
+            "_id": user_id,
+            "total_activities": t["total"],
+            "correct_answers": t["correct"],
+            "avg_time": t["time_sum"] / t["time_n"] if t["time_n"] else 0,
+            "avg_difficulty": t["difficulty_sum"] / t["difficulty_n"] if t["difficulty_n"] else 0,
+            "avg_focus": t["focus_sum"] / t["focus_n"] if t["focus_n"] else 0,
+            "last_activity": t["last_activity"],
+        })
+    users.sort(key=lambda u: u["total_activities"], reverse=True)
+    return users
+
+
 @router.get("/admin/user-stats")
 async def get_user_stats(
+    request: Request,
+    source: Literal["mongo", "columnar"] = Query("mongo", description="Answer from exported Parquet files where possible"),
     db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    """
+    Cached wrapper around the per-user statistics (ETag / If-None-Match aware).
+    """
+    return await response_cache.respond(
+        request, ("interactions",), lambda: _user_stats(source, db)
+    )
+
+
+async def _user_stats(
+    source: str,
+    db: AsyncIOMotorDatabase,
 ):
     """
     Get statistics for all users.
     Returns user-wise performance metrics.
     """
-    interactions = db["interactions"]
-    
-    # Aggregate by user
-    pipeline = [
-        {
-            "$group": {
-                "_id": "$userId",
-                "total_activities": {"$sum": 1},
-                "correct_answers": {
-                    "$sum": {
-                        "$cond": [{"$eq": ["$isCorrect", True]}, 1, 0]
-                    }
-                },
-                "avg_time": {"$avg": "$timeTaken"},
-                "avg_difficulty": {"$avg": "$difficultyRating"},
-                "avg_focus": {"$avg": "$focusRating"},
-                "last_activity": {"$max": "$timestamp"}
-            }
-        },
-        {"$sort": {"total_activities": -1}}
-    ]
-    
-    result = await interactions.aggregate(pipeline).to_list(None)
+    if source == "columnar":
+        _require_columnar()
+        result = await _columnar_user_stats(db)
+    else:
+        # Aggregate by user
+        result = await repository.user_stats(db).to_list(None)
     
     # Calculate accuracy and format
     users = []
@@ -189,6 +276,31 @@ async def get_user_stats(
     }
 
 
+@router.post("/admin/analytics-export")
+async def run_analytics_export(
+    rebuild: bool = Query(False, description="Re-export every day from scratch"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    """
+    Export closed days of interactions/ml_predictions/nlp_analyses to Parquet now.
+    """
+    _require_columnar()
+    report = await columnar_store.export_collections(db, rebuild=rebuild)
+
+    watermarks = {}
+    for collection in columnar_store.EXPORTED_COLLECTIONS:
+        watermark = columnar_store.export_watermark(collection)
+        watermarks[collection] = watermark.isoformat() if watermark else None
+
+    return {
+        "exported": {
+            collection: {"days": len(days), "rows": sum(days.values())}
+            for collection, days in report.items()
+        },
+        "watermarks": watermarks,
+    }
+
+
 @router.get("/admin/model-performance")
 async def get_model_performance(
     db: AsyncIOMotorDatabase = Depends(get_db),
@@ -197,33 +309,20 @@ async def get_model_performance(
     Get overall model performance metrics.
     Shows how well ML models are predicting.
     """
-    predictions_col = db["ml_predictions"]
-    interactions_col = db["interactions"]
-    nlp_col = db["nlp_analyses"]
-    
     # Count total predictions
-    total_ml_predictions = await predictions_col.count_documents({})
-    total_nlp_analyses = await nlp_col.count_documents({})
-    total_interactions = await interactions_col.count_documents({})
+    total_ml_predictions = await repository.collection_size(db, "ml_predictions")
+    total_nlp_analyses = await repository.collection_size(db, "nlp_analyses")
+    total_interactions = await repository.collection_size(db, "interactions")
     
     # Get difficulty distribution
-    difficulty_pipeline = [
-        {
-            "$group": {
-                "_id": "$difficultyRating",
-                "count": {"$sum": 1}
-            }
-        }
-    ]
-    
-    difficulty_dist = await interactions_col.aggregate(difficulty_pipeline).to_list(None)
+    difficulty_dist = await repository.difficulty_distribution(db).to_list(None)
     
     # Get confusion rate
-    confused_count = await interactions_col.count_documents({"confusionFlag": True})
+    confused_count = await repository.count_interactions(db, confused=True)
     confusion_rate = (confused_count / total_interactions * 100) if total_interactions > 0 else 0
     
     # Get overall accuracy
-    correct_count = await interactions_col.count_documents({"isCorrect": True})
+    correct_count = await repository.count_interactions(db, correct=True)
     overall_accuracy = (correct_count / total_interactions * 100) if total_interactions > 0 else 0
     
     return {
@@ -240,24 +339,133 @@ async def get_model_performance(
 
 @router.get("/admin/recent-activity")
 async def get_recent_activity(
-    limit: int = Query(20, description="Number of recent activities"),
+    limit: Optional[int] = Query(None, ge=1, description="Number of recent activities"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    format: Literal["json", "ndjson"] = Query("json"),
+    gzip: bool = Query(False, description="Gzip the ndjson export"),
     db: AsyncIOMotorDatabase = Depends(get_db),
 ):
     """
     Get recent user activities for real-time monitoring.
     """
-    interactions = db["interactions"]
-    
-    cursor = interactions.find({}).sort("timestamp", -1).limit(limit)
-    activities = await cursor.to_list(length=limit)
-    
-    for activity in activities:
-        activity["_id"] = str(activity["_id"])
-        if "timestamp" in activity:
-            activity["timestamp"] = activity["timestamp"].isoformat()
-    
-    return {
-        "total": len(activities),
-        "activities": activities
-    }
+    return await _log_response(
+        "interactions", {}, "activities", limit, cursor, fields, None, format, gzip, db,
+        default_limit=20,
+    )
+
+
+@router.get("/admin/cache-stats")
+async def get_cache_stats():
+    """
+    Hit/miss/304 counters for the dashboard response cache.
+    """
+    return response_cache.stats()
+
+
+@router.get("/admin/models")
+async def get_model_registry():
+    """
+    Model versions on disk, the active one and the one this worker has loaded.
+    """
+    return await asyncio.to_thread(ml_engine.registry.status)
+
+
+@router.post("/admin/models/reload")
+async def reload_models(
+    version: Optional[str] = Query(None, description="Activate this version first"),
+):
+    """
+    Activate a version (optional) and hot-swap this worker to the active one.
+    Other workers follow on their next registry poll.
+    """
+    try:
+        if version:
+            await asyncio.to_thread(ml_engine.registry.activate, version)
+        swapped = await ml_engine.registry.reload()
+    except UnknownModelVersion as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ModelRegistryError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"swapped": swapped, "loaded_version": ml_engine.current_version()}
+
+
+@router.post("/admin/models/rollback")
+async def rollback_models():
+    """
+    Re-activate the previously active model version and swap to it.
+    """
+    try:
+        version = await asyncio.to_thread(ml_engine.registry.rollback)
+        await ml_engine.registry.reload()
+    except ModelRegistryError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"rolled_back_to": version, "loaded_version": ml_engine.current_version()}
+
+
+@router.get("/admin/models/table-report")
+async def get_decision_table_report(
+    samples: int = Query(20000, ge=100, le=1000000),
+):
+    """
+    How often the decision table (RECOMMENDER_MODE=table) disagrees with the
+    full models of the loaded version.
+    """
+    models = await asyncio.to_thread(ml_engine.load_models)
+    if models.table is None:
+        raise HTTPException(status_code=409, detail="Decision table not enabled (set RECOMMENDER_MODE=table)")
+    report = await asyncio.to_thread(decision_table.disagreement_report, models, models.table, samples)
+    return {"version": models.version, **report}
+
+
+@router.get("/admin/enrichment")
+async def get_enrichment_lag(db: AsyncIOMotorDatabase = Depends(get_db)):
+    """
+    Background sentiment enrichment: interactions still waiting for a score
+    (all workers) and the age of the oldest, plus this worker's queue.
+    """
+    return await enricher.lag(db)
+
+
+LIVE_HEARTBEAT_SECONDS = 15
+
+
+@router.get("/admin/live")
+async def live_activity_feed(
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    lastEventId: Optional[str] = Query(None, description="Resume after this event id"),
+):
+    """
+    Server-sent events stream of new interactions, ML predictions and NLP analyses.
+    Browsers reconnect automatically and resume via the Last-Event-ID header.
+    A `reset` event means some events were missed (or the id came from another
+    worker process); refetch a snapshot.
+    """
+    sub, complete = hub.subscribe(last_event_id or lastEventId)
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            if not complete:
+                yield "event: reset\ndata: {}\n\n"
+            while True:
+                if sub.closed and sub.queue.empty():
+                    # Dropped for lagging; the client reconnects and replays
+                    break
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=LIVE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield event.to_sse()
+        finally:
+            hub.unsubscribe(sub)
 
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -3,23 +3,42 @@ Analytics endpoint to monitor ML and NLP model performance
 Shows how models are being used and their effectiveness
 """
 
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from collections import defaultdict
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from ..db import repository
 from ..db.mongo import get_db
+from ..services import ml_engine
+from ..services.response_cache import response_cache
+from ..services.outcome_joiner import confusion_matrix, get_model_counters
+from ..services.sketches import PERCENTILE_FIELDS, SKETCH_MAX_RANGE_DAYS, load_range
 
 router = APIRouter()
 
 
 @router.get("/analytics/models")
 async def get_model_analytics(
+    request: Request,
     userId: Optional[str] = Query(None, description="Filter by user ID"),
     days: int = Query(7, description="Number of days to analyze"),
     db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    """
+    Cached wrapper around the model analytics report (ETag / If-None-Match aware).
+    """
+    return await response_cache.respond(
+        request, ("interactions",), lambda: _model_analytics(userId, days, db)
+    )
+
+
+async def _model_analytics(
+    userId: Optional[str],
+    days: int,
+    db: AsyncIOMotorDatabase,
 ):
     """
     Get analytics on ML and NLP model performance.
@@ -29,20 +48,9 @@ async def get_model_analytics(
     - NLP model usage (sentiment analysis, rephrase requests)
     - Model accuracy/effectiveness metrics
     """
-    interactions = db["interactions"]
-    
-    # Build query
-    query = {}
-    if userId:
-        query["userId"] = userId
-    
     # Get interactions from last N days
     cutoff_date = datetime.utcnow() - timedelta(days=days)
-    query["timestamp"] = {"$gte": cutoff_date}
-    
-    # Fetch all interactions
-    cursor = interactions.find(query)
-    all_interactions = await cursor.to_list(length=None)
+    all_interactions = await repository.model_analytics_interactions(db, cutoff_date, userId)
     
     # ========== ML MODEL ANALYTICS ==========
     ml_stats = {
@@ -186,45 +194,35 @@ async def get_model_analytics(
 @router.get("/analytics/models/detailed")
 async def get_detailed_model_metrics(
     userId: Optional[str] = Query(None),
+    modelVersion: Optional[str] = Query(None, description="Defaults to the live model version"),
     db: AsyncIOMotorDatabase = Depends(get_db),
 ):
     """
     Get detailed metrics on model predictions vs actual outcomes.
     Shows how well models are performing.
+
+    Reads the running counters kept by the outcome joiner, so the cost does
+    not depend on how many interactions have been logged.
     """
-    interactions = db["interactions"]
-    
-    query = {"userId": userId} if userId else {}
-    cursor = interactions.find(query).sort("timestamp", -1).limit(100)
-    recent_interactions = await cursor.to_list(length=100)
-    
-    # Track prediction accuracy
-    predictions_vs_outcomes = {
-        "difficulty_matches": 0,
-        "total_checks": 0,
-    }
-    
-    # Analyze recent interactions
-    for interaction in recent_interactions:
-        # Check if difficulty prediction matched user's experience
-        difficulty_rating = interaction.get("difficultyRating")
-        is_correct = interaction.get("isCorrect", False)
-        
-        if difficulty_rating is not None:
-            predictions_vs_outcomes["total_checks"] += 1
-            # If user got it correct on easy/medium, or struggled on hard, prediction was good
-            if (difficulty_rating <= 3 and is_correct) or (difficulty_rating >= 4 and not is_correct):
-                predictions_vs_outcomes["difficulty_matches"] += 1
-    
-    accuracy = (
-        predictions_vs_outcomes["difficulty_matches"] / predictions_vs_outcomes["total_checks"]
-        if predictions_vs_outcomes["total_checks"] > 0 else 0.0
-    )
-    
+    version = modelVersion or ml_engine.current_version()
+    counters = await get_model_counters(db, version, userId)
+    if counters is None and not modelVersion:
+        # Nothing joined for the live version yet; show the latest one we have
+        counters = await get_model_counters(db, None, userId)
+
+    counters = counters or {}
+    rated = counters.get("rated", 0)
+    samples = counters.get("samples", 0)
+    accuracy = counters.get("matches", 0) / rated if rated > 0 else 0.0
+
     return {
+        "model_version": counters.get("model_version", version),
         "model_performance": {
             "difficulty_prediction_accuracy": accuracy,
-            "samples_analyzed": predictions_vs_outcomes["total_checks"],
+            "samples_analyzed": rated,
+            "outcomes_joined": samples,
+            "learner_accuracy": counters.get("correct", 0) / samples if samples > 0 else 0.0,
+            "confusion_matrix": confusion_matrix(counters),
         },
         "recommendations": {
             "collect_more_data": "Models improve with more user interactions",
@@ -233,3 +231,85 @@ async def get_detailed_model_metrics(
         }
     }
 
+
+def _parse_day(value: Optional[str], default: datetime) -> datetime:
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def _parse_range(start: Optional[str], end: Optional[str], today: datetime) -> Tuple[datetime, datetime]:
+    """Sketch query days, the last 7 by default."""
+    start_day = _parse_day(start, today - timedelta(days=6))
+    end_day = _parse_day(end, today)
+    if start_day > end_day:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end_day - start_day).days + 1 > SKETCH_MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {SKETCH_MAX_RANGE_DAYS} days")
+    return start_day, end_day
+
+
+@router.get("/analytics/sketches/percentiles")
+async def get_approximate_percentiles(
+    metric: str = Query("timeTaken", description="timeTaken or attentionScore"),
+    start: Optional[str] = Query(None, description="First day (YYYY-MM-DD), default 7 days ago"),
+    end: Optional[str] = Query(None, description="Last day (YYYY-MM-DD), default today"),
+    moduleId: Optional[str] = Query(None, description="M1, M2, M3"),
+    q: str = Query("0.5,0.9,0.99", description="Comma-separated quantiles"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    """
+    Approximate percentiles from per-day t-digest sketches.
+    Cost grows with the number of days in range, not with interaction volume.
+    """
+    if metric not in PERCENTILE_FIELDS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {list(PERCENTILE_FIELDS)}")
+    try:
+        quantiles = [float(v) for v in q.split(",") if v.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="q must be comma-separated numbers")
+    if any(not 0 <= v <= 1 for v in quantiles):
+        raise HTTPException(status_code=400, detail="quantiles must be between 0 and 1")
+
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_day, end_day = _parse_range(start, end, today)
+
+    bucket = await load_range(db, start_day, end_day, moduleId)
+    digest = bucket.percentiles[metric]
+    return {
+        "metric": metric,
+        "start": start_day.strftime("%Y-%m-%d"),
+        "end": end_day.strftime("%Y-%m-%d"),
+        "moduleId": moduleId,
+        "samples": int(digest.total),
+        "percentiles": {f"p{round(v * 100, 2):g}": digest.quantile(v) for v in quantiles},
+        "approximate": True,
+    }
+
+
+@router.get("/analytics/sketches/distinct")
+async def get_approximate_distinct(
+    start: Optional[str] = Query(None, description="First day (YYYY-MM-DD), default 7 days ago"),
+    end: Optional[str] = Query(None, description="Last day (YYYY-MM-DD), default today"),
+    moduleId: Optional[str] = Query(None, description="M1, M2, M3"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    """
+    Approximate distinct active users and activities from HyperLogLog sketches.
+    """
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_day, end_day = _parse_range(start, end, today)
+
+    bucket = await load_range(db, start_day, end_day, moduleId)
+    return {
+        "start": start_day.strftime("%Y-%m-%d"),
+        "end": end_day.strftime("%Y-%m-%d"),
+        "moduleId": moduleId,
+        "interactions": bucket.count,
+        "distinct_users": bucket.distinct["userId"].count(),
+        "distinct_activities": bucket.distinct["activityId"].count(),
+        "approximate": True,
+    }
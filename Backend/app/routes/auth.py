@@ -1,12 +1,13 @@
-import base64
 from typing import Optional, List
 
-import bcrypt
 from fastapi import APIRouter, Depends, HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel, EmailStr
 
+from ..db import repository
 from ..db.mongo import get_db
+from ..services.password_hasher import PasswordHasherBusy, password_hasher
+from ..services.sessions import UserProfile, current_user, make_token, profile_cache
 
 router = APIRouter()
 
@@ -25,17 +26,38 @@ class LoginRequest(BaseModel):
   password: str
 
 
-def _hash_password(password: str) -> str:
-  return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+async def _hash_password(password: str) -> str:
+  try:
+    return await password_hasher.hash(password)
+  except PasswordHasherBusy:
+    raise _busy()
 
 
-def _verify_password(password: str, hashed: str) -> bool:
-  return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+async def _verify_password(password: str, hashed: str) -> bool:
+  try:
+    return await password_hasher.verify(password, hashed)
+  except PasswordHasherBusy:
+    raise _busy()
 
 
-def _make_token(user_id: str) -> str:
-  raw = f"{user_id}"
-  return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("utf-8")
+def _busy() -> HTTPException:
+  return HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many logins at once, please try again",
+    headers={"Retry-After": "1"},
+  )
+
+
+def _session(user_doc: dict) -> dict:
+  """Login/register response for a user doc whose _id is already a str."""
+  token, expires_at = make_token(user_doc["_id"])
+  # The first authenticated request after logging in needn't look the profile up
+  profile_cache.put(UserProfile(
+    id=user_doc["_id"],
+    neuroFlags=user_doc.get("neuroFlags") or [],
+    neuroType=user_doc.get("neuroType"),
+  ))
+  return {"success": True, "token": token, "expiresAt": expires_at, "user": _public_user(user_doc)}
 
 
 def _public_user(doc: dict) -> dict:
@@ -46,12 +68,11 @@ def _public_user(doc: dict) -> dict:
 
 @router.post("/register")
 async def register(payload: RegisterRequest, db: AsyncIOMotorDatabase = Depends(get_db)):
-  users = db["users"]
-  existing = await users.find_one({"email": payload.email})
+  existing = await repository.user_by_email(db, payload.email)
   if existing:
     raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="User already exists")
 
-  hashed = _hash_password(payload.password)
+  hashed = await _hash_password(payload.password)
   # Use neuroFlags if provided, otherwise fall back to neuroType as single-item array
   neuro_flags = payload.neuroFlags if payload.neuroFlags else ([payload.neuroType] if payload.neuroType else [])
   user_doc = {
@@ -62,20 +83,33 @@ async def register(payload: RegisterRequest, db: AsyncIOMotorDatabase = Depends(
     # Keep neuroType for backward compatibility (use first flag if available)
     "neuroType": neuro_flags[0] if neuro_flags else payload.neuroType,
   }
-  result = await users.insert_one(user_doc)
+  result = await db["users"].insert_one(user_doc)
   user_doc["_id"] = str(result.inserted_id)
-  token = _make_token(user_doc["_id"])
-  return {"success": True, "token": token, "user": _public_user(user_doc)}
+  return _session(user_doc)
 
 
 @router.post("/login")
 async def login(payload: LoginRequest, db: AsyncIOMotorDatabase = Depends(get_db)):
-  users = db["users"]
-  user_doc = await users.find_one({"email": payload.email})
-  if not user_doc or not _verify_password(payload.password, user_doc.get("password", "")):
+  user_doc = await repository.user_by_email(db, payload.email)
+  if not user_doc or not await _verify_password(payload.password, user_doc.get("password", "")):
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
+  if password_hasher.needs_rehash(user_doc["password"]):
+    # BCRYPT_ROUNDS changed since this hash was made; upgrade it while we have the password
+    try:
+      rehashed = await password_hasher.hash(payload.password)
+      await db["users"].update_one(
+        {"_id": user_doc["_id"], "password": user_doc["password"]},
+        {"$set": {"password": rehashed}},
+      )
+    except PasswordHasherBusy:
+      pass  # Try again on a later login
+
   user_doc["_id"] = str(user_doc["_id"])
-  token = _make_token(user_doc["_id"])
-  return {"success": True, "token": token, "user": _public_user(user_doc)}
+  return _session(user_doc)
+
+
+@router.get("/me", response_model=UserProfile)
+async def me(user: UserProfile = Depends(current_user)):
+  return user
 
@@ -1,90 +1,106 @@
-from typing import Optional, Dict, List
-from collections import defaultdict
+import json
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import BaseModel
 
+from ..db import repository
 from ..db.mongo import get_db
+from ..services.progress_store import (
+    get_many_progress,
+    get_user_progress,
+    module_progress,
+    progress_summary,
+)
+from ..services.sessions import UserProfile, optional_user, resolve_user_id
 
 router = APIRouter()
 
 
 @router.get("/progress")
-async def get_progress(userId: Optional[str] = None, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def get_progress(
+    userId: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    user: Optional[UserProfile] = Depends(optional_user),
+):
     """Get overall progress statistics"""
-    interactions = db["interactions"]
-    flt = {"userId": userId} if userId else {}
-    attempts = await interactions.count_documents(flt)
-    correct = await interactions.count_documents({**flt, "isCorrect": True})
+    userId = resolve_user_id(user, userId)
+    if userId:
+        record = await get_user_progress(db, userId)
+        attempts = record.get("attempts", 0)
+        correct = record.get("correct", 0)
+    else:
+        attempts = await repository.count_interactions(db)
+        correct = await repository.count_interactions(db, correct=True)
     accuracy = (correct / attempts) if attempts else 0.0
     return {"overallAccuracy": accuracy, "attempts": attempts}
 
 
 @router.get("/progress/modules")
-async def get_module_progress(userId: Optional[str] = None, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def get_module_progress(
+    userId: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    user: Optional[UserProfile] = Depends(optional_user),
+):
     """
     Get progress per module based on CORRECT answers only.
     Progress starts at 0 for new users and only counts questions answered correctly.
+
+    Reads the user's progress record (a bitset of correctly answered catalog
+    activities per module) instead of scanning their interactions.
     """
-    interactions = db["interactions"]
-    
-    # Count total activities per module from the activity_items data
-    try:
-        from ..data.activity_items import EXAMPLE_ACTIVITIES
-        module_totals: Dict[str, int] = defaultdict(int)
-        for activity in EXAMPLE_ACTIVITIES:
-            module_totals[activity.moduleId] += 1
-    except ImportError:
-        # Fallback if import fails
-        module_totals = {
-            "M1": 23,
-            "M2": 2,
-            "M3": 1,
-        }
-    
+    userId = resolve_user_id(user, userId)
     # If no userId, return 0 progress for all modules
     if not userId:
-        result = {}
-        for module_id in ["M1", "M2", "M3"]:
-            result[module_id] = {
-                "activitiesCompleted": 0,
-                "totalActivities": module_totals.get(module_id, 10),
-                "progress": 0,
-            }
-        return result
-    
-    # Get all CORRECT interactions for this user
-    flt = {"userId": userId, "isCorrect": True}  # Only count correct answers
-    cursor = interactions.find(flt)
-    interactions_list = await cursor.to_list(length=None)
-    
-    # Count unique activities answered CORRECTLY per module
-    module_counts: Dict[str, set] = defaultdict(set)  # module -> set of unique activity IDs
-    
-    for interaction in interactions_list:
-        activity_id = interaction.get("activityId", "")
-        if activity_id.startswith("M"):
-            # Extract module ID (M1, M2, M3)
-            module_id = activity_id.split("_")[0]  # e.g., "M1" from "M1_L1_Q1"
-            module_counts[module_id].add(activity_id)
-    
-    result = {}
-    for module_id in ["M1", "M2", "M3"]:
-        correct_completed = len(module_counts.get(module_id, set()))
-        total = module_totals.get(module_id, 10)
-        progress_percent = round((correct_completed / total) * 100, 1) if total > 0 else 0
-        
-        # Cap progress at 100% (in case user completed more than available activities)
-        progress_percent = min(progress_percent, 100.0)
-        
-        # Also cap completed count to total
-        correct_completed = min(correct_completed, total)
-        
-        result[module_id] = {
-            "activitiesCompleted": correct_completed,
-            "totalActivities": total,
-            "progress": progress_percent,
+        return module_progress(None)
+
+    record = await get_user_progress(db, userId)
+    return module_progress(record)
+
+
+# Rosters larger than this are streamed as NDJSON, one user per line
+BULK_STREAM_THRESHOLD = 500
+BULK_CHUNK_SIZE = 500
+BULK_MAX_USERS = 10000
+
+
+class BulkProgressRequest(BaseModel):
+    userIds: List[str]
+    stream: Optional[bool] = None  # Force (true) or disable (false) NDJSON streaming
+
+
+@router.post("/progress/bulk")
+async def get_bulk_progress(
+    payload: BulkProgressRequest,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    user: Optional[UserProfile] = Depends(optional_user),
+):
+    """
+    Progress for a whole class in one call: overall accuracy and per-module
+    progress for every userId, read from the precomputed progress records
+    with one multi-get per chunk of users. With a session token only the
+    session's own userId may be asked for.
+    """
+    # Keep request order, drop duplicates
+    user_ids = list(dict.fromkeys(resolve_user_id(user, u) for u in payload.userIds if u))
+    if len(user_ids) > BULK_MAX_USERS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_USERS} userIds per request")
+
+    stream = payload.stream if payload.stream is not None else len(user_ids) > BULK_STREAM_THRESHOLD
+    if not stream:
+        records = await get_many_progress(db, user_ids)
+        return {
+            "total": len(user_ids),
+            "users": {user_id: progress_summary(records[user_id]) for user_id in user_ids},
         }
-    
-    return result
 
+    async def lines():
+        for i in range(0, len(user_ids), BULK_CHUNK_SIZE):
+            chunk = user_ids[i:i + BULK_CHUNK_SIZE]
+            records = await get_many_progress(db, chunk)
+            for user_id in chunk:
+                yield json.dumps({"userId": user_id, **progress_summary(records[user_id])}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
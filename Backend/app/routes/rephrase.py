@@ -3,9 +3,10 @@ from pydantic import BaseModel
 from typing import Optional, List
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
-from ..services import nlp_engine
+from ..services import metrics, nlp_engine
 from ..services.model_logger import log_rephrase_request
 from ..db.mongo import get_db
+from ..services.sessions import UserProfile, optional_user
 
 router = APIRouter()
 
@@ -24,24 +25,34 @@ class RephraseResponse(BaseModel):
 
 
 @router.post("/rephrase", response_model=RephraseResponse)
-async def rephrase(req: RephraseRequest, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def rephrase(
+    req: RephraseRequest,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    user: Optional[UserProfile] = Depends(optional_user),
+):
     try:
         # Validate that question is provided
         if not req.question or not req.question.strip():
             raise HTTPException(status_code=400, detail="Question is required")
         
+        # Logged-in learners get their own profile without sending it
+        if user is not None and not req.neuroType:
+            req.neuroType = user.neuroType or (user.neuroFlags[0] if user.neuroFlags else None)
+
         print(f"Rephrase request: question={req.question[:50]}..., options={req.options}, difficulty={req.difficulty}")
-        simplified_q, simplified_opts = await nlp_engine.rephrase_text(req)
+        with metrics.span("rephrase.llm"):
+            simplified_q, simplified_opts = await nlp_engine.rephrase_text(req)
         print(f"Rephrase result: {simplified_q[:50]}...")
         
         # Log rephrase request for tracking
-        await log_rephrase_request(
-            db,
-            None,  # userId - could be extracted from auth token in future
-            req.question,
-            simplified_q,
-            req.neuroType
-        )
+        with metrics.span("rephrase.log"):
+            await log_rephrase_request(
+                db,
+                user.id if user is not None else None,
+                req.question,
+                simplified_q,
+                req.neuroType
+            )
         
         return RephraseResponse(
             simplifiedQuestion=simplified_q,
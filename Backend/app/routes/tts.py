@@ -2,123 +2,185 @@
 Text-to-Speech API endpoint
 Converts text to audio files for download
 """
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 from typing import Optional
-import io
 import os
+import re
+
+from ..services import tts_engine
+from ..services.tts_cache import CACHE_CONTROL, MEDIA_TYPES, cache_key, file_name, tts_cache
+from ..services.tts_engine import tts_pool
+from ..services.tts_stream import SpeechStream
 
 router = APIRouter()
 
+AUDIO_NAME = re.compile(r"^[0-9a-f]{64}\.(wav|mp3)$")
+
 
 class TTSRequest(BaseModel):
     text: str
     rate: Optional[float] = 0.9
     pitch: Optional[float] = 1.0
     volume: Optional[float] = 1.0
-    voice: Optional[str] = None  # Voice name or language code
+    voice: Optional[str] = None  # Voice id from /tts/voices
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+def _audio_headers(name: str) -> dict:
+    return {
+        "ETag": f'"{name.split(".")[0]}"',
+        "Cache-Control": CACHE_CONTROL,
+        "Content-Location": f"/api/tts/audio/{name}",
+    }
+
+
+def _audio_response(path: str, name: str) -> FileResponse:
+    """A cached file, sent with sendfile (Range supported)."""
+    extension = name.rsplit(".", 1)[1]
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES[extension],
+        filename=f"speech.{extension}",
+        headers=_audio_headers(name),
+    )
 
 
 @router.post("/tts/generate")
-async def generate_audio(request: TTSRequest):
+async def generate_audio(request: TTSRequest, if_none_match: Optional[str] = Header(None)):
     """
-    Generate audio file from text using a TTS service.
-    
-    Options:
-    1. Use pyttsx3 (offline, requires system TTS)
-    2. Use gTTS (Google TTS, requires internet)
-    3. Use cloud APIs (Google Cloud, AWS Polly, etc.)
-    
-    Currently returns a placeholder - implement based on your needs.
+    Generate an audio file from text.
+
+    Uses pyttsx3 (offline, system voices, WAV) in the TTS worker pool, or
+    gTTS (Google TTS, requires internet, MP3) if pyttsx3 isn't installed.
+    pitch is accepted for the frontend's sake but neither engine supports it.
+
+    Audio is cached on disk by its settings, so repeated text is served
+    straight from the file; the response's Content-Location is a GET URL
+    for the same audio.
     """
+    if not request.text or not request.text.strip():
+        raise HTTPException(status_code=400, detail="Text is required")
+    engine = tts_engine.engine_name()
+    if engine is None:
+        raise HTTPException(
+            status_code=501,
+            detail="TTS service not configured. Install pyttsx3 (pip install pyttsx3) or gTTS (pip install gtts)"
+        )
+
+    def synthesize():
+        return tts_pool.synthesize(request.text, request.rate, request.volume, request.voice)
+
+    name = file_name(
+        cache_key(request.text, request.rate, request.pitch, request.volume, request.voice, engine),
+        tts_engine.MEDIA_TYPES[engine],
+    )
+    if tts_cache.enabled and _etag_matches(if_none_match, _audio_headers(name)["ETag"]):
+        return Response(status_code=304, headers=_audio_headers(name))
+
     try:
-        # Option 1: Use pyttsx3 (offline, system voices)
-        try:
-            import pyttsx3
-            
-            engine = pyttsx3.init()
-            engine.setProperty('rate', int(request.rate * 100))  # pyttsx3 uses 0-200
-            engine.setProperty('volume', request.volume)
-            
-            # Save to buffer
-            audio_buffer = io.BytesIO()
-            temp_file = "/tmp/tts_output.wav"
-            engine.save_to_file(request.text, temp_file)
-            engine.runAndWait()
-            
-            # Read the file
-            with open(temp_file, 'rb') as f:
-                audio_data = f.read()
-            
-            os.remove(temp_file)  # Clean up
-            
-            return StreamingResponse(
-                io.BytesIO(audio_data),
-                media_type="audio/wav",
-                headers={
-                    "Content-Disposition": f"attachment; filename=speech.wav"
-                }
-            )
-        except ImportError:
-            # Option 2: Use gTTS (Google TTS, requires internet)
-            try:
-                from gtts import gTTS
-                
-                tts = gTTS(text=request.text, lang='en', slow=False)
-                audio_buffer = io.BytesIO()
-                tts.write_to_fp(audio_buffer)
-                audio_buffer.seek(0)
-                
-                return StreamingResponse(
-                    audio_buffer,
-                    media_type="audio/mpeg",
-                    headers={
-                        "Content-Disposition": f"attachment; filename=speech.mp3"
-                    }
-                )
-            except ImportError:
-                # Option 3: Return error with instructions
-                raise HTTPException(
-                    status_code=501,
-                    detail="TTS service not configured. Install pyttsx3 (pip install pyttsx3) or gTTS (pip install gtts)"
-                )
-    
+        if tts_cache.enabled:
+            path = await tts_cache.get_or_create(name, synthesize)
+        else:
+            path, media_type = await synthesize()
+    except tts_engine.TTSUnavailable as e:
+        raise HTTPException(status_code=501, detail=f"TTS service not configured. {e}")
+    except tts_engine.TTSBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many speech requests at once, please try again",
+            headers={"Retry-After": "1"},
+        )
+    except tts_engine.TTSTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"TTS generation failed: {str(e)}"
         )
 
+    if tts_cache.enabled:
+        return _audio_response(path, name)
+    # Uncached: each request has its own file; remove it once it has been sent
+    return FileResponse(
+        path,
+        media_type=media_type,
+        filename=f"speech.{name.rsplit('.', 1)[1]}",
+        background=BackgroundTask(os.remove, path),
+    )
 
-@router.get("/tts/voices")
-async def get_available_voices():
+
+@router.post("/tts/stream")
+async def stream_audio(request: TTSRequest):
     """
-    Get list of available TTS voices (if using pyttsx3)
+    Like /tts/generate, but sentence by sentence: audio starts arriving once
+    the first sentence is synthesized, while the rest are still being made.
+    Errors before the first sentence is ready get the usual status codes;
+    later ones end the audio early.
     """
+    if not request.text or not request.text.strip():
+        raise HTTPException(status_code=400, detail="Text is required")
+
     try:
-        import pyttsx3
-        engine = pyttsx3.init()
-        voices = engine.getProperty('voices')
-        
-        voice_list = []
-        for voice in voices:
-            voice_list.append({
-                "id": voice.id,
-                "name": voice.name,
-                "gender": getattr(voice, 'gender', 'unknown'),
-                "languages": getattr(voice, 'languages', [])
-            })
-        
-        return {"voices": voice_list}
-    except ImportError:
-        return {
-            "voices": [],
-            "message": "pyttsx3 not installed. Install with: pip install pyttsx3"
-        }
+        stream = SpeechStream(request.text, request.rate, request.pitch, request.volume, request.voice)
+        await stream.start()
+    except tts_engine.TTSUnavailable as e:
+        raise HTTPException(status_code=501, detail=f"TTS service not configured. {e}")
+    except tts_engine.TTSBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many speech requests at once, please try again",
+            headers={"Retry-After": "1"},
+        )
+    except tts_engine.TTSTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Error getting voices: {str(e)}"
+            detail=f"TTS generation failed: {str(e)}"
         )
 
+    return StreamingResponse(
+        stream.body(),
+        media_type=stream.media_type,
+        headers={"Cache-Control": "no-store", "X-Sentences": str(len(stream.sentences))},
+    )
+
+
+@router.get("/tts/audio/{name}")
+async def get_cached_audio(name: str, if_none_match: Optional[str] = Header(None)):
+    """
+    Audio previously generated by /tts/generate, by the name in its
+    Content-Location. Supports Range requests, so <audio> can seek.
+    """
+    if not AUDIO_NAME.match(name):
+        raise HTTPException(status_code=404, detail="Not found")
+    path = tts_cache.lookup(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Not cached (evicted?); generate it again")
+    if _etag_matches(if_none_match, _audio_headers(name)["ETag"]):
+        return Response(status_code=304, headers=_audio_headers(name))
+    return _audio_response(path, name)
+
+
+@router.get("/tts/voices")
+async def get_available_voices():
+    """
+    Get list of available TTS voices (if using pyttsx3), read once at startup
+    """
+    if not tts_engine.PYTTSX3_AVAILABLE:
+        return {
+            "voices": [],
+            "message": "pyttsx3 not installed. Install with: pip install pyttsx3"
+        }
+    if not tts_pool.voices:
+        # Startup couldn't read them (or hasn't finished); try again now
+        await tts_pool.load_voices()
+    return {"voices": tts_pool.voices}
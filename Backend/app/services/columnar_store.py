@@ -0,0 +1,380 @@
+"""
+Columnar analytics store: daily Parquet partitions of the log collections.
+
+An exporter copies `interactions`, `ml_predictions` and `nlp_analyses` into
+`<ANALYTICS_EXPORT_DIR>/<collection>/date=YYYY-MM-DD/part-0.parquet`, one
+closed UTC day at a time, and remembers the last exported day per collection.
+Heavy reports read those files with pyarrow's vectorized compute and only ask
+Mongo for the still-open days after the export watermark.
+
+Run an export once with:
+    python -m app.services.columnar_store [--rebuild]
+
+Set ANALYTICS_EXPORT_INTERVAL_MINUTES to also export periodically in-process.
+
+Documents can arrive with a timestamp on a day that is already exported
+(offline batches backdated with answeredAt, say). The state also keeps the
+newest _id seen per collection, and each export re-exports every exported
+day that got documents with a later _id (ObjectIds carry their insert time).
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..db import repository
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+_current_file = Path(__file__)
+EXPORT_DIR = Path(os.getenv(
+    "ANALYTICS_EXPORT_DIR",
+    str(_current_file.parent.parent.parent / "analytics_export"),
+))
+EXPORT_INTERVAL_MINUTES = float(os.getenv("ANALYTICS_EXPORT_INTERVAL_MINUTES", "0"))
+STATE_FILE = "_state.json"
+READ_BATCH_SIZE = 5000
+
+# The periodic task and the admin trigger share the tmp files and _state.json
+_export_lock = asyncio.Lock()
+
+# Flattened column -> (path into the Mongo document, arrow type name)
+_COLUMNS: Dict[str, Dict[str, tuple]] = {
+    "interactions": {
+        "userId": (("userId",), "string"),
+        "activityId": (("activityId",), "string"),
+        "lessonId": (("lessonId",), "string"),
+        "timestamp": (("timestamp",), "timestamp"),
+        "isCorrect": (("isCorrect",), "bool"),
+        "timeTaken": (("timeTaken",), "float"),
+        "difficultyRating": (("difficultyRating",), "int"),
+        "focusRating": (("focusRating",), "int"),
+        "attentionScore": (("attentionScore",), "float"),
+        "sentimentScore": (("sentimentScore",), "float"),
+        "confusionFlag": (("confusionFlag",), "bool"),
+        "supportMode": (("supportMode",), "string"),
+    },
+    "ml_predictions": {
+        "userId": (("userId",), "string"),
+        "timestamp": (("timestamp",), "timestamp"),
+        "model_version": (("model_version",), "string"),
+        "topic": (("prediction", "topic"), "string"),
+        "difficulty": (("prediction", "difficulty"), "string"),
+        "modality": (("prediction", "modality"), "string"),
+        "avg_accuracy": (("features", "avg_accuracy"), "float"),
+        "avg_time": (("features", "avg_time"), "float"),
+        "avg_difficulty_rating": (("features", "avg_difficulty_rating"), "float"),
+        "avg_focus_rating": (("features", "avg_focus_rating"), "float"),
+        "avg_attention_score": (("features", "avg_attention_score"), "float"),
+        "avg_sentiment": (("features", "avg_sentiment"), "float"),
+        "confusion_rate": (("features", "confusion_rate"), "float"),
+        "outcome_isCorrect": (("actual_outcome", "isCorrect"), "bool"),
+        "outcome_difficultyRating": (("actual_outcome", "difficultyRating"), "int"),
+    },
+    "nlp_analyses": {
+        "userId": (("userId",), "string"),
+        "timestamp": (("timestamp",), "timestamp"),
+        "text": (("text",), "string"),
+        "sentiment_score": (("sentiment_score",), "float"),
+        "confusion_flag": (("confusion_flag",), "bool"),
+    },
+}
+
+EXPORTED_COLLECTIONS = tuple(_COLUMNS)
+
+
+def _require_pyarrow() -> None:
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("pyarrow is not installed. Install with: pip install pyarrow")
+
+
+def _arrow_type(name: str):
+    return {
+        "string": pa.string(),
+        "timestamp": pa.timestamp("ms"),
+        "bool": pa.bool_(),
+        "float": pa.float64(),
+        "int": pa.int64(),
+    }[name]
+
+
+def _schema(collection: str):
+    return pa.schema([(col, _arrow_type(t)) for col, (_, t) in _COLUMNS[collection].items()])
+
+
+def _dig(doc: Dict[str, Any], path: tuple) -> Any:
+    for key in path:
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def _to_batch(collection: str, docs: List[Dict[str, Any]]):
+    columns = _COLUMNS[collection]
+    arrays = {}
+    for col, (path, type_name) in columns.items():
+        values = [_dig(doc, path) for doc in docs]
+        if type_name == "float":
+            values = [float(v) if isinstance(v, (int, float)) else None for v in values]
+        elif type_name == "int":
+            values = [int(v) if isinstance(v, (int, float)) else None for v in values]
+        elif type_name == "string":
+            values = [str(v) if v is not None else None for v in values]
+        arrays[col] = pa.array(values, type=_arrow_type(type_name))
+    return pa.RecordBatch.from_pydict(arrays, schema=_schema(collection))
+
+
+def _write_chunk(writer, collection: str, docs: List[Dict[str, Any]]) -> None:
+    """Convert and write one chunk; runs in a thread (the row loop is pure Python)."""
+    writer.write_batch(_to_batch(collection, docs))
+
+
+def _day_dir(collection: str, day: datetime) -> Path:
+    return EXPORT_DIR / collection / f"date={day.strftime('%Y-%m-%d')}"
+
+
+# ------------- EXPORT STATE -------------
+
+# State key holding {collection: newest exported _id (hex)}
+INSERTED_THROUGH = "insertedThrough"
+
+
+def _load_state() -> Dict[str, Any]:
+    path = EXPORT_DIR / STATE_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def _save_state(state: Dict[str, Any]) -> None:
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = EXPORT_DIR / (STATE_FILE + ".tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, EXPORT_DIR / STATE_FILE)
+
+
+def export_watermark(collection: str) -> Optional[datetime]:
+    """First instant NOT covered by the exported files (None if nothing exported)."""
+    last_day = _load_state().get(collection)
+    if not last_day:
+        return None
+    return datetime.strptime(last_day, "%Y-%m-%d") + timedelta(days=1)
+
+
+# ------------- EXPORTER -------------
+
+async def _export_day(db: AsyncIOMotorDatabase, collection: str, day: datetime) -> int:
+    out_dir = _day_dir(collection, day)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_dir / "part-0.parquet.tmp"
+
+    cursor = repository.export_day(db, collection, day, day + timedelta(days=1)).batch_size(READ_BATCH_SIZE)
+
+    rows = 0
+    writer = pq.ParquetWriter(tmp_path, _schema(collection), compression="zstd")
+    try:
+        chunk: List[Dict[str, Any]] = []
+        async for doc in cursor:
+            chunk.append(doc)
+            if len(chunk) >= READ_BATCH_SIZE:
+                await asyncio.to_thread(_write_chunk, writer, collection, chunk)
+                rows += len(chunk)
+                chunk = []
+        if chunk:
+            await asyncio.to_thread(_write_chunk, writer, collection, chunk)
+            rows += len(chunk)
+    finally:
+        writer.close()
+
+    os.replace(tmp_path, out_dir / "part-0.parquet")
+    return rows
+
+
+async def export_collections(db: AsyncIOMotorDatabase, rebuild: bool = False) -> Dict[str, Dict[str, int]]:
+    """
+    Export every closed day not yet on disk, plus exported days that got
+    new documents since. Returns {collection: {day: rows}}.
+    Today (UTC) is never exported because it is still being written.
+    Concurrent calls run one after another.
+    """
+    _require_pyarrow()
+    async with _export_lock:
+        return await _export_collections(db, rebuild)
+
+
+async def _changed_days(db: AsyncIOMotorDatabase, collection: str, state: Dict[str, Any]) -> List[datetime]:
+    """Exported days with documents inserted after the last export."""
+    if collection not in state:
+        return []
+    watermark = datetime.strptime(state[collection], "%Y-%m-%d") + timedelta(days=1)
+    inserted_through = state.get(INSERTED_THROUGH, {}).get(collection)
+    # State from before insertedThrough was kept: anything inserted since the
+    # last exported day began may be late
+    after = ObjectId(inserted_through) if inserted_through else ObjectId.from_datetime(watermark - timedelta(days=1))
+    days = await repository.days_inserted_since(db, collection, after, watermark)
+    return [datetime.strptime(day, "%Y-%m-%d") for day in days]
+
+
+async def _export_collections(db: AsyncIOMotorDatabase, rebuild: bool) -> Dict[str, Dict[str, int]]:
+    state = {} if rebuild else _load_state()
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    report: Dict[str, Dict[str, int]] = {}
+
+    for collection in EXPORTED_COLLECTIONS:
+        report[collection] = {}
+        # Taken first: documents inserted during the export are checked next time
+        newest_id = await repository.newest_log_id(db, collection)
+
+        for day in await _changed_days(db, collection, state):
+            report[collection][day.strftime("%Y-%m-%d")] = await _export_day(db, collection, day)
+
+        if collection in state:
+            day = datetime.strptime(state[collection], "%Y-%m-%d") + timedelta(days=1)
+        else:
+            first = await repository.oldest_log(db, collection)
+            if not first or not isinstance(first.get("timestamp"), datetime):
+                continue
+            day = first["timestamp"].replace(hour=0, minute=0, second=0, microsecond=0)
+
+        while day < today:
+            rows = await _export_day(db, collection, day)
+            report[collection][day.strftime("%Y-%m-%d")] = rows
+            # Persist after every day so an interrupted run resumes where it stopped
+            state[collection] = day.strftime("%Y-%m-%d")
+            _save_state(state)
+            day += timedelta(days=1)
+
+        if newest_id is not None and collection in state:
+            state.setdefault(INSERTED_THROUGH, {})[collection] = str(newest_id)
+            _save_state(state)
+
+    return report
+
+
+async def run_periodic_export(db: AsyncIOMotorDatabase, interval_minutes: float = EXPORT_INTERVAL_MINUTES) -> None:
+    """Background task: export new closed days every `interval_minutes`."""
+    while True:
+        try:
+            report = await export_collections(db)
+            exported = sum(len(days) for days in report.values())
+            if exported:
+                print(f"Columnar export: wrote {exported} day partition(s)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Columnar export failed: {e}")
+        await asyncio.sleep(interval_minutes * 60)
+
+
+# ------------- QUERIES -------------
+
+def _dataset(collection: str):
+    path = EXPORT_DIR / collection
+    if not path.exists():
+        return None
+    return ds.dataset(path, format="parquet", partitioning="hive", schema=_schema(collection).append(
+        pa.field("date", pa.string())
+    ))
+
+
+def _filter(start: Optional[datetime], end: Optional[datetime], user_id: Optional[str]):
+    expr = None
+    parts = []
+    if start is not None:
+        parts.append(ds.field("timestamp") >= pa.scalar(start, type=pa.timestamp("ms")))
+    if end is not None:
+        parts.append(ds.field("timestamp") < pa.scalar(end, type=pa.timestamp("ms")))
+    if user_id:
+        parts.append(ds.field("userId") == user_id)
+    for part in parts:
+        expr = part if expr is None else expr & part
+    return expr
+
+
+def daily_accuracy(start: datetime, end: Optional[datetime], user_id: Optional[str]) -> Dict[str, Dict[str, int]]:
+    """{date: {total, correct}} over exported interactions."""
+    _require_pyarrow()
+    dataset = _dataset("interactions")
+    if dataset is None:
+        return {}
+    table = dataset.to_table(columns=["date", "isCorrect"], filter=_filter(start, end, user_id))
+    if table.num_rows == 0:
+        return {}
+    table = table.append_column("correct", pc.cast(pc.fill_null(table["isCorrect"], False), pa.int64()))
+    grouped = table.group_by("date").aggregate([("correct", "count"), ("correct", "sum")])
+    return {
+        row["date"]: {"total": row["correct_count"], "correct": row["correct_sum"]}
+        for row in grouped.to_pylist()
+    }
+
+
+def user_totals(end: Optional[datetime] = None) -> Dict[Optional[str], Dict[str, Any]]:
+    """
+    Per-user sums and counts over exported interactions, in a mergeable form:
+    {userId: {total, correct, time_sum, time_n, difficulty_sum, difficulty_n,
+              focus_sum, focus_n, last_activity}}
+    """
+    _require_pyarrow()
+    dataset = _dataset("interactions")
+    if dataset is None:
+        return {}
+    table = dataset.to_table(
+        columns=["userId", "isCorrect", "timeTaken", "difficultyRating", "focusRating", "timestamp"],
+        filter=_filter(None, end, None),
+    )
+    if table.num_rows == 0:
+        return {}
+    table = table.append_column("correct", pc.cast(pc.fill_null(table["isCorrect"], False), pa.int64()))
+    grouped = table.group_by("userId").aggregate([
+        ("correct", "count"),
+        ("correct", "sum"),
+        ("timeTaken", "sum"),
+        ("timeTaken", "count"),
+        ("difficultyRating", "sum"),
+        ("difficultyRating", "count"),
+        ("focusRating", "sum"),
+        ("focusRating", "count"),
+        ("timestamp", "max"),
+    ])
+    return {
+        row["userId"]: {
+            "total": row["correct_count"],
+            "correct": row["correct_sum"],
+            "time_sum": row["timeTaken_sum"] or 0.0,
+            "time_n": row["timeTaken_count"],
+            "difficulty_sum": row["difficultyRating_sum"] or 0,
+            "difficulty_n": row["difficultyRating_count"],
+            "focus_sum": row["focusRating_sum"] or 0,
+            "focus_n": row["focusRating_count"],
+            "last_activity": row["timestamp_max"],
+        }
+        for row in grouped.to_pylist()
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    from ..db.mongo import close_client, get_db
+
+    async def _main():
+        report = await export_collections(await get_db(), rebuild="--rebuild" in sys.argv)
+        for collection, days in report.items():
+            print(f"{collection}: {len(days)} day(s), {sum(days.values())} rows")
+        close_client()
+
+    asyncio.run(_main())
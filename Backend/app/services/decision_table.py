@@ -0,0 +1,155 @@
+"""
+Quantized decision table for the recommender.
+
+recommend_next only turns seven bounded features into a (difficulty,
+activity) pair, so the models can be evaluated once over a grid: each
+feature is clipped to FEATURE_BOUNDS and cut into `resolution` equal bins,
+and the models' answer at every cell centre is stored as one byte
+(difficulty * 4 + activity). A lookup is then seven bin computations and an
+array index, independent of forest size or network depth.
+
+Enable with RECOMMENDER_MODE=table (RECOMMENDER_TABLE_RESOLUTION bins per
+feature, default 6 -> 6^7 cells, ~280 KB). Tables are built when a model
+version loads and cached next to its artifacts. The KMeans cluster is not
+part of the response, so it is not tabulated.
+
+Measure how often the table disagrees with the full models:
+    python -m app.services.decision_table [--resolution N] [--samples N]
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+RECOMMENDER_MODE = os.getenv("RECOMMENDER_MODE", "models")  # "models" | "table"
+RECOMMENDER_TABLE_RESOLUTION = int(os.getenv("RECOMMENDER_TABLE_RESOLUTION", "6"))
+
+# (low, high) per ml_engine.FEATURE_KEYS entry; values outside are clipped
+FEATURE_BOUNDS: Dict[str, Tuple[float, float]] = {
+    "avg_accuracy": (0.0, 1.0),
+    "avg_time": (0.0, 120.0),
+    "avg_difficulty_rating": (1.0, 5.0),
+    "avg_focus_rating": (1.0, 5.0),
+    "avg_attention_score": (0.0, 1.0),
+    "avg_sentiment": (-1.0, 1.0),
+    "confusion_rate": (0.0, 1.0),
+}
+
+N_ACTIVITY_LABELS = 4
+_BUILD_BATCH = 65536
+
+
+class DecisionTable:
+    def __init__(self, codes: np.ndarray, resolution: int, keys: List[str]):
+        self.codes = codes
+        self.resolution = resolution
+        self.keys = keys
+        self._bounds = [FEATURE_BOUNDS[k] for k in keys]
+        # Row-major strides so a lookup is a plain dot product of bin indexes
+        self._strides = [resolution ** (len(keys) - 1 - i) for i in range(len(keys))]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes)
+
+    def lookup(self, features: Dict) -> Tuple[int, int]:
+        """(difficulty label, activity label) for one feature dict."""
+        res = self.resolution
+        flat = 0
+        for key, (low, high), stride in zip(self.keys, self._bounds, self._strides):
+            b = int((float(features.get(key, 0.0)) - low) / (high - low) * res)
+            flat += stride * (0 if b < 0 else res - 1 if b >= res else b)
+        code = int(self.codes[flat])
+        return code // N_ACTIVITY_LABELS, code % N_ACTIVITY_LABELS
+
+    def bins(self, X: np.ndarray) -> np.ndarray:
+        """Flat cell index for every row of a feature matrix."""
+        low = np.array([b[0] for b in self._bounds])
+        high = np.array([b[1] for b in self._bounds])
+        idx = ((X - low) / (high - low) * self.resolution).astype(np.int64)
+        idx = np.clip(idx, 0, self.resolution - 1)
+        return idx @ np.array(self._strides, dtype=np.int64)
+
+    def lookup_many(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        codes = self.codes[self.bins(X)].astype(np.int64)
+        return codes // N_ACTIVITY_LABELS, codes % N_ACTIVITY_LABELS
+
+
+def cell_centres(resolution: int, keys: List[str], start: int, stop: int) -> np.ndarray:
+    """Feature vectors at the centres of flat cells [start, stop)."""
+    idx = np.array(np.unravel_index(np.arange(start, stop), (resolution,) * len(keys))).T
+    low = np.array([FEATURE_BOUNDS[k][0] for k in keys])
+    high = np.array([FEATURE_BOUNDS[k][1] for k in keys])
+    return low + (idx + 0.5) / resolution * (high - low)
+
+
+def build_table(models, keys: List[str], resolution: int = RECOMMENDER_TABLE_RESOLUTION) -> DecisionTable:
+    """Evaluate the difficulty and activity models at every cell centre."""
+    cells = resolution ** len(keys)
+    codes = np.empty(cells, dtype=np.uint8)
+    for start in range(0, cells, _BUILD_BATCH):
+        stop = min(start + _BUILD_BATCH, cells)
+        X = cell_centres(resolution, keys, start, stop)
+        difficulty = models.difficulty.predict(X).astype(np.int64)
+        activity = models.activity.predict(X).astype(np.int64)
+        codes[start:stop] = difficulty * N_ACTIVITY_LABELS + activity
+    return DecisionTable(codes, resolution, keys)
+
+
+def load_or_build(models, version_dir: Path, keys: List[str], resolution: int = RECOMMENDER_TABLE_RESOLUTION) -> DecisionTable:
+    """Table for a loaded model version, cached as decision_table_r<N>.npy in its directory."""
+    path = version_dir / f"decision_table_r{resolution}.npy"
+    if path.exists():
+        return DecisionTable(np.load(path, mmap_mode="r"), resolution, keys)
+    table = build_table(models, keys, resolution)
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.npy")
+    np.save(tmp, table.codes)
+    os.replace(tmp, path)
+    return table
+
+
+def disagreement_report(models, table: DecisionTable, samples: int = 20000, seed: int = 0) -> Dict[str, float]:
+    """
+    Fraction of random in-bounds feature vectors where the table's answer
+    differs from the full models'.
+    """
+    rng = np.random.default_rng(seed)
+    low = np.array([FEATURE_BOUNDS[k][0] for k in table.keys])
+    high = np.array([FEATURE_BOUNDS[k][1] for k in table.keys])
+    X = low + rng.random((samples, len(table.keys))) * (high - low)
+
+    difficulty = models.difficulty.predict(X).astype(np.int64)
+    activity = models.activity.predict(X).astype(np.int64)
+    table_difficulty, table_activity = table.lookup_many(X)
+
+    diff_mismatch = difficulty != table_difficulty
+    activity_mismatch = activity != table_activity
+    return {
+        "resolution": table.resolution,
+        "cells": int(table.codes.size),
+        "table_bytes": table.nbytes,
+        "samples": samples,
+        "difficulty_disagreement": round(float(diff_mismatch.mean()), 4),
+        "activity_disagreement": round(float(activity_mismatch.mean()), 4),
+        "any_disagreement": round(float((diff_mismatch | activity_mismatch).mean()), 4),
+    }
+
+
+if __name__ == "__main__":
+    from . import ml_engine
+
+    parser = argparse.ArgumentParser(description="Build a decision table and compare it with the live models")
+    parser.add_argument("--resolution", type=int, default=RECOMMENDER_TABLE_RESOLUTION)
+    parser.add_argument("--samples", type=int, default=20000)
+    args = parser.parse_args()
+
+    models = ml_engine.load_models()
+    started = time.perf_counter()
+    table = build_table(models, ml_engine.FEATURE_KEYS, args.resolution)
+    print(f"Built {table.codes.size} cells for {models.version} in {time.perf_counter() - started:.1f}s")
+    for key, value in disagreement_report(models, table, args.samples).items():
+        print(f"  {key}: {value}")
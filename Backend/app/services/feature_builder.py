@@ -1,6 +1,32 @@
 # backend/app/services/feature_builder.py
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Returned by build_features when there is no history
+DEFAULT_FEATURES: Dict[str, float] = {
+    "avg_accuracy": 0.0,
+    "avg_time": 30.0,
+    "avg_difficulty_rating": 3.0,
+    "avg_focus_rating": 3.0,
+    "avg_attention_score": 0.8,
+    "avg_sentiment": 0.0,
+    "confusion_rate": 0.0,
+}
+
+# Interaction fields the features are computed from
+FEATURE_SOURCE_FIELDS = (
+    "isCorrect", "timeTaken", "difficultyRating", "focusRating",
+    "attentionScore", "sentimentScore", "confusionFlag",
+)
 
 
 def build_features(logs: List[Dict[str, Any]]) -> Dict[str, float]:
@@ -12,15 +38,7 @@ def build_features(logs: List[Dict[str, Any]]) -> Dict[str, float]:
     """
     if not logs:
         # Return defaults if no history
-        return {
-            "avg_accuracy": 0.0,
-            "avg_time": 30.0,
-            "avg_difficulty_rating": 3.0,
-            "avg_focus_rating": 3.0,
-            "avg_attention_score": 0.8,
-            "avg_sentiment": 0.0,
-            "confusion_rate": 0.0,
-        }
+        return dict(DEFAULT_FEATURES)
 
     # Extract numeric fields
     correct_count = sum(1 for log in logs if log.get("isCorrect", False))
@@ -56,3 +74,155 @@ def build_features(logs: List[Dict[str, Any]]) -> Dict[str, float]:
         "avg_sentiment": avg_sentiment,
         "confusion_rate": confusion_rate,
     }
+
+
+# ------------- COLUMNAR (MANY USERS AT ONCE) -------------
+
+def columns_from_logs(logs: Iterable[Dict[str, Any]]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Turn interaction dicts into (userId array, {field: float64 array}) for
+    build_features_columnar. Missing values become NaN; booleans become 0/1.
+    """
+    logs = list(logs)
+    user_ids = np.array([log.get("userId") for log in logs], dtype=object)
+    columns = {}
+    for field in FEATURE_SOURCE_FIELDS:
+        values = [log.get(field) for log in logs]
+        columns[field] = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+    return user_ids, columns
+
+
+def _grouped_features(inverse: np.ndarray, n: int, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    The seven features for groups 0..n-1, where row i of `columns` belongs
+    to group inverse[i]. Groups without rows get the defaults.
+    """
+    def col(field: str) -> np.ndarray:
+        values = columns.get(field)
+        return np.full(len(inverse), np.nan) if values is None else np.asarray(values, dtype=np.float64)
+
+    def count(mask: np.ndarray) -> np.ndarray:
+        return np.bincount(inverse[mask], minlength=n)
+
+    def mean(values: np.ndarray, mask: np.ndarray, default: float) -> np.ndarray:
+        sums = np.bincount(inverse[mask], weights=values[mask], minlength=n)
+        counts = count(mask)
+        out = np.full(n, default)
+        np.divide(sums, counts, out=out, where=counts > 0)
+        return out
+
+    def present(values: np.ndarray) -> np.ndarray:
+        return ~np.isnan(values)
+
+    def truthy(values: np.ndarray) -> np.ndarray:
+        return present(values) & (values != 0)
+
+    totals = np.bincount(inverse, minlength=n)
+    safe_totals = np.maximum(totals, 1)
+
+    is_correct = col("isCorrect")
+    times = col("timeTaken")
+    difficulty = col("difficultyRating")
+    focus = col("focusRating")
+    attention = col("attentionScore")
+    sentiment = col("sentimentScore")
+    confusion = col("confusionFlag")
+
+    # One bincount pass (or two for means) per feature
+    return {
+        "avg_accuracy": count(truthy(is_correct)) / safe_totals,
+        "avg_time": mean(times, truthy(times), DEFAULT_FEATURES["avg_time"]),
+        "avg_difficulty_rating": mean(difficulty, truthy(difficulty), DEFAULT_FEATURES["avg_difficulty_rating"]),
+        "avg_focus_rating": mean(focus, truthy(focus), DEFAULT_FEATURES["avg_focus_rating"]),
+        "avg_attention_score": mean(attention, present(attention), DEFAULT_FEATURES["avg_attention_score"]),
+        "avg_sentiment": mean(sentiment, present(sentiment), DEFAULT_FEATURES["avg_sentiment"]),
+        "confusion_rate": count(truthy(confusion)) / safe_totals,
+    }
+
+
+def build_features_columnar(
+    user_ids: np.ndarray,
+    columns: Dict[str, np.ndarray],
+    users: Optional[Iterable[Any]] = None,
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    build_features for every user at once.
+
+    user_ids: one entry per interaction. columns: float64 arrays aligned with
+    it (NaN = field missing, as columns_from_logs produces). Rows of a user
+    must be in the order build_features would see them; sums then accumulate
+    in the same order, so results equal build_features up to float rounding
+    (exactly on Python < 3.12, whose sum() also adds in order).
+
+    Returns (users, {feature: array aligned with users}). `users` defaults to
+    the distinct userIds in order of first appearance; users without rows get
+    the defaults.
+    """
+    # Factorize userIds in one pass (first-appearance order)
+    position: Dict[Any, int] = {}
+    inverse = np.fromiter(
+        (position.setdefault(u, len(position)) for u in user_ids), dtype=np.int64, count=len(user_ids)
+    )
+    distinct = np.empty(len(position), dtype=object)
+    distinct[:] = list(position)
+    features = _grouped_features(inverse, len(distinct), columns)
+
+    if users is None:
+        return distinct, features
+
+    # Reorder to the requested users; unknown users get the defaults
+    users = np.asarray(list(users), dtype=object)
+    index = np.array([position.get(u, -1) for u in users], dtype=np.int64)
+    known = index >= 0
+    out = {}
+    for name, values in features.items():
+        column = np.full(len(users), DEFAULT_FEATURES[name])
+        column[known] = values[index[known]]
+        out[name] = column
+    return users, out
+
+
+def build_window_features(
+    user_ids: np.ndarray,
+    columns: Dict[str, np.ndarray],
+    window: int,
+    start: int = 0,
+) -> Dict[str, np.ndarray]:
+    """
+    For every row from `start` on, build_features of the (up to) `window`
+    rows before it with the same userId: the features /next would have seen
+    right before that interaction. A user's rows must be contiguous and in
+    time order; rows before `start` only serve as history.
+
+    Returns {feature: array with one entry per row from `start`}.
+    """
+    n = len(user_ids)
+    rows = np.arange(start, n)
+    # Where each row's run of equal userIds begins
+    new_user = np.ones(n, dtype=bool)
+    new_user[1:] = user_ids[1:] != user_ids[:-1]
+    run_start = np.maximum.accumulate(np.where(new_user, np.arange(n), 0)) if n else new_user
+    first = np.maximum(run_start[rows], rows - window)
+    lengths = rows - first
+
+    # Every row's window back to back, oldest first: (history row, owning row)
+    offsets = np.cumsum(lengths) - lengths
+    history = np.repeat(first - offsets, lengths) + np.arange(lengths.sum())
+    owner = np.repeat(np.arange(len(rows)), lengths)
+    return _grouped_features(
+        owner, len(rows), {field: np.asarray(values, dtype=np.float64)[history] for field, values in columns.items()}
+    )
+
+
+def build_features_table(table, users: Optional[Iterable[Any]] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """build_features_columnar over a pyarrow Table of interactions (nulls = missing)."""
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("pyarrow is not installed")
+    columns = {}
+    for field in FEATURE_SOURCE_FIELDS:
+        if field not in table.column_names:
+            continue
+        column = pc.cast(table[field], pa.float64())
+        columns[field] = column.to_numpy(zero_copy_only=False)
+    user_ids = table["userId"].to_numpy(zero_copy_only=False)
+    return build_features_columnar(user_ids, columns, users)
@@ -0,0 +1,227 @@
+"""
+Background sentiment enrichment for submitted feedback.
+
+/submit no longer runs the sentiment model before answering: an interaction
+with feedback text is stored with `sentimentPending: true` and queued here.
+A background task collects the queue into batches, scores each batch with
+one `analyze_feedback_batch` call in a worker thread, then `$set`s
+sentimentScore / confusionFlag onto the interactions (clearing the marker)
+and writes the matching nlp_analyses log rows.
+
+Delivery is at least once: the marker is only cleared by the enrichment
+write, so anything lost from the in-memory queue (a crash, a full queue, a
+failed batch) is picked up again by the rescan of pending interactions
+older than ENRICH_STALE_SECONDS, which also runs at startup. A re-enriched
+interaction gets the same scores; its nlp_analyses row may be written twice.
+
+FEEDBACK_ENRICHMENT=inline restores the old synchronous behaviour.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from ..db import repository
+from . import metrics, nlp_engine
+from .live_feed import publish_local
+from .response_cache import response_cache
+
+FEEDBACK_ENRICHMENT = os.getenv("FEEDBACK_ENRICHMENT", "async")  # "async" | "inline"
+ENRICH_BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", "32"))
+ENRICH_LINGER_SECONDS = float(os.getenv("ENRICH_LINGER_MS", "200")) / 1000
+ENRICH_QUEUE_SIZE = int(os.getenv("ENRICH_QUEUE_SIZE", "10000"))
+# Pending interactions older than this are assumed lost from every queue
+ENRICH_STALE_SECONDS = float(os.getenv("ENRICH_STALE_SECONDS", "60"))
+ENRICH_RESCAN_SECONDS = float(os.getenv("ENRICH_RESCAN_SECONDS", "30"))
+
+PENDING_FIELD = "sentimentPending"
+
+ENRICH_LAG = metrics.registry.histogram(
+    "feedback_enrichment_lag_seconds", "Time from submit to sentiment written back"
+)
+ENRICH_PENDING = metrics.registry.gauge(
+    "feedback_enrichment_queue_depth", "Interactions waiting for sentiment in this process"
+)
+ENRICH_TOTAL = metrics.registry.counter("feedback_enrichment_total", "Interactions enriched with sentiment")
+
+
+def inline_enabled() -> bool:
+    return FEEDBACK_ENRICHMENT == "inline"
+
+
+class FeedbackEnricher:
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        # Ids currently queued here, so a rescan doesn't queue them twice
+        self._queued: Set[Any] = set()
+        self.enriched = 0
+        self.recovered = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.last_batch: Optional[Dict[str, Any]] = None
+
+    def _get_queue(self) -> asyncio.Queue:
+        # Created lazily so it binds to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=ENRICH_QUEUE_SIZE)
+        return self._queue
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def enqueue(self, interaction: Dict[str, Any]) -> None:
+        """Queue a stored interaction marked sentimentPending. Never blocks."""
+        if interaction["_id"] in self._queued:
+            return
+        item = {
+            "_id": interaction["_id"],
+            "userId": interaction.get("userId"),
+            "feedbackText": interaction.get("feedbackText") or "",
+            "timestamp": interaction.get("timestamp") or datetime.utcnow(),
+        }
+        try:
+            self._get_queue().put_nowait(item)
+            self._queued.add(item["_id"])
+        except asyncio.QueueFull:
+            # Still marked pending in Mongo; the rescan will find it
+            self.dropped += 1
+        ENRICH_PENDING.set(value=self.pending)
+
+    async def _next_batch(self, first_timeout: float) -> List[Dict[str, Any]]:
+        """Wait up to first_timeout for an item, then linger for more. May return []."""
+        queue = self._get_queue()
+        batch: List[Dict[str, Any]] = []
+        deadline = None
+        while len(batch) < ENRICH_BATCH_SIZE:
+            loop = asyncio.get_running_loop()
+            timeout = first_timeout if deadline is None else deadline - loop.time()
+            if timeout <= 0:
+                break
+            # asyncio.wait rather than wait_for, see OutcomeJoiner._next_batch
+            getter = asyncio.ensure_future(queue.get())
+            try:
+                done, _ = await asyncio.wait({getter}, timeout=timeout)
+            except asyncio.CancelledError:
+                # Items taken but not written stay pending in Mongo
+                getter.cancel()
+                raise
+            if not done:
+                getter.cancel()
+                break
+            batch.append(getter.result())
+            if deadline is None:
+                deadline = loop.time() + ENRICH_LINGER_SECONDS
+        return batch
+
+    async def run(self, db: AsyncIOMotorDatabase) -> None:
+        """Enrich queued feedback forever, rescanning Mongo for stragglers. Cancel to stop."""
+        last_rescan = 0.0
+        while True:
+            if time.monotonic() - last_rescan >= ENRICH_RESCAN_SECONDS:
+                last_rescan = time.monotonic()
+                try:
+                    await self.recover(db)
+                except Exception as e:
+                    print(f"⚠️ Feedback enrichment rescan failed: {e}")
+
+            batch = await self._next_batch(ENRICH_RESCAN_SECONDS)
+            ENRICH_PENDING.set(value=self.pending)
+            if not batch:
+                continue
+            try:
+                await self.enrich_batch(db, batch)
+            except Exception as e:
+                # Left pending; retried by a later rescan
+                self.failed_batches += 1
+                print(f"⚠️ Feedback enrichment batch failed: {e}")
+            finally:
+                self._queued.difference_update(item["_id"] for item in batch)
+
+    async def recover(self, db: AsyncIOMotorDatabase, stale_seconds: float = ENRICH_STALE_SECONDS) -> int:
+        """Re-queue interactions that have been pending longer than stale_seconds."""
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+        room = ENRICH_QUEUE_SIZE - self.pending
+        if room <= 0:
+            return 0
+        count = 0
+        async for doc in repository.pending_feedback(db, cutoff, room):
+            self.enqueue(doc)
+            count += 1
+        self.recovered += count
+        return count
+
+    async def enrich_batch(self, db: AsyncIOMotorDatabase, batch: List[Dict[str, Any]]) -> int:
+        """Score a batch and write it back. Returns how many interactions were updated."""
+        started = time.perf_counter()
+        texts = [item["feedbackText"] for item in batch]
+        # One forward pass for the whole batch, off the event loop
+        scores = await asyncio.to_thread(nlp_engine.analyze_feedback_batch, texts)
+        inference_seconds = time.perf_counter() - started
+
+        now = datetime.utcnow()
+        updates = []
+        logs = []
+        for item, (sentiment_score, confusion_flag) in zip(batch, scores):
+            updates.append(UpdateOne(
+                {"_id": item["_id"], PENDING_FIELD: True},
+                {
+                    "$set": {"sentimentScore": sentiment_score, "confusionFlag": confusion_flag},
+                    "$unset": {PENDING_FIELD: ""},
+                },
+            ))
+            logs.append({
+                "userId": item["userId"],
+                "timestamp": now,
+                "text": item["feedbackText"],
+                "sentiment_score": sentiment_score,
+                "confusion_flag": confusion_flag,
+                "interactionId": str(item["_id"]),
+            })
+
+        result = await db["interactions"].bulk_write(updates, ordered=False)
+        await db["nlp_analyses"].insert_many(logs, ordered=False)
+        for doc in logs:
+            publish_local("nlp_analyses", doc)
+        response_cache.bump("nlp_analyses")
+        response_cache.bump("interactions")
+
+        for item in batch:
+            ENRICH_LAG.observe((now - item["timestamp"]).total_seconds())
+        self.enriched += result.modified_count
+        ENRICH_TOTAL.inc(amount=result.modified_count)
+        self.last_batch = {
+            "size": len(batch),
+            "modified": result.modified_count,
+            "inference_ms": round(inference_seconds * 1000, 2),
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+            "at": now.isoformat(),
+        }
+        return result.modified_count
+
+    async def lag(self, db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+        """Pending work across all workers (from Mongo) plus this process's queue."""
+        oldest = await repository.oldest_pending_feedback(db)
+        pending_in_db = await repository.count_pending_feedback(db)
+        oldest_age = None
+        if oldest is not None and oldest.get("timestamp"):
+            oldest_age = round((datetime.utcnow() - oldest["timestamp"]).total_seconds(), 3)
+        return {
+            "mode": FEEDBACK_ENRICHMENT,
+            "pending": pending_in_db,
+            "oldest_pending_seconds": oldest_age,
+            "queued_in_process": self.pending,
+            "enriched": self.enriched,
+            "recovered": self.recovered,
+            "dropped_from_queue": self.dropped,
+            "failed_batches": self.failed_batches,
+            "last_batch": self.last_batch,
+        }
+
+
+enricher = FeedbackEnricher()
@@ -0,0 +1,148 @@
+"""
+Group commit for small, hot inserts (interactions, nlp_analyses).
+
+Concurrent requests that insert into the same collection within
+GROUP_COMMIT_LINGER_MS of each other share one unordered insert_many. Each
+caller awaits its own future, which completes once the batch is
+acknowledged (write concern from GROUP_COMMIT_W / GROUP_COMMIT_JOURNAL,
+default the client's), so a request still returns only after its document
+is written. A batch is sent as soon as it
+reaches GROUP_COMMIT_MAX_BATCH documents or the linger time is up, whichever
+comes first; an idle server pays at most the linger time per write.
+
+GROUP_COMMIT_LINGER_MS=0 turns batching off (plain insert_one).
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError
+
+from . import metrics
+
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "500"))
+GROUP_COMMIT_LINGER_SECONDS = float(os.getenv("GROUP_COMMIT_LINGER_MS", "5")) / 1000
+# "1", "majority", ... ("0" = unacknowledged, futures complete on send);
+# unset keeps the client's write concern
+GROUP_COMMIT_W = os.getenv("GROUP_COMMIT_W", "")
+GROUP_COMMIT_JOURNAL = os.getenv("GROUP_COMMIT_JOURNAL", "").lower() in ("1", "true", "yes")
+
+BATCH_SIZE = metrics.registry.histogram(
+    "group_commit_batch_size",
+    "Documents per group-commit insert_many",
+    ("collection",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+
+
+def _write_concern() -> Optional[WriteConcern]:
+    if not GROUP_COMMIT_W and not GROUP_COMMIT_JOURNAL:
+        return None
+    w: Any = None
+    if GROUP_COMMIT_W:
+        w = int(GROUP_COMMIT_W) if GROUP_COMMIT_W.isdigit() else GROUP_COMMIT_W
+    return WriteConcern(w=w, j=True if GROUP_COMMIT_JOURNAL else None)
+
+
+class _Batch:
+    __slots__ = ("db", "collection", "docs", "futures", "timer")
+
+    def __init__(self, db: AsyncIOMotorDatabase, collection: str):
+        self.db = db
+        self.collection = collection
+        self.docs: List[Dict[str, Any]] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class GroupCommitter:
+    def __init__(
+        self,
+        max_batch: int = GROUP_COMMIT_MAX_BATCH,
+        linger: float = GROUP_COMMIT_LINGER_SECONDS,
+    ):
+        self.max_batch = max_batch
+        self.linger = linger
+        self.write_concern = _write_concern()
+        # (database name, collection) -> batch still collecting documents
+        self._open: Dict[Tuple[str, str], _Batch] = {}
+        self._flushing: set = set()
+        self.batches = 0
+        self.documents = 0
+
+    async def insert(self, db: AsyncIOMotorDatabase, collection: str, doc: Dict[str, Any]) -> None:
+        """
+        Insert `doc` as part of the current batch for `collection` and wait
+        until that batch is written. Like insert_one, sets doc["_id"].
+        """
+        if self.linger <= 0:
+            await self._collection(db, collection).insert_one(doc)
+            return
+
+        loop = asyncio.get_running_loop()
+        key = (db.name, collection)
+        batch = self._open.get(key)
+        if batch is None:
+            batch = self._open[key] = _Batch(db, collection)
+            batch.timer = loop.call_later(self.linger, self._close, key, batch)
+
+        future = loop.create_future()
+        batch.docs.append(doc)
+        batch.futures.append(future)
+        if len(batch.docs) >= self.max_batch:
+            self._close(key, batch)
+        await future
+
+    def _collection(self, db: AsyncIOMotorDatabase, name: str):
+        if self.write_concern is None:
+            return db[name]
+        return db[name].with_options(write_concern=self.write_concern)
+
+    def _close(self, key: Tuple[str, str], batch: _Batch) -> None:
+        """Stop collecting into `batch` and send it."""
+        if self._open.get(key) is batch:
+            del self._open[key]
+        if batch.timer is not None:
+            batch.timer.cancel()
+            batch.timer = None
+        task = asyncio.ensure_future(self._flush(batch))
+        # Keep a reference so the task isn't garbage collected mid-write
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self, batch: _Batch) -> None:
+        collection = self._collection(batch.db, batch.collection)
+        failed: Dict[int, Exception] = {}
+        try:
+            await collection.insert_many(batch.docs, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: everything except the reported indexes was written
+            for error in e.details.get("writeErrors", []):
+                failed[error["index"]] = BulkWriteError({"writeErrors": [error]})
+        except Exception as e:
+            failed = {i: e for i in range(len(batch.docs))}
+
+        self.batches += 1
+        self.documents += len(batch.docs)
+        BATCH_SIZE.observe(len(batch.docs), batch.collection)
+        for i, future in enumerate(batch.futures):
+            if future.done():  # The request was cancelled
+                continue
+            if i in failed:
+                future.set_exception(failed[i])
+            else:
+                future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "documents": self.documents,
+            "avg_batch": round(self.documents / self.batches, 2) if self.batches else 0,
+            "open_batches": len(self._open),
+        }
+
+
+group_commit = GroupCommitter()
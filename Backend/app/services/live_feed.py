@@ -0,0 +1,165 @@
+"""
+In-process pub/sub hub behind the admin live activity feed.
+
+The submit and logging paths publish every interaction, ML prediction and NLP
+analysis as it is written. Each subscriber (one per /admin/live connection)
+gets its own bounded queue; a client that falls too far behind is dropped and
+can reconnect with Last-Event-ID to replay what it missed from the hub's
+recent history.
+
+Event ids are `<boot id>-<sequence>`. The boot id is random per hub, so an id
+from another worker process (or from before a restart) is recognised as
+foreign: the client gets a reset instead of a replay of unrelated events.
+
+Set LIVE_FEED_SOURCE=changestream to feed the hub from a MongoDB change stream
+instead (requires a replica set). Local publishes are then ignored so events
+are not delivered twice.
+"""
+
+import asyncio
+import json
+import os
+import secrets
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from .log_export import json_default
+
+LIVE_FEED_SOURCE = os.getenv("LIVE_FEED_SOURCE", "local").lower()
+LIVE_FEED_HISTORY = int(os.getenv("LIVE_FEED_HISTORY", "1000"))
+LIVE_FEED_QUEUE_SIZE = int(os.getenv("LIVE_FEED_QUEUE_SIZE", "256"))
+
+# Collection -> event type published on the feed
+EVENT_TYPES: Dict[str, str] = {
+    "interactions": "interaction",
+    "ml_predictions": "prediction",
+    "nlp_analyses": "nlp_analysis",
+}
+
+# Fields not worth pushing to every dashboard
+_DROPPED_FIELDS = ("features",)
+
+
+class LiveEvent:
+    __slots__ = ("id", "seq", "type", "data")
+
+    def __init__(self, boot_id: str, seq: int, type: str, data: str):
+        self.id = f"{boot_id}-{seq}"
+        self.seq = seq
+        self.type = type
+        self.data = data
+
+    def to_sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {self.data}\n\n"
+
+
+class Subscription:
+    """One connected client. `closed` is set when the hub drops it for lagging."""
+
+    def __init__(self, maxsize: int):
+        self.queue: "asyncio.Queue[LiveEvent]" = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+
+
+class LiveHub:
+    def __init__(self, history: int = LIVE_FEED_HISTORY, queue_size: int = LIVE_FEED_QUEUE_SIZE):
+        self._history: Deque[LiveEvent] = deque(maxlen=history)
+        self._subscribers: Set[Subscription] = set()
+        self._queue_size = queue_size
+        self.boot_id = secrets.token_hex(4)
+        self._next_seq = 1
+        self.dropped_clients = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, doc: Dict[str, Any]) -> LiveEvent:
+        """
+        Fan an event out to every subscriber without awaiting.
+        Must be called from the event loop thread.
+        """
+        payload = {k: v for k, v in doc.items() if k not in _DROPPED_FIELDS}
+        event = LiveEvent(self.boot_id, self._next_seq, event_type, json.dumps(payload, default=json_default))
+        self._next_seq += 1
+        self._history.append(event)
+
+        for sub in list(self._subscribers):
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumer: cut it loose rather than buffer without bound.
+                # The client reconnects with Last-Event-ID and replays from history.
+                sub.closed = True
+                self._subscribers.discard(sub)
+                self.dropped_clients += 1
+        return event
+
+    def _own_seq(self, event_id: str) -> Optional[int]:
+        """The sequence number of an id this hub issued, else None."""
+        boot_id, _, seq = event_id.rpartition("-")
+        if boot_id != self.boot_id or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Tuple[Subscription, bool]:
+        """
+        Register a client. Returns (subscription, complete) where `complete`
+        is False if events after `last_event_id` have already left the history
+        or the id was issued by another hub (worker process or restart),
+        meaning the client should refetch a snapshot.
+        """
+        sub = Subscription(self._queue_size)
+        complete = True
+        if last_event_id:
+            last_seq = self._own_seq(last_event_id)
+            if last_seq is None:
+                complete = False
+            else:
+                missed: List[LiveEvent] = [e for e in self._history if e.seq > last_seq]
+                oldest = self._history[0].seq if self._history else self._next_seq
+                complete = oldest - 1 <= last_seq < self._next_seq
+                # Replay only what fits; anything older is covered by the reset
+                for event in missed[-self._queue_size:]:
+                    sub.queue.put_nowait(event)
+                if len(missed) > self._queue_size:
+                    complete = False
+        self._subscribers.add(sub)
+        return sub, complete
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._subscribers.discard(sub)
+
+
+hub = LiveHub()
+
+
+def publish_local(collection: str, doc: Dict[str, Any]) -> None:
+    """Publish a freshly written document, unless the change stream owns the feed."""
+    if LIVE_FEED_SOURCE == "changestream":
+        return
+    hub.publish(EVENT_TYPES[collection], doc)
+
+
+async def run_change_stream(db: AsyncIOMotorDatabase) -> None:
+    """Feed the hub from MongoDB inserts (replica set only). Runs until cancelled."""
+    pipeline = [
+        {"$match": {
+            "operationType": "insert",
+            "ns.coll": {"$in": list(EVENT_TYPES)},
+        }}
+    ]
+    resume_token = None
+    while True:
+        try:
+            async with db.watch(pipeline, resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    hub.publish(EVENT_TYPES[change["ns"]["coll"]], change["fullDocument"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Live feed change stream error: {e}; retrying in 5s")
+            await asyncio.sleep(5)
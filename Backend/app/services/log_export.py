@@ -0,0 +1,163 @@
+"""
+Helpers for paging and exporting admin log collections.
+
+Pages are keyed on (timestamp, _id) so a page never re-reads the documents
+before it, and exports are streamed straight from the Motor cursor so memory
+stays flat no matter how many documents are written.
+"""
+
+import base64
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+# Newest first, with _id as a tie-breaker for documents sharing a timestamp
+LOG_SORT = [("timestamp", -1), ("_id", -1)]
+
+# Fields that are large and rarely needed; excluded unless asked for
+HEAVY_FIELDS: Dict[str, List[str]] = {
+    "ml_predictions": ["features"],
+    "nlp_analyses": [],
+    "interactions": [],
+}
+
+EXPORT_BATCH_SIZE = 500
+
+
+def encode_cursor(doc: Dict[str, Any]) -> Optional[str]:
+    """Build an opaque cursor pointing just past `doc`."""
+    ts = doc.get("timestamp")
+    if not isinstance(ts, datetime):
+        return None
+    raw = json.dumps({"ts": ts.isoformat(), "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Turn a cursor back into a keyset filter for the next page."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+        ts = datetime.fromisoformat(raw["ts"])
+        oid = ObjectId(raw["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {
+        "$or": [
+            {"timestamp": {"$lt": ts}},
+            {"timestamp": ts, "_id": {"$lt": oid}},
+        ]
+    }
+
+
+def build_projection(
+    collection: str,
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+) -> Optional[Dict[str, int]]:
+    """
+    Build a Mongo projection from the `fields` / `include` query parameters.
+
+    - fields: comma-separated whitelist (timestamp is always kept for paging)
+    - include: comma-separated heavy fields to add back to the default view
+    """
+    if fields:
+        wanted = {f.strip() for f in fields.split(",") if f.strip()}
+        wanted.add("timestamp")
+        return {f: 1 for f in sorted(wanted)}
+
+    requested = {f.strip() for f in (include or "").split(",") if f.strip()}
+    excluded = [f for f in HEAVY_FIELDS.get(collection, []) if f not in requested]
+    if not excluded:
+        return None
+    return {f: 0 for f in excluded}
+
+
+def json_default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def serialize_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Make a log document JSON friendly (ObjectId/datetime to strings)."""
+    doc["_id"] = str(doc["_id"])
+    if isinstance(doc.get("timestamp"), datetime):
+        doc["timestamp"] = doc["timestamp"].isoformat()
+    return doc
+
+
+async def fetch_page(
+    col: AsyncIOMotorCollection,
+    query: Dict[str, Any],
+    projection: Optional[Dict[str, int]],
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Read one keyset page. Returns the serialized docs plus the cursor for
+    the following page (None once the collection is exhausted).
+    """
+    if cursor:
+        query = {"$and": [query, decode_cursor(cursor)]} if query else decode_cursor(cursor)
+
+    # Read one extra document to know whether another page exists
+    docs = await col.find(query, projection).sort(LOG_SORT).limit(limit + 1).to_list(length=limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    next_cursor = encode_cursor(docs[-1]) if has_more and docs else None
+    return {
+        "docs": [serialize_doc(doc) for doc in docs],
+        "next_cursor": next_cursor,
+    }
+
+
+async def _ndjson_lines(
+    col: AsyncIOMotorCollection,
+    query: Dict[str, Any],
+    projection: Optional[Dict[str, int]],
+    limit: Optional[int],
+) -> AsyncIterator[bytes]:
+    find = col.find(query, projection).sort(LOG_SORT).batch_size(EXPORT_BATCH_SIZE)
+    if limit:
+        find = find.limit(limit)
+    async for doc in find:
+        yield (json.dumps(doc, default=json_default) + "\n").encode("utf-8")
+
+
+async def _gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # wbits=31 -> gzip container so the output is a regular .gz file
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def stream_ndjson(
+    col: AsyncIOMotorCollection,
+    query: Dict[str, Any],
+    projection: Optional[Dict[str, int]],
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    gzip: bool = False,
+) -> AsyncIterator[bytes]:
+    """
+    Stream documents as newline-delimited JSON, one line per document.
+    Only one cursor batch is held in memory at a time.
+    """
+    if cursor:
+        query = {"$and": [query, decode_cursor(cursor)]} if query else decode_cursor(cursor)
+
+    lines = _ndjson_lines(col, query, projection, limit)
+    return _gzip_stream(lines) if gzip else lines
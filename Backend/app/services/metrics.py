@@ -0,0 +1,270 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Counters, gauges and fixed-bucket histograms kept as plain Python numbers;
+recording is a dict lookup, a bisect and an increment, so it is cheap
+enough to leave on for every request. GET /metrics renders everything.
+
+Request stages are timed with spans:
+
+    with metrics.span("next.build_features"):
+        features = build_features(logs)
+
+which land in `stage_duration_seconds{stage="next.build_features"}`.
+MetricsMiddleware adds per-route request counts, durations and an in-flight
+gauge. Values are per process; with several workers, scrape each one.
+
+Overhead: python -m benchmarks.suite run --only metrics
+"""
+
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Seconds; covers sub-millisecond stages up to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, label_names)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float) -> None:
+        self.values[labels] = value
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self.children: Dict[LabelValues, _HistogramChild] = {}
+
+    def labels(self, *labels: str) -> _HistogramChild:
+        child = self.children.get(labels)
+        if child is None:
+            child = self.children[labels] = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float, *labels: str) -> None:
+        self.labels(*labels).observe(value)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for labels, child in sorted(self.children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            label_str = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_str} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "stage_duration_seconds", "Time spent in one stage of a request handler", ("stage",)
+)
+REQUESTS_TOTAL = registry.counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being handled")
+MODEL_LOAD_SECONDS = registry.histogram(
+    "model_load_seconds", "Time to verify and load a model version", ("version",)
+)
+MODEL_INFO = registry.gauge("model_version_info", "Model version currently serving (value 1)", ("version",))
+
+
+# ------------- SPANS -------------
+
+class _Span:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child: _HistogramChild):
+        self.child = child
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.child.observe(time.perf_counter() - self.start)
+
+
+def span(stage: str) -> _Span:
+    """Time a block into stage_duration_seconds{stage=...}. Exceptions are timed too."""
+    return _Span(STAGE_SECONDS.labels(stage))
+
+
+# ------------- HTTP -------------
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no per-request BaseHTTPMiddleware task), so it
+    adds no overhead to streaming responses. Requests are labelled by route
+    template ("/api/items/{item_id}"), not raw path, to keep label
+    cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            route_path = _route_template(scope)
+            method = scope.get("method", "")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method, route_path)
+            REQUESTS_TOTAL.inc(method, route_path, str(status["code"]))
+
+
+def _route_template(scope) -> str:
+    """
+    Full route template of the matched route. Depending on the FastAPI
+    version, routers included with a prefix either carry the prefix in
+    route.path or are mounted below it, so take the prefix from the raw path.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    path_parts = scope.get("path", "").rstrip("/").split("/")
+    template_parts = template.rstrip("/").split("/")
+    prefix = "/".join(path_parts[:max(1, len(path_parts) - len(template_parts) + 1)])
+    return prefix + template
+
+
+def record_model_load(version: str, seconds: float) -> None:
+    MODEL_LOAD_SECONDS.observe(seconds, version)
+
+
+def set_model_version(version: Optional[str]) -> None:
+    MODEL_INFO.values.clear()
+    if version:
+        MODEL_INFO.set(version, value=1)
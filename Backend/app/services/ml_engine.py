@@ -2,18 +2,21 @@
 
 from __future__ import annotations
 
+import asyncio
 from collections import namedtuple
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List
 
-import joblib
 import numpy as np
 from sklearn.cluster import KMeans
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.neural_network import MLPClassifier
 
-# What we return to activity.py
-Reco = namedtuple("Reco", ["topic", "difficulty", "modality"])
+from . import decision_table
+from .model_registry import ARTIFACTS, ModelRegistry, ModelSet
+
+# What we return to activity.py (model_version: the registry version that answered)
+Reco = namedtuple("Reco", ["topic", "difficulty", "modality", "model_version"], defaults=(None,))
 
 # Paths where models will be saved/loaded
 # Models saved in backend/models/ directory
@@ -21,14 +24,15 @@ _current_file = Path(__file__)
 MODELS_DIR = _current_file.parent.parent.parent / "models"
 MODELS_DIR.mkdir(exist_ok=True)
 
-DIFF_MODEL_PATH = MODELS_DIR / "difficulty_rf.joblib"
-CLUSTER_MODEL_PATH = MODELS_DIR / "behaviour_kmeans.joblib"
-MLP_MODEL_PATH = MODELS_DIR / "activity_mlp.joblib"
+# Fixed paths used before the registry; imported as the "baseline" version
+DIFF_MODEL_PATH = MODELS_DIR / ARTIFACTS["difficulty"]
+CLUSTER_MODEL_PATH = MODELS_DIR / ARTIFACTS["cluster"]
+MLP_MODEL_PATH = MODELS_DIR / ARTIFACTS["activity"]
+
+BASELINE_VERSION = "baseline"
 
-# In-memory models
-_difficulty_model: Optional[RandomForestClassifier] = None
-_cluster_model: Optional[KMeans] = None
-_activity_mlp: Optional[MLPClassifier] = None
+# Versioned models; see model_registry.py
+registry = ModelRegistry(MODELS_DIR)
 
 
 # ------------- FEATURE → VECTOR HELPER -------------
@@ -56,15 +60,14 @@ def features_to_vector(features: Dict) -> np.ndarray:
 
 # ------------- TRAINING DUMMY MODELS (NO REAL DATA YET) -------------
 
-def _train_dummy_models():
+def _train_dummy_models() -> Dict[str, object]:
     """
     Train very small dummy models on synthetic data so that
     your backend actually uses Logistic/RandomForest/KMeans/MLP
     even before you train on real logs.
 
-    You can later replace this with a proper offline training script.
+    Real logs are trained on with `python -m app.services.model_trainer`.
     """
-    global _difficulty_model, _cluster_model, _activity_mlp
 
     # Create small synthetic dataset: X in [0..1] for each feature
     rng = np.random.default_rng(42)
@@ -114,37 +117,62 @@ def _train_dummy_models():
     )
     mlp.fit(X, y_activity)
 
-    # Save models
-    joblib.dump(diff_model, DIFF_MODEL_PATH)
-    joblib.dump(cluster_model, CLUSTER_MODEL_PATH)
-    joblib.dump(mlp, MLP_MODEL_PATH)
-
-    _difficulty_model = diff_model
-    _cluster_model = cluster_model
-    _activity_mlp = mlp
+    return {"difficulty": diff_model, "cluster": cluster_model, "activity": mlp}
 
 
 # ------------- LOADING MODELS -------------
 
-def _load_models():
+def _bootstrap_registry() -> None:
     """
-    Load models from disk; if they don't exist, train dummy ones.
+    First start with an empty registry: import the legacy fixed-path models
+    if there are any, otherwise train dummy ones, as the baseline version.
     """
-    global _difficulty_model, _cluster_model, _activity_mlp
-
-    if (
-        _difficulty_model is not None
-        and _cluster_model is not None
-        and _activity_mlp is not None
-    ):
-        return
-
-    if DIFF_MODEL_PATH.exists() and CLUSTER_MODEL_PATH.exists() and MLP_MODEL_PATH.exists():
-        _difficulty_model = joblib.load(DIFF_MODEL_PATH)
-        _cluster_model = joblib.load(CLUSTER_MODEL_PATH)
-        _activity_mlp = joblib.load(MLP_MODEL_PATH)
-    else:
-        _train_dummy_models()
+    if not (MODELS_DIR / BASELINE_VERSION).exists():
+        if DIFF_MODEL_PATH.exists() and CLUSTER_MODEL_PATH.exists() and MLP_MODEL_PATH.exists():
+            registry.import_legacy(BASELINE_VERSION, {
+                "difficulty": DIFF_MODEL_PATH,
+                "cluster": CLUSTER_MODEL_PATH,
+                "activity": MLP_MODEL_PATH,
+            })
+        else:
+            registry.publish(BASELINE_VERSION, _train_dummy_models(), {"trained_on": "synthetic"})
+    registry.activate(BASELINE_VERSION)
+
+
+def load_models() -> ModelSet:
+    """
+    The live model set. After the first load this is a plain attribute read;
+    swaps happen through registry.reload().
+    """
+    models = registry.current
+    if models is not None:
+        return models
+    if registry.active_version() is None:
+        _bootstrap_registry()
+    registry.sync()
+    return registry.current
+
+
+async def preload() -> None:
+    """
+    Load the active version off the event loop at startup, so no request
+    pays for it. In table mode this also builds the decision table (every
+    cell predicted by the full models), which takes seconds.
+    """
+    await asyncio.to_thread(load_models)
+
+
+def _attach_table(models: ModelSet) -> None:
+    models.table = decision_table.load_or_build(models, registry.root / models.version, FEATURE_KEYS)
+
+
+if decision_table.RECOMMENDER_MODE == "table":
+    registry.on_load = _attach_table
+
+
+def current_version() -> str:
+    models = registry.current
+    return models.version if models is not None else (registry.active_version() or BASELINE_VERSION)
 
 
 # ------------- PUBLIC FUNCTION USED BY activity.py -------------
@@ -157,13 +185,27 @@ def recommend_next(features: Dict) -> Reco:
       - RandomForest to predict difficulty
       - KMeans to assign behaviour cluster
       - MLP to predict activity type (topic + modality)
+
+    With RECOMMENDER_MODE=table the precomputed decision table answers instead.
     """
-    _load_models()
+    # One reference for the whole request, even if a swap happens meanwhile
+    models = load_models()
 
-    x_vec = features_to_vector(features)
+    if models.table is not None:
+        diff_label, activity_label = models.table.lookup(features)
+    else:
+        x_vec = features_to_vector(features)
+
+        # 1) Difficulty prediction (RandomForest)
+        diff_label = int(models.difficulty.predict(x_vec)[0])  # 0/1/2
+
+        # 2) Behaviour clustering (KMeans) — we might store this later
+        cluster_id = int(models.cluster.predict(x_vec)[0])
+        # You can log cluster_id into DB if you want via activity.py
+
+        # 3) Activity recommendation (MLP)
+        activity_label = int(models.activity.predict(x_vec)[0])  # 0..3
 
-    # 1) Difficulty prediction (RandomForest)
-    diff_label = int(_difficulty_model.predict(x_vec)[0])  # 0/1/2
     if diff_label == 0:
         difficulty = "easy"
     elif diff_label == 1:
@@ -171,13 +213,6 @@ def recommend_next(features: Dict) -> Reco:
     else:
         difficulty = "hard"
 
-    # 2) Behaviour clustering (KMeans) — we might store this later
-    cluster_id = int(_cluster_model.predict(x_vec)[0])
-    # You can log cluster_id into DB if you want via activity.py
-
-    # 3) Activity recommendation (MLP)
-    activity_label = int(_activity_mlp.predict(x_vec)[0])  # 0..3
-
     # Decode activity_label into topic + modality
     if activity_label == 0:
         topic = "reading"
@@ -194,4 +229,4 @@ def recommend_next(features: Dict) -> Reco:
 
     # For now we don't pass cluster_id back; you can
     # return it too if needed: Reco(topic, difficulty, modality, cluster_id)
-    return Reco(topic=topic, difficulty=difficulty, modality=modality)
+    return Reco(topic=topic, difficulty=difficulty, modality=modality, model_version=models.version)
@@ -2,10 +2,14 @@
 Service to log ML and NLP model predictions for performance tracking
 """
 
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from .group_commit import group_commit
+from .live_feed import publish_local
+from .response_cache import response_cache
+
 
 async def log_ml_prediction(
     db: AsyncIOMotorDatabase,
@@ -13,9 +17,11 @@ async def log_ml_prediction(
     features: Dict,
     prediction: Dict,  # {topic, difficulty, modality}
     actual_outcome: Optional[Dict] = None,  # {isCorrect, timeTaken, etc.}
+    model_version: Optional[str] = None,
 ):
     """
     Log ML model prediction for later performance analysis.
+    actual_outcome is normally left empty and filled in by the outcome joiner.
     """
     predictions_col = db["ml_predictions"]
     
@@ -25,9 +31,12 @@ async def log_ml_prediction(
         "features": features,
         "prediction": prediction,
         "actual_outcome": actual_outcome,
+        "model_version": model_version,
     }
     
     await predictions_col.insert_one(doc)
+    publish_local("ml_predictions", doc)
+    response_cache.bump("ml_predictions")
 
 
 async def log_nlp_analysis(
@@ -40,8 +49,6 @@ async def log_nlp_analysis(
     """
     Log NLP sentiment analysis for tracking.
     """
-    nlp_logs_col = db["nlp_analyses"]
-    
     doc = {
         "userId": userId,
         "timestamp": datetime.utcnow(),
@@ -50,7 +57,24 @@ async def log_nlp_analysis(
         "confusion_flag": confusion_flag,
     }
     
-    await nlp_logs_col.insert_one(doc)
+    await group_commit.insert(db, "nlp_analyses", doc)
+    publish_local("nlp_analyses", doc)
+    response_cache.bump("nlp_analyses")
+
+
+async def log_nlp_analyses(db: AsyncIOMotorDatabase, entries: List[Dict]):
+    """
+    log_nlp_analysis for many analyses in one insert.
+    Each entry: {userId, text, sentiment_score, confusion_flag}.
+    """
+    if not entries:
+        return
+    now = datetime.utcnow()
+    docs = [{"userId": e.get("userId"), "timestamp": now, **e} for e in entries]
+    await db["nlp_analyses"].insert_many(docs, ordered=False)
+    for doc in docs:
+        publish_local("nlp_analyses", doc)
+    response_cache.bump("nlp_analyses")
 
 
 async def log_rephrase_request(
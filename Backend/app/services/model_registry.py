@@ -0,0 +1,271 @@
+"""
+Versioned model registry with hot swap.
+
+Layout under MODELS_DIR:
+
+    <version>/difficulty_rf.joblib
+    <version>/behaviour_kmeans.joblib
+    <version>/activity_mlp.joblib
+    <version>/manifest.json    # version, created_at, sha256 of every artifact
+    active.json                # {"version": ..., "history": [older active versions]}
+
+A version is loaded by verifying its checksums and memory-mapping the
+artifacts (`joblib.load(mmap_mode="r")`), so the MLP and KMeans arrays are
+shared page cache across workers (sklearn copies forest tree nodes on
+unpickling, so those stay per process). The
+loaded set is published by replacing one attribute: requests read
+`registry.current` once and keep using that ModelSet to the end, so a swap
+never blocks the hot path and in-flight requests finish on the old version.
+
+Every worker polls active.json (MODEL_REGISTRY_POLL_SECONDS) and swaps when
+it changes, so activating a version reaches all workers without a restart.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import joblib
+
+from . import metrics
+
+MODEL_REGISTRY_POLL_SECONDS = float(os.getenv("MODEL_REGISTRY_POLL_SECONDS", "30"))
+
+# Model role -> artifact file name inside a version directory
+ARTIFACTS = {
+    "difficulty": "difficulty_rf.joblib",
+    "cluster": "behaviour_kmeans.joblib",
+    "activity": "activity_mlp.joblib",
+}
+MANIFEST = "manifest.json"
+ACTIVE = "active.json"
+# Rollback history kept in active.json
+HISTORY_LENGTH = 10
+# Version names are single directory names under MODELS_DIR
+VERSION_NAME = re.compile(r"^[A-Za-z0-9._-]+$")
+
+
+class ModelRegistryError(Exception):
+    pass
+
+
+class UnknownModelVersion(ModelRegistryError):
+    pass
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path: Path, data: Dict[str, Any]) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+class ModelSet:
+    """One loaded, immutable version of all three models."""
+
+    __slots__ = ("version", "difficulty", "cluster", "activity", "loaded_at", "table")
+
+    def __init__(self, version: str, difficulty, cluster, activity):
+        self.version = version
+        self.difficulty = difficulty
+        self.cluster = cluster
+        self.activity = activity
+        self.loaded_at = datetime.utcnow()
+        # Optional precomputed lookup (see decision_table.py)
+        self.table = None
+
+
+class ModelRegistry:
+    def __init__(self, root: Path):
+        self.root = root
+        self.current: Optional[ModelSet] = None
+        self._active_mtime: Optional[float] = None
+        self.swaps = 0
+        # Called with every freshly loaded ModelSet before it is swapped in
+        self.on_load: Optional[Callable[[ModelSet], None]] = None
+
+    # ------------- VERSIONS ON DISK -------------
+
+    def _version_dir(self, version: str) -> Path:
+        """A version's directory; never anything outside the registry root."""
+        if not VERSION_NAME.match(version) or version in (".", ".."):
+            raise UnknownModelVersion(f"Invalid model version name: {version!r}")
+        return self.root / version
+
+    def write_manifest(self, version: str, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Checksum a version directory's artifacts and write its manifest."""
+        version_dir = self._version_dir(version)
+        files = {}
+        for name in ARTIFACTS.values():
+            path = version_dir / name
+            if not path.exists():
+                raise ModelRegistryError(f"{version}: missing {name}")
+            files[name] = _sha256(path)
+        manifest = {
+            "version": version,
+            "created_at": datetime.utcnow().isoformat(),
+            "files": files,
+            **(extra or {}),
+        }
+        _write_json_atomic(version_dir / MANIFEST, manifest)
+        return manifest
+
+    def publish(self, version: str, models: Dict[str, Any], extra: Optional[Dict[str, Any]] = None) -> Path:
+        """Dump fitted models as a new version (not activated)."""
+        version_dir = self._version_dir(version)
+        version_dir.mkdir(parents=True, exist_ok=False)
+        for role, name in ARTIFACTS.items():
+            joblib.dump(models[role], version_dir / name)
+        self.write_manifest(version, extra)
+        return version_dir
+
+    def versions(self) -> List[Dict[str, Any]]:
+        result = []
+        for manifest_path in sorted(self.root.glob(f"*/{MANIFEST}")):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            result.append({k: v for k, v in manifest.items() if k != "files"})
+        return result
+
+    def _read_active(self) -> Dict[str, Any]:
+        try:
+            with open(self.root / ACTIVE) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": None, "history": []}
+
+    def active_version(self) -> Optional[str]:
+        return self._read_active().get("version")
+
+    def activate(self, version: str) -> None:
+        """Point active.json at `version` (verified first). Workers pick it up on their next poll."""
+        self._verify(version)
+        active = self._read_active()
+        if active.get("version") == version:
+            return
+        history = ([active["version"]] if active.get("version") else []) + active.get("history", [])
+        _write_json_atomic(self.root / ACTIVE, {
+            "version": version,
+            "activated_at": datetime.utcnow().isoformat(),
+            "history": history[:HISTORY_LENGTH],
+        })
+
+    def rollback(self) -> str:
+        """Re-activate the previously active version."""
+        active = self._read_active()
+        history = active.get("history", [])
+        if not history:
+            raise ModelRegistryError("No previous version to roll back to")
+        previous = history[0]
+        self._verify(previous)
+        _write_json_atomic(self.root / ACTIVE, {
+            "version": previous,
+            "activated_at": datetime.utcnow().isoformat(),
+            "history": history[1:],
+        })
+        return previous
+
+    def import_legacy(self, version: str, paths: Dict[str, Path]) -> None:
+        """Copy pre-registry fixed-path artifacts into a version directory."""
+        version_dir = self._version_dir(version)
+        version_dir.mkdir(parents=True, exist_ok=True)
+        for role, name in ARTIFACTS.items():
+            shutil.copyfile(paths[role], version_dir / name)
+        self.write_manifest(version, {"imported_from": "legacy"})
+
+    # ------------- LOADING -------------
+
+    def _verify(self, version: str) -> Dict[str, Any]:
+        version_dir = self._version_dir(version)
+        try:
+            with open(version_dir / MANIFEST) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            raise UnknownModelVersion(f"Unknown model version: {version}")
+        for name, expected in manifest["files"].items():
+            path = version_dir / name
+            if not path.exists() or _sha256(path) != expected:
+                raise ModelRegistryError(f"{version}: checksum mismatch for {name}")
+        return manifest
+
+    def load(self, version: str) -> ModelSet:
+        """Verify and memory-map one version. Does not publish it."""
+        started = time.perf_counter()
+        self._verify(version)
+        version_dir = self._version_dir(version)
+        models = {role: joblib.load(version_dir / name, mmap_mode="r") for role, name in ARTIFACTS.items()}
+        model_set = ModelSet(version, **models)
+        if self.on_load is not None:
+            self.on_load(model_set)
+        metrics.record_model_load(version, time.perf_counter() - started)
+        return model_set
+
+    def swap(self, models: ModelSet) -> None:
+        # A single reference assignment; readers see either the old or the new set
+        self.current = models
+        self.swaps += 1
+        metrics.set_model_version(models.version)
+
+    def _active_changed(self) -> bool:
+        try:
+            mtime = (self.root / ACTIVE).stat().st_mtime
+        except FileNotFoundError:
+            return False
+        return mtime != self._active_mtime
+
+    def sync(self) -> bool:
+        """Load and swap to the active version if it changed. Returns True if swapped."""
+        if self.current is not None and not self._active_changed():
+            return False
+        path = self.root / ACTIVE
+        mtime = path.stat().st_mtime if path.exists() else None
+        version = self.active_version()
+        if version is None:
+            return False
+        swapped = False
+        if self.current is None or self.current.version != version:
+            self.swap(self.load(version))
+            swapped = True
+        # Only remember the pointer once it loaded, so a failed load is retried
+        self._active_mtime = mtime
+        return swapped
+
+    async def reload(self) -> bool:
+        """sync() off the event loop (checksums and loading touch the disk)."""
+        return await asyncio.to_thread(self.sync)
+
+    async def run_watch(self, interval: float = MODEL_REGISTRY_POLL_SECONDS) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await self.reload():
+                    print(f"✅ Swapped to model version {self.current.version}")
+            except Exception as e:
+                # Keep serving the loaded version
+                print(f"⚠️ Model reload failed: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        active = self._read_active()
+        return {
+            "loaded_version": self.current.version if self.current else None,
+            "loaded_at": self.current.loaded_at.isoformat() if self.current else None,
+            "active_version": active.get("version"),
+            "history": active.get("history", []),
+            "swaps": self.swaps,
+            "versions": self.versions(),
+        }
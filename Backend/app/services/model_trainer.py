@@ -0,0 +1,243 @@
+"""
+Offline trainer for the ml_engine models on real interaction logs.
+
+Interactions are streamed from Mongo ordered by user and time. Each
+interaction becomes one training row: the features /next would have built
+from the learner's previous TRAIN_WINDOW interactions (what `build_features`
+returns for that window, computed for a whole chunk at once by
+`build_window_features`), labelled with what actually happened next:
+
+- difficulty: the difficulty the learner reported (1-5 rating bucketed into
+  easy / medium / hard), for interactions that have a rating
+- activity: the topic+modality class of the catalog activity, for correct
+  answers (what the learner succeeded with)
+
+Rows are collected into chunks of TRAIN_CHUNK_ROWS (plus the window of the
+learner a chunk starts in the middle of) and fed to out-of-core learners, so
+memory stays bounded by the chunk size:
+
+- behaviour clusters: MiniBatchKMeans.partial_fit
+- activity: MLPClassifier.partial_fit
+- difficulty: a RandomForest grown chunk by chunk (warm_start), adding
+  TRAIN_TREES_PER_CHUNK trees fitted on each chunk
+
+The result is published to the model registry as a new version whose
+manifest carries the training report (rows, rows per second, label counts).
+Run with:
+    python -m app.services.model_trainer [--chunk-rows N] [--promote]
+
+--promote also activates the new version; running workers swap to it on
+their next registry poll.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.neural_network import MLPClassifier
+
+from ..db import repository
+from . import ml_engine
+from .feature_builder import build_window_features, columns_from_logs
+from .outcome_joiner import DIFFICULTY_LABELS, experienced_difficulty
+
+TRAIN_CHUNK_ROWS = int(os.getenv("TRAIN_CHUNK_ROWS", "5000"))
+TRAIN_WINDOW = int(os.getenv("TRAIN_WINDOW", "50"))  # Same history length /next uses
+TRAIN_TREES_PER_CHUNK = int(os.getenv("TRAIN_TREES_PER_CHUNK", "10"))
+TRAIN_CURSOR_BATCH = 2000
+
+N_CLUSTERS = 3
+
+# Catalog activity type -> ml_engine activity label (topic, modality)
+ACTIVITY_TYPE_LABELS = {
+    "image_to_word": 0,         # reading, text
+    "one_step_instruction": 1,  # reading, audio
+    "counting": 2,              # math, text
+    "visual_addition": 3,       # math, visual
+}
+ACTIVITY_CLASSES = np.arange(4)
+
+try:
+    from ..data.activity_items import EXAMPLE_ACTIVITIES
+
+    ACTIVITY_TYPES: Dict[str, str] = {a.id: a.type for a in EXAMPLE_ACTIVITIES}
+except ImportError:
+    ACTIVITY_TYPES = {}
+
+
+class _Chunk:
+    def __init__(self, X: np.ndarray):
+        self.X = X
+        self.y_difficulty: List[Tuple[int, int]] = []  # (row, label)
+        self.y_activity: List[Tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.X)
+
+    def label(self, row: int, difficulty: Optional[int], activity: Optional[int]) -> None:
+        if difficulty is not None:
+            self.y_difficulty.append((row, difficulty))
+        if activity is not None:
+            self.y_activity.append((row, activity))
+
+    def arrays(self, labels: List[Tuple[int, int]], X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        rows = [r for r, _ in labels]
+        return X[rows], np.array([label for _, label in labels], dtype=int)
+
+
+class StreamingTrainer:
+    def __init__(self, chunk_rows: int = TRAIN_CHUNK_ROWS, trees_per_chunk: int = TRAIN_TREES_PER_CHUNK):
+        self.chunk_rows = chunk_rows
+        self.trees_per_chunk = trees_per_chunk
+        self.cluster_model = MiniBatchKMeans(n_clusters=N_CLUSTERS, random_state=42, n_init=3)
+        self.activity_mlp = MLPClassifier(hidden_layer_sizes=(16, 8), activation="relu", random_state=42)
+        self.difficulty_model = RandomForestClassifier(n_estimators=0, warm_start=True, random_state=42)
+
+        self.rows = 0
+        self.chunks = 0
+        self.difficulty_counts: Counter = Counter()
+        self.activity_counts: Counter = Counter()
+        # Difficulty rows held back until a chunk has every label, so all
+        # trees in the forest agree on classes_
+        self._difficulty_backlog: Tuple[List[np.ndarray], List[int]] = ([], [])
+        self._cluster_backlog: List[np.ndarray] = []
+        self.difficulty_rows_dropped = 0
+
+    def _chunk(self, history: List[Dict[str, Any]], docs: List[Dict[str, Any]], window: int) -> _Chunk:
+        """Training rows for `docs`; `history` is the interactions just before them."""
+        user_ids, columns = columns_from_logs(history + docs)
+        features = build_window_features(user_ids, columns, window, start=len(history))
+        chunk = _Chunk(np.column_stack([features[key] for key in ml_engine.FEATURE_KEYS]))
+
+        for row, doc in enumerate(docs):
+            difficulty = experienced_difficulty(doc.get("difficultyRating"))
+            difficulty_label = DIFFICULTY_LABELS.index(difficulty) if difficulty else None
+            activity_label = None
+            if doc.get("isCorrect"):
+                activity_label = ACTIVITY_TYPE_LABELS.get(ACTIVITY_TYPES.get(doc.get("activityId", "")))
+            chunk.label(row, difficulty_label, activity_label)
+        return chunk
+
+    def _fit_chunk(self, chunk: _Chunk) -> None:
+        X = chunk.X
+        self.chunks += 1
+
+        # MiniBatchKMeans needs at least n_clusters samples per partial_fit
+        self._cluster_backlog.append(X)
+        pending = np.vstack(self._cluster_backlog)
+        if len(pending) >= N_CLUSTERS:
+            self.cluster_model.partial_fit(pending)
+            self._cluster_backlog = []
+
+        if chunk.y_activity:
+            X_act, y_act = chunk.arrays(chunk.y_activity, X)
+            self.activity_mlp.partial_fit(X_act, y_act, classes=ACTIVITY_CLASSES)
+            self.activity_counts.update(y_act.tolist())
+
+        if chunk.y_difficulty:
+            X_diff, y_diff = chunk.arrays(chunk.y_difficulty, X)
+            self.difficulty_counts.update(y_diff.tolist())
+            backlog_X, backlog_y = self._difficulty_backlog
+            backlog_X.append(X_diff)
+            backlog_y.extend(y_diff.tolist())
+            if len(set(backlog_y)) == len(DIFFICULTY_LABELS):
+                self.difficulty_model.n_estimators += self.trees_per_chunk
+                self.difficulty_model.fit(np.vstack(backlog_X), np.array(backlog_y, dtype=int))
+                self._difficulty_backlog = ([], [])
+            elif len(backlog_y) > 4 * self.chunk_rows:
+                # Some label never shows up; drop the oldest rows to stay bounded
+                while len(backlog_y) > 4 * self.chunk_rows:
+                    dropped = backlog_X.pop(0)
+                    del backlog_y[:len(dropped)]
+                    self.difficulty_rows_dropped += len(dropped)
+
+    async def train(self, db: AsyncIOMotorDatabase, window: int = TRAIN_WINDOW) -> Dict[str, Any]:
+        """Stream every interaction once and fit all three models. Returns a training report."""
+        started = time.perf_counter()
+        # The current learner's last `window` interactions before the chunk
+        history: List[Dict[str, Any]] = []
+        docs: List[Dict[str, Any]] = []
+
+        def next_history() -> List[Dict[str, Any]]:
+            last_user = docs[-1].get("userId")
+            tail = (history + docs)[-window:] if window > 0 else []
+            return [doc for doc in tail if doc.get("userId") == last_user]
+
+        async for doc in repository.training_interactions(db).batch_size(TRAIN_CURSOR_BATCH):
+            docs.append(doc)
+            self.rows += 1
+            if len(docs) >= self.chunk_rows:
+                self._fit_chunk(self._chunk(history, docs, window))
+                history, docs = next_history(), []
+                elapsed = time.perf_counter() - started
+                print(f"  {self.rows} rows ({self.rows / elapsed:.0f} rows/s)")
+
+        if docs:
+            self._fit_chunk(self._chunk(history, docs, window))
+
+        elapsed = time.perf_counter() - started
+        return {
+            "rows": self.rows,
+            "chunks": self.chunks,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed > 0 else None,
+            "difficulty_labels": {DIFFICULTY_LABELS[k]: v for k, v in sorted(self.difficulty_counts.items())},
+            "activity_labels": {str(k): v for k, v in sorted(self.activity_counts.items())},
+            "difficulty_trees": len(getattr(self.difficulty_model, "estimators_", [])),
+            "difficulty_rows_unused": len(self._difficulty_backlog[1]) + self.difficulty_rows_dropped,
+        }
+
+    def trained(self) -> Dict[str, bool]:
+        return {
+            "difficulty": hasattr(self.difficulty_model, "estimators_"),
+            "cluster": hasattr(self.cluster_model, "cluster_centers_"),
+            "activity": hasattr(self.activity_mlp, "coefs_"),
+        }
+
+    def save(self, version: str, report: Dict[str, Any]) -> Path:
+        """Publish the models as a registry version. Refuses to publish untrained models."""
+        missing = [name for name, ok in self.trained().items() if not ok]
+        if missing:
+            raise RuntimeError(f"Not enough labelled interactions to train: {', '.join(missing)}")
+
+        models = {
+            "difficulty": self.difficulty_model,
+            "cluster": self.cluster_model,
+            "activity": self.activity_mlp,
+        }
+        return ml_engine.registry.publish(version, models, {"trained_on": "interactions", "training": report})
+
+
+if __name__ == "__main__":
+    from ..db.mongo import close_client, get_db
+
+    parser = argparse.ArgumentParser(description="Train the ml_engine models on logged interactions")
+    parser.add_argument("--chunk-rows", type=int, default=TRAIN_CHUNK_ROWS)
+    parser.add_argument("--window", type=int, default=TRAIN_WINDOW)
+    parser.add_argument("--version", default=None, help="Artifact directory name (default: UTC timestamp)")
+    parser.add_argument("--promote", action="store_true", help="Also make it the active version")
+    args = parser.parse_args()
+
+    async def _main():
+        trainer = StreamingTrainer(chunk_rows=args.chunk_rows)
+        try:
+            report = await trainer.train(await get_db(), window=args.window)
+        finally:
+            close_client()
+        version = args.version or datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        out_dir = trainer.save(version, report)
+        print(f"✅ Trained on {report['rows']} rows at {report['rows_per_second']} rows/s -> {out_dir}")
+        if args.promote:
+            ml_engine.registry.activate(version)
+            print(f"✅ Activated {version}")
+
+    asyncio.run(_main())
@@ -117,6 +117,40 @@ def analyze_feedback(text: str) -> Tuple[float, bool]:
         return _simple_sentiment_analysis(text)
 
 
+def analyze_feedback_batch(texts: List[str]) -> List[Tuple[float, bool]]:
+    """
+    analyze_feedback for many texts with one padded DistilBERT forward pass.
+    Returns one (sentiment_score, confusion_flag) per text, in order.
+    """
+    results: List[Tuple[float, bool]] = [(0.0, False)] * len(texts)
+    indexes = [i for i, text in enumerate(texts) if text]
+    if not indexes:
+        return results
+
+    if TRANSFORMERS_AVAILABLE and _load_transformer():
+        try:
+            inputs = _tokenizer(
+                [texts[i] for i in indexes],
+                return_tensors="pt",
+                truncation=True,
+                max_length=512,
+                padding=True,
+            )
+            with torch.no_grad():
+                probs = torch.softmax(_model(**inputs).logits, dim=-1)
+
+            for row, i in enumerate(indexes):
+                sentiment_score = float(probs[row][1]) - float(probs[row][0])
+                results[i] = (sentiment_score, sentiment_score < -0.3)
+            return results
+        except Exception as e:
+            print(f"⚠️ DistilBERT batch inference failed: {e}, using simple analysis")
+
+    for i in indexes:
+        results[i] = _simple_sentiment_analysis(texts[i])
+    return results
+
+
 async def rephrase_text(req) -> Tuple[str, Optional[List[str]]]:
     """
     Calls an LLM to simplify the question.
@@ -131,6 +165,145 @@ async def rephrase_text(req) -> Tuple[str, Optional[List[str]]]:
         return await _rephrase_with_gemini(req)
 
 
+def _clean_ollama_response(raw_response: str, question: str) -> str:
+    """
+    Post-process a raw Ollama completion into just the simplified question:
+    strip prompt echoes and prefixes, and fall back to word replacements if
+    the model returned the original question.
+    """
+    # Parse the response - extract just the simplified question
+    simplified_text = raw_response.strip()
+    
+    # Remove common markers and prefixes
+    markers = [
+        "Simplified question:",
+        "Simplified question (write ONLY the simplified version, nothing else):",
+        "Here's the simplified version:",
+        "Simplified version:",
+        "Here's a simpler version:",
+        "The simplified question is:",
+        "Simplified:",
+    ]
+    for marker in markers:
+        if marker in simplified_text:
+            parts = simplified_text.split(marker, 1)
+            if len(parts) > 1:
+                simplified_text = parts[1].strip()
+                break
+    
+    # Remove the original question if it appears anywhere in the response
+    if question in simplified_text:
+        # Try to extract text that comes AFTER the original question
+        parts = simplified_text.split(question, 1)
+        if len(parts) > 1 and parts[1].strip():
+            simplified_text = parts[1].strip()
+        # Or try to extract text that comes BEFORE the original question
+        elif len(parts) > 0 and parts[0].strip() and parts[0] != question:
+            simplified_text = parts[0].strip()
+        # If original question is the whole response, try to find any different text
+        else:
+            # Split by newlines and find the first line that's different
+            lines = simplified_text.split("\n")
+            for line in lines:
+                line = line.strip()
+                if line and line != question and len(line) > 10:
+                    # Check if this line is substantially different (not just a substring)
+                    if (line.lower() != question.lower() and 
+                        question.lower() not in line.lower() and
+                        line.lower() not in question.lower()):
+                        simplified_text = line
+                        break
+    
+    # Clean up common prefixes/suffixes
+    prefixes_to_remove = [
+        "Here's",
+        "Here is",
+        "The simplified question is",
+        "Simplified:",
+        "Answer:",
+    ]
+    for prefix in prefixes_to_remove:
+        if simplified_text.lower().startswith(prefix.lower()):
+            simplified_text = simplified_text[len(prefix):].strip()
+            # Remove leading colon or dash
+            if simplified_text.startswith((":", "-", "—")):
+                simplified_text = simplified_text[1:].strip()
+    
+    # Remove any leading/trailing quotes
+    simplified_text = simplified_text.strip('"\'')
+    
+    # Final validation - if it's still the same as original, try harder
+    if simplified_text.strip().lower() == question.strip().lower() or len(simplified_text.strip()) < 10:
+        print(f"⚠️ Ollama response seems unchanged. Raw: {raw_response[:300]}")
+        # Try to extract any sentence that's different from the original
+        sentences = raw_response.replace("\n", " ").split(".")
+        for sentence in sentences:
+            sentence = sentence.strip()
+            if (sentence and 
+                len(sentence) > 15 and  # Must be substantial
+                sentence.lower() != question.lower() and 
+                question.lower() not in sentence.lower() and
+                sentence.lower() not in question.lower()):
+                # This looks like a different sentence
+                simplified_text = sentence
+                break
+        
+        # If STILL no good result, create a more aggressive fallback
+        if simplified_text.strip().lower() == question.strip().lower() or len(simplified_text.strip()) < 10:
+            print(f"⚠️ Ollama fallback triggered - original: '{question}'")
+            # Create a more aggressive simplification by replacing common complex words
+            fallback = question
+            
+            # More comprehensive replacements (order matters - longer phrases first)
+            replacements = [
+                ("match the picture to the correct word", "find the word that goes with the picture"),
+                ("match the picture", "find the word for the picture"),
+                ("match", "pick"),
+                ("select", "choose"),
+                ("identify", "find"),
+                ("determine", "figure out"),
+                ("click", "tap"),
+                ("correct", "right"),
+                ("the correct", "the right"),
+                ("to the", "for the"),
+            ]
+            
+            # Apply replacements (case-insensitive)
+            fallback_lower = fallback.lower()
+            for old, new_word in replacements:
+                if old in fallback_lower:
+                    # Find the position and replace with proper case
+                    idx = fallback_lower.find(old)
+                    if idx >= 0:
+                        # Try to preserve capitalization of first letter
+                        before = fallback[:idx]
+                        after = fallback[idx + len(old):]
+                        # Capitalize if it's at the start of sentence
+                        if idx == 0 or (idx > 0 and fallback[idx-1] in '.!?'):
+                            new_word_capitalized = new_word[0].upper() + new_word[1:] if len(new_word) > 0 else new_word
+                        else:
+                            new_word_capitalized = new_word
+                        fallback = before + new_word_capitalized + after
+                        fallback_lower = fallback.lower()
+                        break
+            
+            # If still unchanged, try a more aggressive rewrite
+            if fallback.strip().lower() == question.strip().lower():
+                # For "Match the picture to the correct word" type questions
+                if "match" in fallback_lower and "picture" in fallback_lower and "word" in fallback_lower:
+                    simplified_text = "Find the word that goes with the picture."
+                elif "match" in fallback_lower:
+                    simplified_text = fallback.replace("match", "pick").replace("Match", "Pick")
+                else:
+                    simplified_text = f"Can you {fallback.lower()}?"
+            else:
+                simplified_text = fallback
+            
+            print(f"✅ Ollama fallback result: '{simplified_text}'")
+
+    return simplified_text
+
+
 async def _rephrase_with_ollama(req) -> Tuple[str, Optional[List[str]]]:
     """Use local Ollama model for rephrasing."""
     ollama_url = os.getenv("OLLAMA_BASE_URL", os.getenv("OLLAMA_URL", "http://localhost:11434"))
@@ -199,135 +372,7 @@ async def _rephrase_with_ollama(req) -> Tuple[str, Optional[List[str]]]:
         
         print(f"Ollama raw response (first 300 chars): {raw_response[:300]}")
         
-        # Parse the response - extract just the simplified question
-        simplified_text = raw_response.strip()
-        
-        # Remove common markers and prefixes
-        markers = [
-            "Simplified question:",
-            "Simplified question (write ONLY the simplified version, nothing else):",
-            "Here's the simplified version:",
-            "Simplified version:",
-            "Here's a simpler version:",
-            "The simplified question is:",
-            "Simplified:",
-        ]
-        for marker in markers:
-            if marker in simplified_text:
-                parts = simplified_text.split(marker, 1)
-                if len(parts) > 1:
-                    simplified_text = parts[1].strip()
-                    break
-        
-        # Remove the original question if it appears anywhere in the response
-        if req.question in simplified_text:
-            # Try to extract text that comes AFTER the original question
-            parts = simplified_text.split(req.question, 1)
-            if len(parts) > 1 and parts[1].strip():
-                simplified_text = parts[1].strip()
-            # Or try to extract text that comes BEFORE the original question
-            elif len(parts) > 0 and parts[0].strip() and parts[0] != req.question:
-                simplified_text = parts[0].strip()
-            # If original question is the whole response, try to find any different text
-            else:
-                # Split by newlines and find the first line that's different
-                lines = simplified_text.split("\n")
-                for line in lines:
-                    line = line.strip()
-                    if line and line != req.question and len(line) > 10:
-                        # Check if this line is substantially different (not just a substring)
-                        if (line.lower() != req.question.lower() and 
-                            req.question.lower() not in line.lower() and
-                            line.lower() not in req.question.lower()):
-                            simplified_text = line
-                            break
-        
-        # Clean up common prefixes/suffixes
-        prefixes_to_remove = [
-            "Here's",
-            "Here is",
-            "The simplified question is",
-            "Simplified:",
-            "Answer:",
-        ]
-        for prefix in prefixes_to_remove:
-            if simplified_text.lower().startswith(prefix.lower()):
-                simplified_text = simplified_text[len(prefix):].strip()
-                # Remove leading colon or dash
-                if simplified_text.startswith((":", "-", "—")):
-                    simplified_text = simplified_text[1:].strip()
-        
-        # Remove any leading/trailing quotes
-        simplified_text = simplified_text.strip('"\'')
-        
-        # Final validation - if it's still the same as original, try harder
-        if simplified_text.strip().lower() == req.question.strip().lower() or len(simplified_text.strip()) < 10:
-            print(f"⚠️ Ollama response seems unchanged. Raw: {raw_response[:300]}")
-            # Try to extract any sentence that's different from the original
-            sentences = raw_response.replace("\n", " ").split(".")
-            for sentence in sentences:
-                sentence = sentence.strip()
-                if (sentence and 
-                    len(sentence) > 15 and  # Must be substantial
-                    sentence.lower() != req.question.lower() and 
-                    req.question.lower() not in sentence.lower() and
-                    sentence.lower() not in req.question.lower()):
-                    # This looks like a different sentence
-                    simplified_text = sentence
-                    break
-            
-            # If STILL no good result, create a more aggressive fallback
-            if simplified_text.strip().lower() == req.question.strip().lower() or len(simplified_text.strip()) < 10:
-                print(f"⚠️ Ollama fallback triggered - original: '{req.question}'")
-                # Create a more aggressive simplification by replacing common complex words
-                fallback = req.question
-                
-                # More comprehensive replacements (order matters - longer phrases first)
-                replacements = [
-                    ("match the picture to the correct word", "find the word that goes with the picture"),
-                    ("match the picture", "find the word for the picture"),
-                    ("match", "pick"),
-                    ("select", "choose"),
-                    ("identify", "find"),
-                    ("determine", "figure out"),
-                    ("click", "tap"),
-                    ("correct", "right"),
-                    ("the correct", "the right"),
-                    ("to the", "for the"),
-                ]
-                
-                # Apply replacements (case-insensitive)
-                fallback_lower = fallback.lower()
-                for old, new_word in replacements:
-                    if old in fallback_lower:
-                        # Find the position and replace with proper case
-                        idx = fallback_lower.find(old)
-                        if idx >= 0:
-                            # Try to preserve capitalization of first letter
-                            before = fallback[:idx]
-                            after = fallback[idx + len(old):]
-                            # Capitalize if it's at the start of sentence
-                            if idx == 0 or (idx > 0 and fallback[idx-1] in '.!?'):
-                                new_word_capitalized = new_word[0].upper() + new_word[1:] if len(new_word) > 0 else new_word
-                            else:
-                                new_word_capitalized = new_word
-                            fallback = before + new_word_capitalized + after
-                            fallback_lower = fallback.lower()
-                            break
-                
-                # If still unchanged, try a more aggressive rewrite
-                if fallback.strip().lower() == req.question.strip().lower():
-                    # For "Match the picture to the correct word" type questions
-                    if "match" in fallback_lower and "picture" in fallback_lower and "word" in fallback_lower:
-                        simplified_text = "Find the word that goes with the picture."
-                    elif "match" in fallback_lower:
-                        simplified_text = fallback.replace("match", "pick").replace("Match", "Pick")
-                    else:
-                        simplified_text = f"Can you {fallback.lower()}?"
-                else:
-                    simplified_text = fallback
-                
-                print(f"✅ Ollama fallback result: '{simplified_text}'")
+        simplified_text = _clean_ollama_response(raw_response, req.question)
         
         print(f"Final simplified text: {simplified_text[:100]}...")
         
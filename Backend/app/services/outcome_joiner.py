@@ -0,0 +1,235 @@
+"""
+Background joiner that fills ml_predictions.actual_outcome.
+
+Every /submit enqueues its outcome here. A background task drains the queue
+in batches, matches each submit to the user's most recent still-open
+prediction made before it, writes the outcomes back with one bulk write and
+bumps running confusion-matrix counters in `model_metrics`, so accuracy
+endpoints read a single document instead of rescanning interactions.
+"""
+
+import asyncio
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from ..db import repository
+
+JOIN_BATCH_SIZE = int(os.getenv("OUTCOME_JOIN_BATCH_SIZE", "200"))
+JOIN_LINGER_SECONDS = float(os.getenv("OUTCOME_JOIN_LINGER_MS", "500")) / 1000
+JOIN_QUEUE_SIZE = int(os.getenv("OUTCOME_JOIN_QUEUE_SIZE", "10000"))
+# Predictions older than this are never matched (the learner walked away)
+JOIN_WINDOW = timedelta(minutes=int(os.getenv("OUTCOME_JOIN_WINDOW_MINUTES", "60")))
+
+DIFFICULTY_LABELS = ("easy", "medium", "hard")
+
+
+def experienced_difficulty(difficulty_rating: Optional[int]) -> Optional[str]:
+    """Bucket the learner's 1-5 difficulty rating the same way analytics does."""
+    if not difficulty_rating:
+        return None
+    if difficulty_rating <= 2:
+        return "easy"
+    if difficulty_rating <= 4:
+        return "medium"
+    return "hard"
+
+
+def _counter_filter(model_version: str, user_id: Optional[str]) -> Dict[str, Any]:
+    return {"model_version": model_version, "userId": user_id}
+
+
+class OutcomeJoiner:
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self.joined = 0
+        self.unmatched = 0
+        self.dropped = 0
+
+    def _get_queue(self) -> asyncio.Queue:
+        # Created lazily so it binds to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=JOIN_QUEUE_SIZE)
+        return self._queue
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def enqueue(self, interaction: Dict[str, Any]) -> None:
+        """Queue a freshly written interaction for joining. Never blocks."""
+        if not interaction.get("userId"):
+            return
+        try:
+            self._get_queue().put_nowait(interaction)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        queue = self._get_queue()
+        batch = [await queue.get()]
+        deadline = asyncio.get_running_loop().time() + JOIN_LINGER_SECONDS
+        while len(batch) < JOIN_BATCH_SIZE:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            # Not wait_for: on Python < 3.12 it can swallow a cancel that
+            # arrives just as the get completes, and run() would never stop
+            getter = asyncio.ensure_future(queue.get())
+            try:
+                done, _ = await asyncio.wait({getter}, timeout=timeout)
+            except asyncio.CancelledError:
+                getter.cancel()
+                if getter.done() and not getter.cancelled():
+                    batch.append(getter.result())
+                self._requeue(batch)
+                raise
+            if not done:
+                getter.cancel()
+                break
+            batch.append(getter.result())
+        return batch
+
+    def _requeue(self, batch: List[Dict[str, Any]]) -> None:
+        """Put a half-collected batch back so flush() still joins it."""
+        queue = self._get_queue()
+        for interaction in batch:
+            try:
+                queue.put_nowait(interaction)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    async def run(self, db: AsyncIOMotorDatabase) -> None:
+        """Drain the queue forever. Cancel to stop; queued items are flushed first."""
+        try:
+            while True:
+                batch = await self._next_batch()
+                try:
+                    await self.join_batch(db, batch)
+                except Exception as e:
+                    print(f"⚠️ Outcome joiner batch failed: {e}")
+        except asyncio.CancelledError:
+            await self.flush(db)
+            raise
+
+    async def flush(self, db: AsyncIOMotorDatabase) -> None:
+        queue = self._get_queue()
+        batch = []
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+        if batch:
+            await self.join_batch(db, batch)
+
+    async def join_batch(self, db: AsyncIOMotorDatabase, batch: List[Dict[str, Any]]) -> int:
+        """Match a batch of interactions to open predictions. Returns how many were joined."""
+        predictions_col = db["ml_predictions"]
+
+        by_user: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for interaction in batch:
+            by_user[interaction["userId"]].append(interaction)
+
+        earliest = min(i["timestamp"] for i in batch) - JOIN_WINDOW
+        open_predictions: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        async for pred in repository.open_predictions(db, list(by_user), earliest):
+            open_predictions[pred["userId"]].append(pred)
+
+        batch_id = uuid.uuid4().hex
+        ops: List[UpdateOne] = []
+        matched: Dict[Any, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        for user_id, interactions in by_user.items():
+            candidates = open_predictions.get(user_id, [])
+            for interaction in sorted(interactions, key=lambda i: i["timestamp"]):
+                # Most recent open prediction made before this submit
+                pred = next((p for p in candidates if p["timestamp"] <= interaction["timestamp"]), None)
+                if pred is None:
+                    self.unmatched += 1
+                    continue
+                candidates.remove(pred)
+                outcome = {
+                    "interactionId": interaction.get("_id"),
+                    "activityId": interaction.get("activityId"),
+                    "isCorrect": interaction.get("isCorrect"),
+                    "timeTaken": interaction.get("timeTaken"),
+                    "difficultyRating": interaction.get("difficultyRating"),
+                    "focusRating": interaction.get("focusRating"),
+                    "submittedAt": interaction["timestamp"],
+                }
+                ops.append(UpdateOne(
+                    {"_id": pred["_id"], "actual_outcome": None},
+                    {"$set": {"actual_outcome": outcome, "outcome_batch": batch_id}},
+                ))
+                matched[pred["_id"]] = (pred, outcome)
+
+        if not ops:
+            return 0
+
+        result = await predictions_col.bulk_write(ops, ordered=False)
+        if result.modified_count < len(ops):
+            # Another worker joined some of these first; only count what we wrote
+            won = await repository.joined_prediction_ids(db, list(matched), batch_id)
+            matched = {k: v for k, v in matched.items() if k in won}
+
+        await self._bump_counters(db, matched.values())
+        self.joined += len(matched)
+        return len(matched)
+
+    async def _bump_counters(self, db: AsyncIOMotorDatabase, pairs) -> None:
+        increments: Dict[Tuple[str, Optional[str]], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for pred, outcome in pairs:
+            version = pred.get("model_version") or "unknown"
+            predicted = (pred.get("prediction") or {}).get("difficulty")
+            actual = experienced_difficulty(outcome.get("difficultyRating"))
+            for key in ((version, None), (version, pred["userId"])):
+                inc = increments[key]
+                inc["samples"] += 1
+                if outcome.get("isCorrect"):
+                    inc["correct"] += 1
+                if predicted in DIFFICULTY_LABELS and actual:
+                    inc[f"confusion.{predicted}.{actual}"] += 1
+                    inc["rated"] += 1
+                    if predicted == actual:
+                        inc["matches"] += 1
+
+        if not increments:
+            return
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                _counter_filter(version, user_id),
+                {"$inc": dict(inc), "$set": {"updated_at": now}},
+                upsert=True,
+            )
+            for (version, user_id), inc in increments.items()
+        ]
+        await db["model_metrics"].bulk_write(ops, ordered=False)
+
+
+joiner = OutcomeJoiner()
+
+
+async def get_model_counters(
+    db: AsyncIOMotorDatabase,
+    model_version: Optional[str] = None,
+    user_id: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Read the running counters for one model version (the most recently
+    updated one if not given), globally or for a single user.
+    """
+    if model_version:
+        return await repository.model_counters(db, model_version, user_id)
+    return await repository.latest_model_counters(db, user_id)
+
+
+def confusion_matrix(counters: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+    """Dense predicted -> actual matrix (zeros filled in)."""
+    raw = counters.get("confusion", {}) if counters else {}
+    return {
+        predicted: {actual: int(raw.get(predicted, {}).get(actual, 0)) for actual in DIFFICULTY_LABELS}
+        for predicted in DIFFICULTY_LABELS
+    }
@@ -0,0 +1,133 @@
+"""
+bcrypt hashing off the event loop.
+
+bcrypt releases the GIL while it works, so hashes run in a small dedicated
+thread pool (PASSWORD_HASH_WORKERS threads) and the loop keeps serving other
+requests while a class logs in. At most PASSWORD_HASH_MAX_PENDING operations
+may be running or waiting; beyond that callers get PasswordHasherBusy
+(the routes answer 503) instead of an ever-growing backlog.
+
+New hashes use BCRYPT_ROUNDS. A login whose stored hash used a different
+cost is re-hashed with the current one (see needs_rehash), so changing the
+work factor migrates users as they log in.
+
+PASSWORD_HASH_WORKERS=0 hashes inline on the event loop (the old behaviour;
+for benchmarks only).
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+import bcrypt
+
+from . import metrics
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+T = TypeVar("T")
+
+HASH_SECONDS = metrics.registry.histogram(
+    "password_hash_seconds", "bcrypt time per operation, excluding queueing", ("op",)
+)
+HASH_WAIT_SECONDS = metrics.registry.histogram(
+    "password_hash_wait_seconds", "Time a password operation waited for a worker"
+)
+HASH_PENDING = metrics.registry.gauge(
+    "password_hash_queue_depth", "Password operations running or waiting for a worker"
+)
+HASH_REJECTED = metrics.registry.counter(
+    "password_hash_rejected_total", "Password operations refused because the queue was full"
+)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def hash_cost(hashed: str) -> Optional[int]:
+    """The cost factor of a "$2b$12$..." hash, or None if it isn't bcrypt."""
+    parts = hashed.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def needs_rehash(hashed: str, rounds: int = BCRYPT_ROUNDS) -> bool:
+    return hash_cost(hashed) != rounds
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+        rounds: int = BCRYPT_ROUNDS,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, op: str, fn: Callable[[], T]) -> T:
+        if self.pending >= self.max_pending:
+            HASH_REJECTED.inc()
+            raise PasswordHasherBusy(f"{self.pending} password operations already queued")
+
+        self.pending += 1
+        HASH_PENDING.set(value=self.pending)
+        queued_at = time.perf_counter()
+
+        def timed() -> T:
+            started = time.perf_counter()
+            HASH_WAIT_SECONDS.observe(started - queued_at)
+            try:
+                return fn()
+            finally:
+                HASH_SECONDS.observe(time.perf_counter() - started, op)
+
+        try:
+            if self.workers <= 0:
+                return timed()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), timed)
+        finally:
+            self.pending -= 1
+            HASH_PENDING.set(value=self.pending)
+
+    async def hash(self, password: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        hashed = await self._run("hash", lambda: bcrypt.hashpw(password.encode("utf-8"), salt))
+        return hashed.decode("utf-8")
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        if not hashed:
+            return False
+        try:
+            return await self._run(
+                "verify", lambda: bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+            )
+        except ValueError:
+            # Not a bcrypt hash
+            return False
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return needs_rehash(hashed, self.rounds)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,298 @@
+"""
+Compact per-user progress records for the progress endpoints.
+
+Each user has one `user_progress` document:
+
+    {
+      "_id": userId,
+      "attempts": 42,          # every submit
+      "correct": 30,           # correct submits
+      "catalogVersion": "...", # fingerprint of the catalog order the bits refer to
+      "modules": {"M1": {"w0": <int>}, ...}
+    }
+
+Bit i of module M's words is set once the learner has answered the i-th
+catalog activity of M correctly. Submits update the record atomically with
+$inc and $bit, so both progress endpoints are a single point read plus
+popcounts.
+
+Records for an older catalog order, and users whose history predates this
+store, are rebuilt once from `interactions` on first read. Two more fields
+keep a rebuild from racing live submits:
+
+    "rev": 17,                    # bumped by every submit update
+    "rebuiltThrough": ObjectId()  # newest interaction the last rebuild counted
+
+A rebuild only replaces the record if `rev` hasn't moved since it started
+(otherwise it starts over), and a submit whose interaction is not newer than
+`rebuiltThrough` leaves the record alone, since the rebuild counted it.
+"""
+
+import hashlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from ..db import repository
+
+MODULE_IDS = ["M1", "M2", "M3"]
+
+# Stay inside the signed 64-bit range Mongo stores integers in
+BITS_PER_WORD = 63
+REBUILD_ATTEMPTS = 3
+DUPLICATE_KEY = 11000
+
+try:
+    from ..data.activity_items import EXAMPLE_ACTIVITIES
+
+    # activityId -> (moduleId, position within the module)
+    CATALOG_INDEX: Dict[str, Tuple[str, int]] = {}
+    _positions: Dict[str, int] = defaultdict(int)
+    for _activity in EXAMPLE_ACTIVITIES:
+        CATALOG_INDEX[_activity.id] = (_activity.moduleId, _positions[_activity.moduleId])
+        _positions[_activity.moduleId] += 1
+    MODULE_TOTALS: Dict[str, int] = dict(_positions)
+except ImportError:
+    # Fallback if import fails
+    CATALOG_INDEX = {}
+    MODULE_TOTALS = {
+        "M1": 23,
+        "M2": 2,
+        "M3": 1,
+    }
+
+CATALOG_VERSION = hashlib.sha1("|".join(CATALOG_INDEX).encode("utf-8")).hexdigest()[:12]
+
+
+def _bit_location(activity_id: str) -> Optional[Tuple[str, str, int]]:
+    """(moduleId, word field, mask) for an activity, or None if it isn't in the catalog."""
+    location = CATALOG_INDEX.get(activity_id)
+    if location is None:
+        return None
+    module_id, position = location
+    word, bit = divmod(position, BITS_PER_WORD)
+    return module_id, f"w{word}", 1 << bit
+
+
+def _popcount(value: int) -> int:
+    return bin(value).count("1")
+
+
+def progress_update(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """The atomic update applied to a user's record for one stored interaction."""
+    update: Dict[str, Any] = {
+        "$inc": {"attempts": 1, "correct": 1 if doc.get("isCorrect") else 0, "rev": 1},
+        "$setOnInsert": {"catalogVersion": CATALOG_VERSION},
+    }
+    if doc.get("isCorrect"):
+        location = _bit_location(doc.get("activityId", ""))
+        if location is not None:
+            module_id, word, mask = location
+            update["$bit"] = {f"modules.{module_id}.{word}": {"or": mask}}
+    return update
+
+
+def _record_filter(doc: Dict[str, Any]) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"_id": doc["userId"]}
+    if doc.get("_id") is not None:
+        # Not if a rebuild already counted this interaction
+        query["rebuiltThrough"] = {"$not": {"$gte": doc["_id"]}}
+    return query
+
+
+def _existing_update(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    For retrying an upsert that hit the unique _id: either a concurrent submit
+    created the record, or a rebuild counted this interaction and the filter
+    didn't match. A plain update handles both.
+    """
+    update = progress_update(doc)
+    del update["$setOnInsert"]
+    return update
+
+
+async def _created(db: AsyncIOMotorDatabase, doc: Dict[str, Any]) -> None:
+    """A submit just created the user's record; rebuild it later if they have older history."""
+    if doc.get("_id") is not None and await repository.has_earlier_interaction(db, doc["userId"], doc["_id"]):
+        await repository.update_progress(db, {"_id": doc["userId"]}, {"$unset": {"catalogVersion": ""}})
+
+
+async def record_interaction(db: AsyncIOMotorDatabase, doc: Dict[str, Any]) -> None:
+    """Fold a freshly stored interaction into the user's progress record."""
+    if not doc.get("userId"):
+        return
+    try:
+        result = await repository.update_progress(db, _record_filter(doc), progress_update(doc), upsert=True)
+    except DuplicateKeyError:
+        await repository.update_progress(db, _record_filter(doc), _existing_update(doc))
+        return
+    if result.upserted_id is not None:
+        await _created(db, doc)
+
+
+async def record_interactions(db: AsyncIOMotorDatabase, docs: List[Dict[str, Any]]) -> None:
+    """record_interaction for many stored interactions in one bulk write."""
+    docs = [doc for doc in docs if doc.get("userId")]
+    if not docs:
+        return
+    updates = [UpdateOne(_record_filter(doc), progress_update(doc), upsert=True) for doc in docs]
+    try:
+        # $inc and $bit commute, so order doesn't matter
+        result = await repository.bulk_write_progress(db, updates)
+        upserted = result.upserted_ids
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+        await repository.bulk_write_progress(db, [
+            UpdateOne(_record_filter(docs[error["index"]]), _existing_update(docs[error["index"]]))
+            for error in errors
+        ])
+    for index in upserted:
+        await _created(db, docs[index])
+
+
+def _empty_record() -> Dict[str, Any]:
+    return {"attempts": 0, "correct": 0, "catalogVersion": CATALOG_VERSION, "modules": {}}
+
+
+async def _from_history(db: AsyncIOMotorDatabase, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Records recomputed from interaction history, for the users that have any."""
+    records = {}
+    async for totals in repository.progress_totals(db, user_ids):
+        modules: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for activity_id in totals["activities"]:
+            location = _bit_location(activity_id or "")
+            if location is not None:
+                module_id, word, mask = location
+                modules[module_id][word] |= mask
+        records[totals["_id"]] = {
+            **_empty_record(),
+            "attempts": totals["attempts"],
+            "correct": totals["correct"],
+            "modules": {m: dict(words) for m, words in modules.items()},
+            "rebuiltThrough": totals["newest"],
+        }
+    return records
+
+
+async def _rebuild(
+    db: AsyncIOMotorDatabase, stale: Dict[str, Optional[Dict[str, Any]]]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Recompute records from history with one aggregation and one bulk write,
+    without losing concurrent submits. `stale` maps userId to its stored
+    record (None if missing). Users with neither a record nor any
+    interactions get an empty record that isn't stored.
+    """
+    result: Dict[str, Dict[str, Any]] = {}
+    for _ in range(REBUILD_ATTEMPTS):
+        rebuilt = await _from_history(db, list(stale))
+        writes = []
+        for user_id, current in stale.items():
+            record = rebuilt.get(user_id)
+            if current is None:
+                if record is None:
+                    result[user_id] = _empty_record()
+                    continue
+                record["rev"] = 0
+                writes.append(InsertOne({"_id": user_id, **record}))
+            else:
+                rev = current.get("rev")
+                record = record or _empty_record()
+                record["rev"] = (rev or 0) + 1
+                query = {"_id": user_id, "rev": rev if rev is not None else {"$exists": False}}
+                writes.append(ReplaceOne(query, record))
+            result[user_id] = record
+        if not writes:
+            break
+
+        try:
+            outcome = await repository.bulk_write_progress(db, writes)
+            written = outcome.inserted_count + outcome.matched_count
+        except BulkWriteError as e:
+            # A submit created the record meanwhile
+            if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                raise
+            written = e.details.get("nInserted", 0) + e.details.get("nMatched", 0)
+        if written == len(writes):
+            break
+
+        # Some rev moved (a submit landed while the history was read): find
+        # which, and go again for those
+        ids = [user_id for user_id in stale if user_id in rebuilt or stale[user_id] is not None]
+        stale = {}
+        async for stored in repository.progress_records(db, ids):
+            if stored.get("catalogVersion") == CATALOG_VERSION:
+                result[stored["_id"]] = stored
+            else:
+                stale[stored["_id"]] = stored
+        if not stale:
+            break
+    return result
+
+
+async def get_user_progress(db: AsyncIOMotorDatabase, user_id: str) -> Dict[str, Any]:
+    """Point-read a user's progress record, rebuilding it if missing or stale."""
+    record = await repository.user_progress(db, user_id)
+    if record is None or record.get("catalogVersion") != CATALOG_VERSION:
+        record = (await _rebuild(db, {user_id: record}))[user_id]
+    return record
+
+
+async def get_many_progress(db: AsyncIOMotorDatabase, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Multi-get progress records for many users: one query, plus one batched
+    rebuild for the missing and stale ones.
+    """
+    records: Dict[str, Dict[str, Any]] = {}
+    stale: Dict[str, Optional[Dict[str, Any]]] = {}
+    async for record in repository.progress_records(db, user_ids):
+        if record.get("catalogVersion") == CATALOG_VERSION:
+            records[record["_id"]] = record
+        else:
+            stale[record["_id"]] = record
+    for user_id in user_ids:
+        if user_id not in records and user_id not in stale:
+            stale[user_id] = None
+    if stale:
+        records.update(await _rebuild(db, stale))
+    return records
+
+
+def completed_count(record: Dict[str, Any], module_id: str) -> int:
+    words = (record.get("modules") or {}).get(module_id) or {}
+    return sum(_popcount(int(w)) for w in words.values())
+
+
+def module_progress(record: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-module progress in the /progress/modules response shape."""
+    result = {}
+    for module_id in MODULE_IDS:
+        total = MODULE_TOTALS.get(module_id, 10)
+        if record is None:
+            result[module_id] = {"activitiesCompleted": 0, "totalActivities": total, "progress": 0}
+            continue
+        correct_completed = min(completed_count(record, module_id), total)
+        progress_percent = round((correct_completed / total) * 100, 1) if total > 0 else 0
+        result[module_id] = {
+            "activitiesCompleted": correct_completed,
+            "totalActivities": total,
+            "progress": min(progress_percent, 100.0),
+        }
+    return result
+
+
+def progress_summary(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Overall accuracy plus per-module progress for one user."""
+    attempts = record.get("attempts", 0)
+    correct = record.get("correct", 0)
+    return {
+        "overallAccuracy": (correct / attempts) if attempts else 0.0,
+        "attempts": attempts,
+        "modules": module_progress(record),
+    }
@@ -0,0 +1,124 @@
+"""
+Response cache with strong ETags for read-heavy dashboard endpoints.
+
+Entries are keyed on the route, its query parameters and the current data
+version of every collection the route reads. Write paths call `bump()` for
+the collection they touch, so any write makes the next request recompute.
+A request whose If-None-Match matches the cached ETag gets a 304 without the
+handler running at all.
+
+Versions are per process, so entries also expire after
+RESPONSE_CACHE_TTL_SECONDS to bound staleness across workers and for
+time-relative reports ("last 7 days").
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "60"))
+
+CACHE_CONTROL = "private, max-age=0, must-revalidate"
+
+
+class _Entry:
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, etag: str, expires_at: float):
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def bump(self, collection: str) -> None:
+        """Record a write to `collection`; cached responses reading it become stale."""
+        self._versions[collection] = self._versions.get(collection, 0) + 1
+
+    def _key(self, request: Request, depends_on: Iterable[str]) -> Tuple:
+        params = tuple(sorted(request.query_params.multi_items()))
+        versions = tuple((c, self._versions.get(c, 0)) for c in depends_on)
+        return (request.url.path, params, versions)
+
+    def _get(self, key: Tuple) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key: Tuple, body: bytes) -> _Entry:
+        entry = _Entry(body, f'"{hashlib.sha256(body).hexdigest()}"', time.monotonic() + self.ttl)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "data_versions": dict(self._versions),
+        }
+
+    async def respond(
+        self,
+        request: Request,
+        depends_on: Iterable[str],
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Response:
+        """
+        Serve `compute()`'s JSON result through the cache.
+        Answers 304 when the client's If-None-Match is still current.
+        """
+        key = self._key(request, depends_on)
+        entry = self._get(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            result = await compute()
+            body = json.dumps(jsonable_encoder(result), separators=(",", ":")).encode("utf-8")
+            entry = self._put(key, body)
+
+        headers = {"ETag": entry.etag, "Cache-Control": CACHE_CONTROL}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and entry.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,210 @@
+"""
+Signed session tokens and the cached user profile behind them.
+
+A token is `<payload>.<signature>`: the base64url JSON payload
+{"sub": user id, "exp": unix seconds} and its HMAC-SHA256 under
+SESSION_SECRET. Checking one is a hash and a compare in memory, with no
+session store. Tokens expire after SESSION_TTL_SECONDS; changing
+SESSION_SECRET logs everyone out.
+
+Routes that personalise take the profile as a dependency:
+
+    async def handler(user: Optional[UserProfile] = Depends(optional_user)): ...
+
+The profile (id, neuroFlags, neuroType) comes from a bounded LRU cache with
+a PROFILE_CACHE_TTL_SECONDS expiry, so a logged-in learner costs one users
+lookup per TTL rather than one per request. Without an Authorization header
+optional_user returns None and routes fall back to the userId they are
+given, as before; a bad or expired token is a 401.
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import Depends, Header, HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import BaseModel
+
+from ..db import repository
+from ..db.mongo import get_db
+from . import metrics
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "10000"))
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+
+_secret = os.getenv("SESSION_SECRET", "")
+if not _secret:
+    # Fine for one dev process; tokens won't survive a restart or work across workers
+    print("⚠️ SESSION_SECRET not set, using a random per-process secret")
+    _secret = secrets.token_hex(32)
+SESSION_SECRET = _secret.encode("utf-8")
+
+PROFILE_LOOKUPS = metrics.registry.counter(
+    "session_profile_lookups_total", "User profile lookups by cache result", ("result",)
+)
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET, payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def make_token(user_id: str, ttl: int = SESSION_TTL_SECONDS) -> Tuple[str, int]:
+    """A signed token for user_id and its expiry (unix seconds)."""
+    expires_at = int(time.time()) + ttl
+    payload = _b64encode(json.dumps({"sub": user_id, "exp": expires_at}, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}", expires_at
+
+
+def verify_token(token: str) -> str:
+    """The user id in a valid, unexpired token. Raises InvalidToken otherwise."""
+    payload, _, signature = token.partition(".")
+    if not payload or not signature or not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidToken("bad signature")
+    try:
+        claims = json.loads(_b64decode(payload))
+        user_id, expires_at = claims["sub"], claims["exp"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidToken("malformed payload")
+    if not isinstance(user_id, str) or not isinstance(expires_at, int):
+        raise InvalidToken("malformed payload")
+    if expires_at <= time.time():
+        raise InvalidToken("expired")
+    return user_id
+
+
+# ------------- PROFILE CACHE -------------
+
+class UserProfile(BaseModel):
+    id: str
+    neuroFlags: List[str] = []
+    neuroType: Optional[str] = None
+
+
+class _Entry:
+    __slots__ = ("profile", "expires_at")
+
+    def __init__(self, profile: UserProfile, expires_at: float):
+        self.profile = profile
+        self.expires_at = expires_at
+
+
+class ProfileCache:
+    def __init__(self, max_entries: int = PROFILE_CACHE_MAX_ENTRIES, ttl: float = PROFILE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    async def get(self, db: AsyncIOMotorDatabase, user_id: str) -> Optional[UserProfile]:
+        """The profile for user_id, from cache or Mongo. None if there is no such user."""
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.expires_at >= time.monotonic():
+            self._entries.move_to_end(user_id)
+            PROFILE_LOOKUPS.inc("hit")
+            return entry.profile
+
+        PROFILE_LOOKUPS.inc("miss")
+        try:
+            doc = await repository.user_profile(db, ObjectId(user_id))
+        except InvalidId:
+            return None
+        if doc is None:
+            self._entries.pop(user_id, None)
+            return None
+        profile = UserProfile(
+            id=user_id,
+            neuroFlags=doc.get("neuroFlags") or [],
+            neuroType=doc.get("neuroType"),
+        )
+        self.put(profile)
+        return profile
+
+    def put(self, profile: UserProfile) -> None:
+        self._entries[profile.id] = _Entry(profile, time.monotonic() + self.ttl)
+        self._entries.move_to_end(profile.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        """Call after changing a user's profile fields."""
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+profile_cache = ProfileCache()
+
+
+# ------------- DEPENDENCIES -------------
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def optional_user(
+    authorization: Optional[str] = Header(None),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+) -> Optional[UserProfile]:
+    """The caller's profile if they sent a bearer token, None if they sent none."""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise _unauthorized("Expected a Bearer token")
+    try:
+        user_id = verify_token(token.strip())
+    except InvalidToken as e:
+        raise _unauthorized(f"Invalid session token: {e}")
+    profile = await profile_cache.get(db, user_id)
+    if profile is None:
+        raise _unauthorized("User no longer exists")
+    return profile
+
+
+async def current_user(user: Optional[UserProfile] = Depends(optional_user)) -> UserProfile:
+    """Like optional_user, but the token is required."""
+    if user is None:
+        raise _unauthorized("Not logged in")
+    return user
+
+
+def resolve_user_id(user: Optional[UserProfile], user_id: Optional[str]) -> Optional[str]:
+    """
+    The user a request acts for: the token's user when there is one (a
+    userId naming someone else is refused), otherwise the userId given.
+    """
+    if user is None:
+        return user_id
+    if user_id and user_id != user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="userId does not match the session")
+    return user.id
@@ -0,0 +1,347 @@
+"""
+Mergeable sketches for approximate analytics.
+
+- HyperLogLog: distinct users / activities (about 1.6% error at p=12)
+- TDigest: percentiles of timeTaken and attentionScore
+
+Each submit is folded into an in-memory sketch for its (UTC day, module).
+A background task periodically merges those into the `sketches` collection
+(one compact document per day and module). Queries load the documents for the
+requested range and merge them, so the cost depends on the number of days and
+modules, never on the number of interactions.
+"""
+
+import asyncio
+import hashlib
+import math
+import os
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import Binary
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+
+from ..db import repository
+
+SKETCH_FLUSH_SECONDS = float(os.getenv("SKETCH_FLUSH_SECONDS", "10"))
+# Longest range a query may merge (one $in entry per day)
+SKETCH_MAX_RANGE_DAYS = int(os.getenv("SKETCH_MAX_RANGE_DAYS", "366"))
+
+HLL_PRECISION = 12
+TDIGEST_COMPRESSION = 100
+
+DISTINCT_FIELDS = ("userId", "activityId")
+PERCENTILE_FIELDS = ("timeTaken", "attentionScore")
+
+
+# ------------- HYPERLOGLOG -------------
+
+class HyperLogLog:
+    def __init__(self, p: int = HLL_PRECISION, registers: Optional[bytes] = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+    def add(self, value: str) -> None:
+        h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        z = sum(2.0 ** -r for r in self.registers)
+        estimate = alpha * self.m * self.m / z
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Small range: linear counting is more accurate
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+
+# ------------- T-DIGEST -------------
+
+class TDigest:
+    """Merging t-digest (k1 scale function)."""
+
+    def __init__(self, compression: float = TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[Tuple[float, float]] = []
+
+    @property
+    def total(self) -> float:
+        return sum(self.weights) + sum(w for _, w in self._buffer)
+
+    def add(self, x: float, w: float = 1.0) -> None:
+        self._buffer.append((x, w))
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        if len(self._buffer) > 5 * self.compression:
+            self._compress()
+
+    def merge(self, other: "TDigest") -> None:
+        other._compress()
+        self._buffer.extend(zip(other.means, other.weights))
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inv(self, k: float) -> float:
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        points = sorted(list(zip(self.means, self.weights)) + self._buffer)
+        self._buffer = []
+        total = sum(w for _, w in points)
+
+        means, weights = [], []
+        cum = 0.0
+        cur_mean, cur_weight = points[0]
+        limit = self._k_inv(self._k(0.0) + 1)
+        for mean, weight in points[1:]:
+            if (cum + cur_weight + weight) / total <= limit:
+                cur_weight += weight
+                cur_mean += (mean - cur_mean) * weight / cur_weight
+            else:
+                means.append(cur_mean)
+                weights.append(cur_weight)
+                cum += cur_weight
+                limit = self._k_inv(self._k(cum / total) + 1)
+                cur_mean, cur_weight = mean, weight
+        means.append(cur_mean)
+        weights.append(cur_weight)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        self._compress()
+        if not self.means:
+            return None
+        if len(self.means) == 1:
+            return self.means[0]
+
+        total = sum(self.weights)
+        target = q * total
+        # Each centroid's mass is centred on its mean
+        centers = []
+        cum = 0.0
+        for w in self.weights:
+            centers.append(cum + w / 2)
+            cum += w
+
+        if target <= centers[0]:
+            span = centers[0]
+            return self.min + (self.means[0] - self.min) * (target / span if span else 0)
+        if target >= centers[-1]:
+            span = total - centers[-1]
+            frac = (target - centers[-1]) / span if span else 0
+            return self.means[-1] + (self.max - self.means[-1]) * frac
+        for i in range(len(centers) - 1):
+            if centers[i] <= target <= centers[i + 1]:
+                frac = (target - centers[i]) / (centers[i + 1] - centers[i])
+                return self.means[i] + (self.means[i + 1] - self.means[i]) * frac
+        return self.means[-1]
+
+    def to_doc(self) -> Dict[str, Any]:
+        self._compress()
+        return {
+            "means": Binary(array("d", self.means).tobytes()),
+            "weights": Binary(array("d", self.weights).tobytes()),
+            "min": self.min if self.means else None,
+            "max": self.max if self.means else None,
+        }
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "TDigest":
+        digest = cls()
+        digest.means = array("d", bytes(doc["means"])).tolist()
+        digest.weights = array("d", bytes(doc["weights"])).tolist()
+        if digest.means:
+            digest.min = doc["min"]
+            digest.max = doc["max"]
+        return digest
+
+
+# ------------- DAY x MODULE BUCKETS -------------
+
+class SketchBucket:
+    """All sketches for one (day, module)."""
+
+    def __init__(self):
+        self.count = 0
+        self.distinct = {f: HyperLogLog() for f in DISTINCT_FIELDS}
+        self.percentiles = {f: TDigest() for f in PERCENTILE_FIELDS}
+
+    def add(self, interaction: Dict[str, Any]) -> None:
+        self.count += 1
+        for f in DISTINCT_FIELDS:
+            if interaction.get(f):
+                self.distinct[f].add(str(interaction[f]))
+        for f in PERCENTILE_FIELDS:
+            value = interaction.get(f)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.percentiles[f].add(float(value))
+
+    def merge(self, other: "SketchBucket") -> None:
+        self.count += other.count
+        for f in DISTINCT_FIELDS:
+            self.distinct[f].merge(other.distinct[f])
+        for f in PERCENTILE_FIELDS:
+            self.percentiles[f].merge(other.percentiles[f])
+
+    def to_doc(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "hll": {f: Binary(hll.to_bytes()) for f, hll in self.distinct.items()},
+            "tdigest": {f: td.to_doc() for f, td in self.percentiles.items()},
+        }
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "SketchBucket":
+        bucket = cls()
+        bucket.count = doc.get("count", 0)
+        for f, registers in doc.get("hll", {}).items():
+            bucket.distinct[f] = HyperLogLog(registers=bytes(registers))
+        for f, td in doc.get("tdigest", {}).items():
+            bucket.percentiles[f] = TDigest.from_doc(td)
+        return bucket
+
+
+def module_of(activity_id: Optional[str]) -> str:
+    if activity_id and activity_id.startswith("M") and "_" in activity_id:
+        return activity_id.split("_")[0]
+    return "unknown"
+
+
+def _day_key(ts: datetime) -> str:
+    return ts.strftime("%Y-%m-%d")
+
+
+class SketchStore:
+    def __init__(self):
+        self._pending: Dict[Tuple[str, str], SketchBucket] = {}
+
+    def record(self, interaction: Dict[str, Any]) -> None:
+        key = (_day_key(interaction["timestamp"]), module_of(interaction.get("activityId")))
+        bucket = self._pending.get(key)
+        if bucket is None:
+            bucket = self._pending[key] = SketchBucket()
+        bucket.add(interaction)
+
+    async def flush(self, db: AsyncIOMotorDatabase) -> int:
+        """Merge pending buckets into Mongo. Returns how many documents were written."""
+        pending, self._pending = self._pending, {}
+        keys = list(pending)
+        for i, (day, module) in enumerate(keys):
+            try:
+                await self._flush_bucket(db, day, module, pending[(day, module)])
+            except Exception:
+                # Put back whatever wasn't written so the next flush retries it
+                for key in keys[i:]:
+                    bucket = self._pending.setdefault(key, SketchBucket())
+                    bucket.merge(pending[key])
+                raise
+        return len(pending)
+
+    async def _flush_bucket(self, db: AsyncIOMotorDatabase, day: str, module: str, bucket: SketchBucket) -> None:
+        col = db["sketches"]
+        doc_id = f"{day}:{module}"
+        while True:
+            existing = await repository.sketch(db, doc_id)
+            merged = SketchBucket()
+            merged.merge(bucket)
+            if existing is None:
+                try:
+                    await col.insert_one({"_id": doc_id, "day": day, "moduleId": module, "version": 1, **merged.to_doc()})
+                    break
+                except DuplicateKeyError:
+                    continue
+            merged.merge(SketchBucket.from_doc(existing))
+            # Optimistic concurrency: another worker may have flushed meanwhile
+            result = await col.replace_one(
+                {"_id": doc_id, "version": existing["version"]},
+                {"day": day, "moduleId": module, "version": existing["version"] + 1, **merged.to_doc()},
+            )
+            if result.matched_count:
+                break
+
+    async def run(self, db: AsyncIOMotorDatabase, interval: float = SKETCH_FLUSH_SECONDS) -> None:
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.flush(db)
+                except Exception as e:
+                    print(f"⚠️ Sketch flush failed: {e}")
+        except asyncio.CancelledError:
+            await self.flush(db)
+            raise
+
+    def pending_buckets(self, days: Iterable[str], module: Optional[str]) -> List[SketchBucket]:
+        days = set(days)
+        return [
+            bucket for (day, mod), bucket in self._pending.items()
+            if day in days and (module is None or mod == module)
+        ]
+
+
+sketch_store = SketchStore()
+
+
+async def load_range(
+    db: AsyncIOMotorDatabase,
+    start: datetime,
+    end: datetime,
+    module: Optional[str] = None,
+) -> SketchBucket:
+    """
+    Merge every stored (plus not yet flushed) bucket for days in [start, end].
+    Raises ValueError if start is after end or the range is longer than
+    SKETCH_MAX_RANGE_DAYS.
+    """
+    if start > end:
+        raise ValueError("start must not be after end")
+    if (end - start).days + 1 > SKETCH_MAX_RANGE_DAYS:
+        raise ValueError(f"date range is limited to {SKETCH_MAX_RANGE_DAYS} days")
+
+    days = []
+    day = start
+    while day <= end:
+        days.append(_day_key(day))
+        day += timedelta(days=1)
+
+    docs = await repository.sketches_for_days(db, days, module).to_list(None)
+    # Decoding and merging a year of buckets is pure Python; keep it off the loop
+    merged = await asyncio.to_thread(_merge_docs, docs)
+    # Pending buckets are still being written to by submits, so they are
+    # merged here on the loop (there are only a few of them)
+    for bucket in sketch_store.pending_buckets(days, module):
+        merged.merge(bucket)
+    return merged
+
+
+def _merge_docs(docs: List[Dict[str, Any]]) -> SketchBucket:
+    merged = SketchBucket()
+    for doc in docs:
+        merged.merge(SketchBucket.from_doc(doc))
+    return merged
@@ -0,0 +1,202 @@
+"""
+Pre-rendered speech for the activity catalog.
+
+Every catalog activity has a fixed instructionTts and per-option ttsText,
+so they are synthesized once, ahead of time, instead of per request:
+
+    python -m app.services.speech_assets [--voices ID,ID] [--rates 0.9,1.2] [--workers 4]
+
+walks EXAMPLE_ACTIVITIES, renders each unique utterance for every voice and
+rate in the TTS worker pool, and writes `manifest.json` mapping text to
+file. Files are named like the /tts/generate cache (a hash of the text and
+settings), so a rebuild only renders new or changed text.
+
+The app serves SPEECH_ASSETS_DIR at /static/speech and reads the manifest
+at startup (restart after a build). /activity/next adds the URLs of the
+default voice and rate (the first of each) to the activity as
+`instructionAudioUrl` and each option's `ttsAudioUrl`; clients fetch those
+as plain static files and fall back to /tts/generate or browser speech when
+a URL is missing.
+
+SPEECH_ASSETS_URL points the URLs elsewhere (e.g. a CDN holding a copy of
+the directory).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from . import tts_engine
+from .tts_cache import TTSCache, cache_key, file_name
+
+_current_file = Path(__file__)
+SPEECH_ASSETS_DIR = Path(os.getenv(
+    "SPEECH_ASSETS_DIR",
+    str(_current_file.parent.parent.parent / "speech_assets"),
+))
+SPEECH_ASSETS_URL = os.getenv("SPEECH_ASSETS_URL", "/static/speech").rstrip("/")
+SPEECH_VOICES = [v for v in os.getenv("SPEECH_VOICES", "").split(",") if v]
+SPEECH_RATES = [float(r) for r in os.getenv("SPEECH_RATES", "0.9").split(",") if r]
+
+MANIFEST_NAME = "manifest.json"
+
+
+def variant(voice: Optional[str], rate: float) -> str:
+    return f"{voice or 'default'}@{rate:g}"
+
+
+def catalog_utterances() -> Set[str]:
+    """Every distinct instructionTts and option ttsText in the catalog."""
+    from ..data.activity_items import EXAMPLE_ACTIVITIES
+
+    texts = set()
+    for activity in EXAMPLE_ACTIVITIES:
+        if activity.instructionTts:
+            texts.add(activity.instructionTts)
+        for option in activity.options:
+            if option.ttsText:
+                texts.add(option.ttsText)
+    return texts
+
+
+# ------------- SERVING -------------
+
+class SpeechManifest:
+    def __init__(self, directory: Path = SPEECH_ASSETS_DIR, base_url: str = SPEECH_ASSETS_URL):
+        self.directory = directory
+        self.base_url = base_url
+        self.default_variant: Optional[str] = None
+        # text -> variant -> path relative to the assets directory
+        self.assets: Dict[str, Dict[str, str]] = {}
+        self.loaded_mtime: Optional[float] = None
+
+    def load(self) -> bool:
+        """(Re)read manifest.json if it changed. False if there is none."""
+        path = self.directory / MANIFEST_NAME
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self.loaded_mtime:
+            return True
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.default_variant = manifest.get("defaultVariant")
+        self.assets = manifest.get("assets", {})
+        self.loaded_mtime = mtime
+        return True
+
+    def url(self, text: Optional[str], variant_name: Optional[str] = None) -> Optional[str]:
+        if not text:
+            return None
+        relative = self.assets.get(text, {}).get(variant_name or self.default_variant)
+        return f"{self.base_url}/{relative}" if relative else None
+
+    def annotate(self, activity: Dict[str, Any]) -> Dict[str, Any]:
+        """Add pre-rendered audio URLs to an activity dict, in place."""
+        if not self.assets:
+            return activity
+        activity["instructionAudioUrl"] = self.url(activity.get("instructionTts"))
+        for option in activity.get("options") or []:
+            option["ttsAudioUrl"] = self.url(option.get("ttsText"))
+        return activity
+
+
+speech_manifest = SpeechManifest()
+
+
+# ------------- BUILD -------------
+
+async def build(
+    out_dir: Path = SPEECH_ASSETS_DIR,
+    voices: Optional[List[str]] = None,
+    rates: Optional[List[float]] = None,
+    workers: int = tts_engine.TTS_WORKERS,
+) -> Dict[str, Any]:
+    """Render every catalog utterance for each voice and rate; write the manifest."""
+    engine = tts_engine.engine_name()
+    if engine is None:
+        raise tts_engine.TTSUnavailable("Install pyttsx3 (pip install pyttsx3) or gTTS (pip install gtts)")
+    voices = voices or SPEECH_VOICES or [None]
+    rates = rates or SPEECH_RATES or [0.9]
+    texts = sorted(catalog_utterances())
+    jobs = [(text, voice, rate) for text in texts for voice in voices for rate in rates]
+
+    pool = tts_engine.TTSPool(workers=workers, max_pending=len(jobs) + 1)
+    # Same layout and atomic writes as the /tts/generate cache, never evicted
+    store = TTSCache(str(out_dir), max_bytes=sys.maxsize)
+    media_type = tts_engine.MEDIA_TYPES[engine]
+    assets: Dict[str, Dict[str, str]] = {text: {} for text in texts}
+    failures: List[str] = []
+    rendered = 0
+
+    async def render(text: str, voice: Optional[str], rate: float) -> None:
+        nonlocal rendered
+        # volume and pitch as /tts/generate defaults them
+        name = file_name(cache_key(text, rate, 1.0, 1.0, voice, engine), media_type)
+
+        async def synthesize():
+            nonlocal rendered
+            result = await pool.synthesize(text, rate, 1.0, voice)
+            rendered += 1
+            return result
+
+        try:
+            path = await store.get_or_create(name, synthesize)
+        except Exception as e:
+            failures.append(f"{text!r} ({variant(voice, rate)}): {e}")
+            return
+        assets[text][variant(voice, rate)] = Path(path).relative_to(out_dir).as_posix()
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(render(*job) for job in jobs))
+    finally:
+        pool.shutdown()
+
+    manifest = {
+        "engine": engine,
+        "generatedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "variants": [variant(v, r) for v in voices for r in rates],
+        "defaultVariant": variant(voices[0], rates[0]),
+        "assets": assets,
+    }
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # Written then renamed, so the server never reads half a manifest
+    partial = out_dir / f"{MANIFEST_NAME}.part"
+    with open(partial, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False, sort_keys=True)
+    os.replace(partial, out_dir / MANIFEST_NAME)
+
+    return {
+        "utterances": len(texts),
+        "files": len(jobs) - len(failures),
+        "rendered": rendered,
+        "reused": len(jobs) - len(failures) - rendered,
+        "failures": failures,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render speech for every catalog activity")
+    parser.add_argument("--out", default=str(SPEECH_ASSETS_DIR), help="Assets directory")
+    parser.add_argument("--voices", default=",".join(SPEECH_VOICES), help="Comma-separated voice ids (default: engine default)")
+    parser.add_argument("--rates", default=",".join(f"{r:g}" for r in SPEECH_RATES), help="Comma-separated speech rates")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="TTS worker processes")
+    args = parser.parse_args()
+
+    report = asyncio.run(build(
+        Path(args.out),
+        voices=[v for v in args.voices.split(",") if v] or None,
+        rates=[float(r) for r in args.rates.split(",") if r] or None,
+        workers=args.workers,
+    ))
+    for failure in report.pop("failures"):
+        print(f"⚠️ {failure}")
+    print(json.dumps(report))
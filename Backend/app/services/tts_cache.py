@@ -0,0 +1,207 @@
+"""
+Content-addressed disk cache for synthesized speech.
+
+Activity prompts repeat constantly ("pig", "Look at the picture and click
+the word that matches."), so audio is stored under the SHA-256 of
+everything that affects it: text, rate, pitch, volume, voice and engine,
+plus CACHE_FORMAT, which is bumped when the audio made for the same
+settings changes so older files are never served again. The key doubles as
+a strong ETag, and a cached file is served with FileResponse (sendfile,
+HTTP Range) without touching a TTS worker. Clients may keep it for a day
+(CACHE_CONTROL) and then revalidate with the ETag; it is not marked
+immutable, so a bad file can't outlive a fix for longer than that.
+
+A new file is synthesized into a temp file and renamed into place, so
+readers never see a partial file and concurrent workers can share the
+directory. Concurrent requests for the same key in one process share a
+single synthesis. Hits bump the file's mtime; once the directory grows past
+TTS_CACHE_MAX_BYTES the least recently used files are removed down to 90%
+of the cap. TTS_CACHE_MAX_BYTES=0 turns the cache off.
+"""
+
+import asyncio
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "neuro_tts_cache"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# 2: pyttsx3 workers reset the voice on every job (before, a voice could
+# carry over from an earlier request and be cached under voice=None)
+CACHE_FORMAT = 2
+CACHE_CONTROL = "public, max-age=86400"
+
+EXTENSIONS = {"audio/wav": "wav", "audio/mpeg": "mp3"}
+MEDIA_TYPES = {ext: media_type for media_type, ext in EXTENSIONS.items()}
+
+CACHE_REQUESTS = metrics.registry.counter(
+    "tts_cache_requests_total", "TTS cache lookups by result (hit, miss, shared)", ("result",)
+)
+CACHE_BYTES = metrics.registry.gauge("tts_cache_bytes", "Size of the TTS audio cache directory")
+CACHE_EVICTIONS = metrics.registry.counter("tts_cache_evictions_total", "Audio files evicted from the TTS cache")
+
+
+def cache_key(
+    text: str,
+    rate: Optional[float],
+    pitch: Optional[float],
+    volume: Optional[float],
+    voice: Optional[str],
+    engine: str,
+) -> str:
+    parts = {
+        "text": text, "rate": rate, "pitch": pitch, "volume": volume, "voice": voice, "engine": engine,
+        "format": CACHE_FORMAT,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def file_name(key: str, media_type: str) -> str:
+    return f"{key}.{EXTENSIONS[media_type]}"
+
+
+class TTSCache:
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None  # Scanned on first write
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._evicting = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def path_for(self, name: str) -> str:
+        # Two-level fan-out keeps directories small
+        return os.path.join(self.directory, name[:2], name)
+
+    def lookup(self, name: str) -> Optional[str]:
+        """Path of a cached file, marking it recently used, or None."""
+        path = self.path_for(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    async def get_or_create(
+        self, name: str, synthesize: Callable[[], Awaitable[Tuple[str, str]]]
+    ) -> str:
+        """
+        The cached file for `name`, calling `synthesize` (which returns a temp
+        file path and media type) to create it on a miss.
+        """
+        path = self.lookup(name)
+        if path is not None:
+            self.hits += 1
+            CACHE_REQUESTS.inc("hit")
+            return path
+
+        pending = self._inflight.get(name)
+        if pending is not None:
+            CACHE_REQUESTS.inc("shared")
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        CACHE_REQUESTS.inc("miss")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[name] = future
+        try:
+            temp_path, _ = await synthesize()
+            path = await asyncio.to_thread(self._store, temp_path, name)
+            future.set_result(path)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Nobody else may be waiting; don't warn about it
+            raise
+        finally:
+            del self._inflight[name]
+        await self._maybe_evict()
+        return path
+
+    def _store(self, temp_path: str, name: str) -> str:
+        path = self.path_for(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.replace(temp_path, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Temp dir on another filesystem: copy next to the target, then rename
+            partial = f"{path}.{os.getpid()}.part"
+            shutil.copyfile(temp_path, partial)
+            os.replace(partial, path)
+            os.remove(temp_path)
+        if self._size is not None:
+            self._size += os.path.getsize(path)
+        return path
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        """(mtime, size, path) of every cached file."""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for file in names:
+                path = os.path.join(root, file)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _evict(self) -> int:
+        files = self._scan()
+        size = sum(f[1] for f in files)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        if size > self.max_bytes:
+            for _, file_size, path in sorted(files):
+                if size <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                size -= file_size
+                removed += 1
+        self._size = size
+        return removed
+
+    async def _maybe_evict(self) -> None:
+        if self._size is not None:
+            CACHE_BYTES.set(value=self._size)
+        if self._evicting or (self._size is not None and self._size <= self.max_bytes):
+            return
+        # Other workers write here too, so the size is re-measured from disk
+        self._evicting = True
+        try:
+            removed = await asyncio.to_thread(self._evict)
+        finally:
+            self._evicting = False
+        self.evictions += removed
+        CACHE_EVICTIONS.inc(amount=removed)
+        CACHE_BYTES.set(value=self._size)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "max_bytes": self.max_bytes,
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+tts_cache = TTSCache()
@@ -0,0 +1,299 @@
+"""
+Text-to-speech synthesis off the event loop.
+
+pyttsx3 drives the system speech engine synchronously and is not safe to
+share between threads, so synthesis runs in a pool of TTS_WORKERS worker
+processes. Each process initialises one pyttsx3 engine when it starts and
+keeps it for its lifetime; rate, volume and voice are set on every job, so
+one request's voice never carries over to the next. Every request writes
+its own temp file in TTS_TMP_DIR, so concurrent requests neither block the
+loop nor overwrite each other's audio. The caller owns the returned file.
+
+At most TTS_MAX_PENDING syntheses may be running or waiting; beyond that
+callers get TTSBusy (the route answers 503). Jobs are handed to the pool
+only as workers free up, and a synthesis taking longer than
+TTS_TIMEOUT_SECONDS from then raises TTSTimeout (time spent waiting for a
+worker doesn't count). The pool is then restarted since the stuck worker
+can't be interrupted; jobs that were running on the other workers are
+resubmitted once to the new pool.
+
+Without pyttsx3 the gTTS fallback (network, MP3) runs in a thread with the
+same limits. The voice list is read once at startup (start).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import metrics
+
+try:
+    import pyttsx3
+    PYTTSX3_AVAILABLE = True
+except ImportError:
+    pyttsx3 = None
+    PYTTSX3_AVAILABLE = False
+
+try:
+    from gtts import gTTS
+    GTTS_AVAILABLE = True
+except ImportError:
+    gTTS = None
+    GTTS_AVAILABLE = False
+
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "2"))
+TTS_MAX_PENDING = int(os.getenv("TTS_MAX_PENDING", "32"))
+TTS_TIMEOUT_SECONDS = float(os.getenv("TTS_TIMEOUT_SECONDS", "30"))
+TTS_TMP_DIR = os.getenv("TTS_TMP_DIR", os.path.join(tempfile.gettempdir(), "neuro_tts"))
+
+MEDIA_TYPES = {"pyttsx3": "audio/wav", "gtts": "audio/mpeg"}
+
+SYNTH_SECONDS = metrics.registry.histogram(
+    "tts_synthesis_seconds", "Time to synthesize one request, including queueing", ("engine",)
+)
+TTS_PENDING = metrics.registry.gauge("tts_queue_depth", "TTS requests running or waiting for a worker")
+TTS_REJECTED = metrics.registry.counter("tts_rejected_total", "TTS requests refused because the queue was full")
+TTS_TIMEOUTS = metrics.registry.counter("tts_timeouts_total", "TTS requests that hit TTS_TIMEOUT_SECONDS")
+
+
+class TTSUnavailable(Exception):
+    pass
+
+
+class TTSBusy(Exception):
+    pass
+
+
+class TTSTimeout(Exception):
+    pass
+
+
+def engine_name() -> Optional[str]:
+    """The engine requests are synthesized with, or None if none is installed."""
+    if PYTTSX3_AVAILABLE:
+        return "pyttsx3"
+    if GTTS_AVAILABLE:
+        return "gtts"
+    return None
+
+
+# ------------- WORKER PROCESS -------------
+
+_engine = None
+# The engine's own voice, restored for requests that don't name one
+_default_voice = None
+
+
+def _init_worker() -> None:
+    global _engine, _default_voice
+    _engine = pyttsx3.init()
+    _default_voice = _engine.getProperty("voice")
+
+
+def _temp_path(suffix: str) -> str:
+    os.makedirs(TTS_TMP_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix="tts_", suffix=suffix, dir=TTS_TMP_DIR)
+    os.close(fd)
+    return path
+
+
+def _synthesize_pyttsx3(text: str, rate: float, volume: float, voice: Optional[str]) -> str:
+    """
+    Runs in a worker process. Returns the path of a new WAV file. The engine
+    outlives the request, so every property is set on every call.
+    """
+    _engine.setProperty("rate", int(rate * 100))  # pyttsx3 uses words per minute, ~0-200
+    _engine.setProperty("volume", volume)
+    _engine.setProperty("voice", voice or _default_voice)
+    path = _temp_path(".wav")
+    try:
+        _engine.save_to_file(text, path)
+        _engine.runAndWait()
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _list_voices() -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": voice.id,
+            "name": voice.name,
+            "gender": getattr(voice, "gender", "unknown"),
+            "languages": [
+                lang.decode("utf-8", "replace") if isinstance(lang, bytes) else lang
+                for lang in getattr(voice, "languages", []) or []
+            ],
+        }
+        for voice in _engine.getProperty("voices")
+    ]
+
+
+def _synthesize_gtts(text: str, rate: float) -> str:
+    """Runs in a thread. Returns the path of a new MP3 file."""
+    path = _temp_path(".mp3")
+    try:
+        # gTTS only has normal and slow speech
+        gTTS(text=text, lang="en", slow=rate < 0.75).save(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _remove_stale_temp_files(max_age: float = 3600) -> None:
+    if not os.path.isdir(TTS_TMP_DIR):
+        return
+    cutoff = time.time() - max_age
+    for entry in os.scandir(TTS_TMP_DIR):
+        try:
+            if entry.name.startswith("tts_") and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass  # Gone already
+
+
+# ------------- POOL -------------
+
+class TTSPool:
+    def __init__(
+        self,
+        workers: int = TTS_WORKERS,
+        max_pending: int = TTS_MAX_PENDING,
+        timeout: float = TTS_TIMEOUT_SECONDS,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # One slot per worker: a job holding one is running, not queued
+        self._slots = asyncio.Semaphore(workers)
+        self.pending = 0
+        self.restarts = 0
+        self.voices: List[Dict[str, Any]] = []
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the parent has an event loop and driver threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        """Drop `executor`, killing its workers (a hung runAndWait never returns)."""
+        if self._executor is not executor:
+            return  # Already replaced after an earlier failure
+        self._executor = None
+        self.restarts += 1
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, engine: str, fn, *args) -> str:
+        """Run fn(*args) in a worker process (pyttsx3) or a thread (gTTS)."""
+        if self.pending >= self.max_pending:
+            TTS_REJECTED.inc()
+            raise TTSBusy(f"{self.pending} TTS requests already queued")
+
+        self.pending += 1
+        TTS_PENDING.set(value=self.pending)
+        started = time.perf_counter()
+        try:
+            async with self._slots:
+                loop = asyncio.get_running_loop()
+                for attempt in range(2):
+                    # Picked after the wait, so a pool restarted meanwhile isn't used
+                    executor = self._get_executor() if engine == "pyttsx3" else None
+                    try:
+                        return await asyncio.wait_for(loop.run_in_executor(executor, fn, *args), self.timeout)
+                    except asyncio.TimeoutError:
+                        TTS_TIMEOUTS.inc()
+                        if executor is not None:
+                            self._restart(executor)
+                        raise TTSTimeout(f"TTS took longer than {self.timeout:g}s")
+                    except BrokenProcessPool:
+                        if attempt == 0 and self._executor is not executor:
+                            # Killed by another job's restart, not by this one; run it again
+                            continue
+                        # A worker died (or its engine failed to start); start fresh next time
+                        self._restart(executor)
+                        raise
+        finally:
+            self.pending -= 1
+            TTS_PENDING.set(value=self.pending)
+            SYNTH_SECONDS.observe(time.perf_counter() - started, engine)
+
+    async def synthesize(
+        self, text: str, rate: float = 0.9, volume: float = 1.0, voice: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """
+        Synthesize `text` into a new temp file. Returns (path, media type);
+        the caller deletes the file.
+        """
+        engine = engine_name()
+        if engine == "pyttsx3":
+            path = await self._run(engine, _synthesize_pyttsx3, text, rate, volume, voice)
+        elif engine == "gtts":
+            path = await self._run(engine, _synthesize_gtts, text, rate)
+        else:
+            raise TTSUnavailable("Install pyttsx3 (pip install pyttsx3) or gTTS (pip install gtts)")
+        return path, MEDIA_TYPES[engine]
+
+    async def start(self) -> None:
+        """
+        Start every worker and read the voice list, so the first requests
+        don't wait for processes to spawn. Also clears temp files left by
+        workers that were killed mid-synthesis.
+        """
+        _remove_stale_temp_files()
+        if not PYTTSX3_AVAILABLE:
+            return
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        # Submitted together, so the pool spawns a process for each. No
+        # timeout: spawning is slow, and requests don't wait on this
+        calls = [loop.run_in_executor(executor, _list_voices) for _ in range(self.workers)]
+        try:
+            results = await asyncio.gather(*calls)
+            self.voices = results[0]
+        except Exception as e:
+            print(f"⚠️ Could not start TTS workers: {e!r}")
+
+    async def load_voices(self) -> List[Dict[str, Any]]:
+        """Read the system voice list in a worker and keep it."""
+        if not PYTTSX3_AVAILABLE:
+            return self.voices
+        loop = asyncio.get_running_loop()
+        try:
+            self.voices = await asyncio.wait_for(
+                loop.run_in_executor(self._get_executor(), _list_voices), self.timeout
+            )
+        except Exception as e:
+            print(f"⚠️ Could not load TTS voices: {e}")
+        return self.voices
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "engine": engine_name(),
+            "workers": self.workers,
+            "pending": self.pending,
+            "restarts": self.restarts,
+            "voices": len(self.voices),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+tts_pool = TTSPool()
@@ -0,0 +1,170 @@
+"""
+Sentence-by-sentence streaming speech.
+
+Long passages are split into sentences that are synthesized as a pipeline:
+up to TTS_STREAM_LOOKAHEAD sentences are rendered ahead (in the TTS worker
+pool, through the disk cache when it is on) while earlier ones are being
+sent, so playback can start once the first sentence is ready instead of
+after the whole text.
+
+WAV (pyttsx3) is sent as one stream: a header with the "unknown length"
+sizes (0xFFFFFFFF), then each sentence's PCM frames. MP3 (gTTS) frames are
+self-delimiting, so sentence files are simply sent one after another.
+
+Time to first byte and total time land in tts_stream_first_byte_seconds and
+tts_stream_total_seconds.
+"""
+
+import asyncio
+import io
+import os
+import re
+import struct
+import time
+import wave
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional
+
+from . import metrics, tts_engine
+from .tts_cache import cache_key, file_name, tts_cache
+from .tts_engine import tts_pool
+
+TTS_STREAM_LOOKAHEAD = int(os.getenv("TTS_STREAM_LOOKAHEAD", "2"))
+# Retries for a sentence refused with TTSBusy once the stream has started
+BUSY_RETRIES = 3
+BUSY_RETRY_SECONDS = 0.5
+
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\n+")
+UNKNOWN_SIZE = 0xFFFFFFFF
+
+FIRST_BYTE_SECONDS = metrics.registry.histogram(
+    "tts_stream_first_byte_seconds", "Streaming TTS: request start to first audio byte"
+)
+TOTAL_SECONDS = metrics.registry.histogram(
+    "tts_stream_total_seconds", "Streaming TTS: request start to last audio byte"
+)
+SENTENCES = metrics.registry.histogram(
+    "tts_stream_sentences", "Sentences per streaming TTS request", buckets=(1, 2, 5, 10, 20, 50, 100)
+)
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in SENTENCE_END.split(text) if sentence.strip()]
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _wav_header(params) -> bytes:
+    """RIFF/WAVE header for PCM data of unknown length, from wave getparams()."""
+    block_align = params.nchannels * params.sampwidth
+    return (
+        b"RIFF" + struct.pack("<I", UNKNOWN_SIZE) + b"WAVE"
+        + b"fmt " + struct.pack(
+            "<IHHIIHH", 16, 1, params.nchannels, params.framerate,
+            params.framerate * block_align, block_align, params.sampwidth * 8,
+        )
+        + b"data" + struct.pack("<I", UNKNOWN_SIZE)
+    )
+
+
+class SpeechStream:
+    """One streaming request. Call start() (which may raise), then iterate body()."""
+
+    def __init__(self, text: str, rate: float, pitch: float, volume: float, voice: Optional[str]):
+        self.engine = tts_engine.engine_name()
+        if self.engine is None:
+            raise tts_engine.TTSUnavailable("Install pyttsx3 (pip install pyttsx3) or gTTS (pip install gtts)")
+        self.media_type = tts_engine.MEDIA_TYPES[self.engine]
+        self.rate = rate
+        self.pitch = pitch
+        self.volume = volume
+        self.voice = voice
+        self.sentences = split_sentences(text)
+        self.started = time.perf_counter()
+        self._pending: Deque[asyncio.Task] = deque()
+        self._next = 0
+        self._first: Optional[bytes] = None
+
+    async def _render_once(self, sentence: str) -> bytes:
+        def synthesize():
+            return tts_pool.synthesize(sentence, self.rate, self.volume, self.voice)
+
+        if tts_cache.enabled:
+            key = cache_key(sentence, self.rate, self.pitch, self.volume, self.voice, self.engine)
+            path = await tts_cache.get_or_create(file_name(key, self.media_type), synthesize)
+            return await asyncio.to_thread(_read, path)
+        path, _ = await synthesize()
+        try:
+            return await asyncio.to_thread(_read, path)
+        finally:
+            os.remove(path)
+
+    async def _render(self, sentence: str, retry_busy: bool) -> bytes:
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                return await self._render_once(sentence)
+            except tts_engine.TTSBusy:
+                if not retry_busy or attempt == BUSY_RETRIES:
+                    raise
+                await asyncio.sleep(BUSY_RETRY_SECONDS)
+
+    def _fill(self) -> None:
+        while self._next < len(self.sentences) and len(self._pending) < max(1, TTS_STREAM_LOOKAHEAD):
+            retry_busy = self._next > 0
+            self._pending.append(asyncio.ensure_future(self._render(self.sentences[self._next], retry_busy)))
+            self._next += 1
+
+    async def start(self) -> None:
+        """Render the first sentence, so errors can still become an HTTP status."""
+        SENTENCES.observe(len(self.sentences))
+        self._fill()
+        if self._pending:
+            try:
+                self._first = await self._pending.popleft()
+            except BaseException:
+                self.close()
+                raise
+
+    def close(self) -> None:
+        for task in self._pending:
+            if task.done() and not task.cancelled():
+                task.exception()  # Retrieved, so asyncio doesn't warn about it
+            task.cancel()
+        self._pending.clear()
+
+    async def body(self) -> AsyncIterator[bytes]:
+        params = None
+        first_chunk = True
+        try:
+            audio = self._first
+            while audio is not None:
+                self._fill()
+                if self.media_type == "audio/wav":
+                    with wave.open(io.BytesIO(audio)) as w:
+                        sentence_params, frames = w.getparams(), w.readframes(w.getnframes())
+                    if params is None:
+                        params = sentence_params
+                        chunk = _wav_header(params) + frames
+                    elif sentence_params[:3] != params[:3]:
+                        # Different channels/width/rate can't share the stream
+                        print(f"⚠️ Skipping a sentence in an unexpected format: {sentence_params}")
+                        chunk = b""
+                    else:
+                        chunk = frames
+                else:
+                    chunk = audio
+                if chunk:
+                    if first_chunk:
+                        first_chunk = False
+                        FIRST_BYTE_SECONDS.observe(time.perf_counter() - self.started)
+                    yield chunk
+                audio = await self._pending.popleft() if self._pending else None
+        except Exception as e:
+            # The status line is gone; the client just gets shorter audio
+            print(f"⚠️ Streaming TTS stopped early: {e}")
+        finally:
+            self.close()
+            TOTAL_SECONDS.observe(time.perf_counter() - self.started)
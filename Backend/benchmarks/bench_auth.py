@@ -0,0 +1,118 @@
+"""
+Benchmark: a class logging in at once.
+
+Fires concurrent POST /auth/login requests while a probe calls
+GET /activity/next every few milliseconds, once with bcrypt inline on the
+event loop (PASSWORD_HASH_WORKERS=0, the old behaviour) and once per
+requested pool size. Reports login throughput and the /next latency seen
+while the logins were running.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_auth [--users 30] [--rounds 12] [--workers 0,4]
+
+Reads MONGODB_URI like the app; data goes to BENCH_MONGODB_DB
+(default "neuro_learn_bench"), which is dropped before and after the run.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from app.db import mongo
+
+BENCH_MONGODB_DB = os.getenv("BENCH_MONGODB_DB", "neuro_learn_bench")
+PROBE_INTERVAL_SECONDS = 0.02
+
+
+def _percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def _probe(client, stop, latencies):
+    while not stop.is_set():
+        # Measured from when the request was due, so time spent waiting for a
+        # blocked event loop to run the probe at all counts too
+        due = time.perf_counter() + PROBE_INTERVAL_SECONDS
+        await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+        (await client.get("/api/activity/next", params={"userId": "bench_probe"})).raise_for_status()
+        latencies.append((time.perf_counter() - due) * 1000)
+
+
+async def _login(client, email):
+    response = await client.post("/api/auth/login", json={"email": email, "password": "bench-password"})
+    response.raise_for_status()
+
+
+async def _run(client, emails):
+    stop = asyncio.Event()
+    latencies = []
+    probe = asyncio.create_task(_probe(client, stop, latencies))
+    await asyncio.sleep(PROBE_INTERVAL_SECONDS * 2)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_login(client, email) for email in emails))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    return elapsed, latencies
+
+
+async def main(users, rounds, worker_counts):
+    from app.routes import auth
+    from app.services import password_hasher as hasher_module
+
+    mongo.MONGODB_DB = BENCH_MONGODB_DB
+    from app.main import app
+
+    emails = [f"bench_user_{i}@example.com" for i in range(users)]
+    # The lifespan closes the Mongo client on exit, so clean up inside it
+    async with app.router.lifespan_context(app):
+        db = await mongo.get_db()
+        await db.client.drop_database(BENCH_MONGODB_DB)
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                auth.password_hasher = hasher_module.PasswordHasher(rounds=rounds, max_pending=users)
+                for email in emails:
+                    response = await client.post(
+                        "/api/auth/register",
+                        json={"email": email, "password": "bench-password", "name": "Bench"},
+                    )
+                    response.raise_for_status()
+                auth.password_hasher.shutdown()
+
+                # Baseline /next latency with nothing else running
+                _, idle = await _run(client, [])
+                print(f"idle /next: p50 {_percentile(idle, 50):.1f} ms  p95 {_percentile(idle, 95):.1f} ms")
+                print(f"{'workers':>8} {'logins/s':>9} {'total ms':>9} {'next p50':>9} {'next p95':>9} {'next max':>9} {'probes':>7}")
+                for workers in worker_counts:
+                    auth.password_hasher = hasher_module.PasswordHasher(
+                        workers=workers, rounds=rounds, max_pending=users
+                    )
+                    elapsed, latencies = await _run(client, emails)
+                    auth.password_hasher.shutdown()
+                    label = "inline" if workers <= 0 else str(workers)
+                    print(
+                        f"{label:>8} {users / elapsed:>9.1f} {elapsed * 1000:>9.1f} "
+                        f"{_percentile(latencies, 50):>9.1f} {_percentile(latencies, 95):>9.1f} "
+                        f"{max(latencies, default=float('nan')):>9.1f} {len(latencies):>7}"
+                    )
+        finally:
+            auth.password_hasher = hasher_module.password_hasher
+            await db.client.drop_database(BENCH_MONGODB_DB)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent logins against /next latency")
+    parser.add_argument("--users", type=int, default=30, help="Learners logging in at once")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--workers", default="0,4", help="Comma-separated pool sizes (0 = inline)")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.rounds, [int(w) for w in args.workers.split(",")]))
@@ -0,0 +1,96 @@
+"""
+Benchmark: classroom progress for 30 / 300 / 3000 learners.
+
+Compares the per-user path a teacher dashboard used to take (GET /progress
+plus GET /progress/modules for every learner) with one POST /progress/bulk
+call, against a scratch database.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_progress_bulk [--sizes 30,300,3000] [--interactions 20]
+
+Reads MONGODB_URI like the app; data goes to BENCH_MONGODB_DB
+(default "neuro_learn_bench"), which is dropped before and after the run.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+
+import httpx
+
+from app.db import mongo
+
+BENCH_MONGODB_DB = os.getenv("BENCH_MONGODB_DB", "neuro_learn_bench")
+
+
+async def _seed(db, user_ids, interactions_per_user):
+    from app.services.progress_store import CATALOG_INDEX
+
+    activity_ids = list(CATALOG_INDEX) or ["M1_Q1"]
+    docs = []
+    for user_id in user_ids:
+        for _ in range(interactions_per_user):
+            docs.append({
+                "userId": user_id,
+                "activityId": random.choice(activity_ids),
+                "isCorrect": random.random() < 0.7,
+                "timeTaken": random.randint(5, 120),
+                "timestamp": datetime.utcnow(),
+            })
+    for i in range(0, len(docs), 10000):
+        await db["interactions"].insert_many(docs[i:i + 10000])
+
+
+async def _per_user(client, user_ids):
+    for user_id in user_ids:
+        (await client.get("/api/progress", params={"userId": user_id})).raise_for_status()
+        (await client.get("/api/progress/modules", params={"userId": user_id})).raise_for_status()
+
+
+async def _bulk(client, user_ids, stream):
+    response = await client.post("/api/progress/bulk", json={"userIds": user_ids, "stream": stream})
+    response.raise_for_status()
+    return len(response.content)
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return (time.perf_counter() - start) * 1000, result
+
+
+async def main(sizes, interactions_per_user):
+    mongo.MONGODB_DB = BENCH_MONGODB_DB
+    db = await mongo.get_db()
+    await db.client.drop_database(BENCH_MONGODB_DB)
+
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            print(f"{'users':>6} {'cold bulk ms':>13} {'per-user ms':>12} {'bulk ms':>9} {'stream ms':>10} {'bytes':>9}")
+            for size in sizes:
+                user_ids = [f"bench_user_{size}_{i}" for i in range(size)]
+                await _seed(db, user_ids, interactions_per_user)
+
+                # First call rebuilds every record from interactions
+                cold_ms, _ = await _timed(_bulk(client, user_ids, False))
+                per_user_ms, _ = await _timed(_per_user(client, user_ids))
+                bulk_ms, size_bytes = await _timed(_bulk(client, user_ids, False))
+                stream_ms, _ = await _timed(_bulk(client, user_ids, True))
+                print(f"{size:>6} {cold_ms:>13.1f} {per_user_ms:>12.1f} {bulk_ms:>9.1f} {stream_ms:>10.1f} {size_bytes:>9}")
+    finally:
+        await db.client.drop_database(BENCH_MONGODB_DB)
+        mongo.close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bulk classroom progress")
+    parser.add_argument("--sizes", default="30,300,3000", help="Comma-separated roster sizes")
+    parser.add_argument("--interactions", type=int, default=20, help="Seeded interactions per learner")
+    args = parser.parse_args()
+    asyncio.run(main([int(s) for s in args.sizes.split(",")], args.interactions))
@@ -0,0 +1,98 @@
+"""
+Benchmark: decision-table recommender vs the live sklearn models.
+
+For each grid resolution, reports table build time and in-memory size (also
+as a share of the loaded sklearn models' in-memory size), disagreement with
+the full models, and per-call latency of recommend_next's inference step on
+both paths. Uses the active model version from the registry.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_recommender [--resolutions 4,6,8] [--calls 2000]
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+from sklearn.tree._tree import Tree as SklearnTree
+
+from app.services import decision_table, ml_engine
+
+
+def _random_features(rng):
+    return {
+        key: rng.uniform(low, high)
+        for key, (low, high) in decision_table.FEATURE_BOUNDS.items()
+    }
+
+
+def _in_memory_bytes(obj, seen=None) -> int:
+    """
+    Approximate in-memory footprint of a fitted model: numpy arrays, sklearn
+    tree node arrays (allocated outside the Python heap) and the Python
+    objects holding them.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, SklearnTree):
+        return sum(_in_memory_bytes(v, seen) for v in obj.__getstate__().values())
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_in_memory_bytes(k, seen) + _in_memory_bytes(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_in_memory_bytes(v, seen) for v in obj)
+    elif hasattr(obj, "__dict__"):
+        size += _in_memory_bytes(vars(obj), seen)
+    return size
+
+
+def _per_call_us(fn, inputs):
+    start = time.perf_counter()
+    for features in inputs:
+        fn(features)
+    return (time.perf_counter() - start) / len(inputs) * 1e6
+
+
+def main(resolutions, calls):
+    models = ml_engine.load_models()
+    rng = random.Random(0)
+    inputs = [_random_features(rng) for _ in range(calls)]
+
+    def full_models(features):
+        x = ml_engine.features_to_vector(features)
+        models.difficulty.predict(x)
+        models.cluster.predict(x)
+        models.activity.predict(x)
+
+    model_bytes = sum(_in_memory_bytes(m) for m in (models.difficulty, models.cluster, models.activity))
+    models_us = _per_call_us(full_models, inputs)
+    print(f"version {models.version}: sklearn models {models_us:.1f} us/call, {model_bytes / 1024:.0f} KB in memory")
+
+    print(
+        f"{'res':>4} {'cells':>10} {'KB':>8} {'vs models':>10} {'build s':>8} {'us/call':>8} "
+        f"{'speedup':>8} {'disagree':>9}"
+    )
+    for res in resolutions:
+        started = time.perf_counter()
+        table = decision_table.build_table(models, ml_engine.FEATURE_KEYS, res)
+        build_s = time.perf_counter() - started
+        table_us = _per_call_us(table.lookup, inputs)
+        report = decision_table.disagreement_report(models, table)
+        print(
+            f"{res:>4} {table.codes.size:>10} {table.nbytes / 1024:>8.0f} {table.nbytes / model_bytes:>10.1%} "
+            f"{build_s:>8.1f} {table_us:>8.2f} {models_us / table_us:>7.0f}x {report['any_disagreement']:>9.2%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the decision-table recommender")
+    parser.add_argument("--resolutions", default="4,6,8", help="Comma-separated bins per feature")
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+    main([int(r) for r in args.resolutions.split(",")], args.calls)
@@ -0,0 +1,251 @@
+"""
+Load test: simulated classroom sessions against the API.
+
+Each virtual learner loops: GET /activity/next, think, POST /activity/submit
+(with feedback text some of the time), then occasionally views its progress,
+asks for a rephrase or requests TTS. One virtual teacher per 30 learners
+polls the admin dashboard endpoints. Per endpoint the run reports p50 / p95 /
+p99 latency, throughput and error rate, for each requested user count.
+
+Usage (from Backend/):
+    python -m benchmarks.loadtest --users 10,50,200 --duration 30 [--store memory|mongo] [--out results.json]
+    python -m benchmarks.loadtest --url http://127.0.0.1:8030 --users 50
+
+Without --url the app runs in-process (lifespan included, so the background
+writers are exercised too) and the LLM is replaced by a stub that sleeps
+--llm-ms. --store mongo uses MONGODB_URI with the scratch database
+LOADTEST_MONGODB_DB (dropped afterwards). --store memory needs no server:
+pymongo_inmemory starts a throwaway mongod (downloading the binary on first
+use, see its PYMONGOIM__* settings) that is stopped and deleted after the
+run, so the full write path ($inc/$bit progress updates, group commit) runs
+against a real server. With --url the server's own Mongo and LLM
+configuration is used.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+LOADTEST_MONGODB_DB = os.getenv("LOADTEST_MONGODB_DB", "neuro_learn_loadtest")
+
+FEEDBACK = [
+    None, None, None,
+    "This was fun and easy!",
+    "I don't understand this question, it is confusing",
+    "too hard",
+    "I liked the picture",
+]
+MODULES = ["M1", "M1", "M1", "M2", "M3"]
+LEARNERS_PER_TEACHER = 30
+TEACHER_POLL_SECONDS = 5.0
+ADMIN_ENDPOINTS = [
+    ("admin/user-stats", "/api/admin/user-stats"),
+    ("admin/accuracy-trends", "/api/admin/accuracy-trends?days=7"),
+    ("admin/recent-activity", "/api/admin/recent-activity?limit=20"),
+    ("admin/model-performance", "/api/admin/model-performance"),
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception:
+            self.latencies[name].append(time.perf_counter() - start)
+            self.errors[name] += 1
+            self.statuses[name][0] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - start)
+        self.statuses[name][response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors[name] += 1
+        return response
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        result = {}
+        for name in sorted(self.latencies):
+            ms = np.array(self.latencies[name]) * 1000
+            result[name] = {
+                "requests": len(ms),
+                "rps": round(len(ms) / elapsed, 2),
+                "p50_ms": round(float(np.percentile(ms, 50)), 2),
+                "p95_ms": round(float(np.percentile(ms, 95)), 2),
+                "p99_ms": round(float(np.percentile(ms, 99)), 2),
+                "error_rate": round(self.errors[name] / len(ms), 4),
+                "statuses": {str(k): v for k, v in self.statuses[name].items()},
+            }
+        return result
+
+
+async def learner(client, rec: Recorder, user_id: str, args, deadline: float, rng: random.Random) -> None:
+    while time.monotonic() < deadline:
+        module = rng.choice(MODULES)
+        response = await rec.call(client, "activity/next", "GET", "/api/activity/next",
+                                  params={"userId": user_id, "moduleId": module})
+        activity = response.json() if response is not None and response.status_code == 200 else {}
+        activity_id = activity.get("id") or activity.get("activityId") or f"{module}_L1_Q1"
+        question = activity.get("instruction") or activity.get("question") or "Match the picture to the correct word."
+
+        # Think time: exponential around the mean, like real answer times
+        think = rng.expovariate(1 / args.think) if args.think > 0 else 0
+        await asyncio.sleep(min(think, max(0.0, deadline - time.monotonic())))
+
+        await rec.call(client, "activity/submit", "POST", "/api/activity/submit", json={
+            "activityId": activity_id,
+            "answer": "A",
+            "isCorrect": rng.random() < 0.7,
+            "timeTaken": round(max(1.0, think), 2),
+            "difficultyRating": rng.randint(1, 5),
+            "focusRating": rng.randint(1, 5),
+            "attentionScore": round(rng.random(), 3),
+            "feedbackText": rng.choice(FEEDBACK),
+            "userId": user_id,
+        })
+
+        if rng.random() < args.progress_prob:
+            await rec.call(client, "progress/modules", "GET", "/api/progress/modules", params={"userId": user_id})
+        if rng.random() < args.rephrase_prob:
+            await rec.call(client, "rephrase", "POST", "/api/rephrase",
+                           json={"question": question, "neuroType": "Dyslexia"})
+        if rng.random() < args.tts_prob:
+            await rec.call(client, "tts/generate", "POST", "/api/tts/generate", json={"text": question})
+
+
+async def teacher(client, rec: Recorder, deadline: float, rng: random.Random) -> None:
+    while time.monotonic() < deadline:
+        for name, url in ADMIN_ENDPOINTS:
+            await rec.call(client, name, "GET", url)
+        await asyncio.sleep(min(TEACHER_POLL_SECONDS * (0.5 + rng.random()), max(0.0, deadline - time.monotonic())))
+
+
+async def run_level(client, users: int, args) -> Dict[str, Any]:
+    rec = Recorder()
+    start = time.monotonic()
+    deadline = start + args.duration
+    tasks = []
+    for i in range(users):
+        rng = random.Random(args.seed * 100003 + i)
+
+        async def start_learner(i=i, rng=rng):
+            # Stagger arrivals over the ramp-up
+            await asyncio.sleep(args.ramp * i / max(users, 1))
+            await learner(client, rec, f"load_{users}_{i}", args, deadline, rng)
+        tasks.append(asyncio.create_task(start_learner()))
+    for t in range(max(1, users // LEARNERS_PER_TEACHER)):
+        tasks.append(asyncio.create_task(teacher(client, rec, deadline, random.Random(args.seed - t))))
+    await asyncio.gather(*tasks)
+    return rec.report(time.monotonic() - start)
+
+
+def _print_level(users: int, report: Dict[str, Any]) -> None:
+    print(f"\n== {users} users ==")
+    print(f"{'endpoint':<26} {'reqs':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}")
+    for name, r in report.items():
+        print(
+            f"{name:<26} {r['requests']:>7} {r['rps']:>8.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+            f"{r['p99_ms']:>9.1f} {r['error_rate']:>8.1%}"
+        )
+
+
+@contextlib.contextmanager
+def _ephemeral_mongod():
+    """A throwaway local mongod; yields its connection string."""
+    try:
+        from pymongo_inmemory import Mongod
+    except ImportError:
+        raise SystemExit("--store memory needs pymongo_inmemory (pip install pymongo_inmemory)")
+    try:
+        mongod = Mongod(None)
+        mongod.start()
+    except Exception as e:
+        raise SystemExit(f"--store memory could not start a mongod: {e}")
+    try:
+        yield mongod.connection_string
+    finally:
+        mongod.stop()
+
+
+@contextlib.asynccontextmanager
+async def _in_process_client(args):
+    from app.db import mongo
+    from app.services import nlp_engine
+
+    async def stub_rephrase(req):
+        await asyncio.sleep(args.llm_ms / 1000)
+        return f"Simple: {req.question}", req.options
+
+    nlp_engine.rephrase_text = stub_rephrase
+
+    with contextlib.ExitStack() as stack:
+        if args.store == "memory":
+            mongo.MONGODB_URI = stack.enter_context(_ephemeral_mongod())
+        mongo.MONGODB_DB = LOADTEST_MONGODB_DB
+
+        from app.main import app
+
+        # Dropped before the lifespan's ensure_indexes, so the run measures
+        # the indexed collections (and the clientId dedup) the app relies on
+        db = await mongo.get_db()
+        await db.client.drop_database(LOADTEST_MONGODB_DB)
+        # The lifespan closes the Mongo client on exit, so clean up inside it
+        async with app.router.lifespan_context(app):
+            try:
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+                    yield client
+            finally:
+                await db.client.drop_database(LOADTEST_MONGODB_DB)
+
+
+async def main(args) -> Dict[str, Any]:
+    levels = [int(u) for u in args.users.split(",")]
+    results = {}
+    if args.url:
+        limits = httpx.Limits(max_connections=max(levels) + 10)
+        client_cm = httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits)
+    else:
+        client_cm = _in_process_client(args)
+    async with client_cm as client:
+        for users in levels:
+            report = await run_level(client, users, args)
+            _print_level(users, report)
+            results[str(users)] = report
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated classroom load test")
+    parser.add_argument("--users", default="10,50", help="Comma-separated concurrent learner counts")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per user level")
+    parser.add_argument("--ramp", type=float, default=5, help="Seconds to stagger learner arrivals over")
+    parser.add_argument("--think", type=float, default=3, help="Mean think time between next and submit (s)")
+    parser.add_argument("--progress-prob", type=float, default=0.2)
+    parser.add_argument("--rephrase-prob", type=float, default=0.1)
+    parser.add_argument("--tts-prob", type=float, default=0.05)
+    parser.add_argument("--llm-ms", type=float, default=800, help="Stub LLM latency (in-process only)")
+    parser.add_argument("--store", choices=["mongo", "memory"], default="mongo")
+    parser.add_argument("--url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Write the per-level results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.out}")
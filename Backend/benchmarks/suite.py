@@ -0,0 +1,355 @@
+"""
+Microbenchmark suite for the backend's hot functions.
+
+Every benchmark builds its inputs from fixed seeds, is calibrated to run for
+at least MIN_REPEAT_SECONDS per repeat, and reports the per-call median and
+minimum over the repeats.
+
+Usage (from Backend/):
+    python -m benchmarks.suite run [--out results.json] [--only build_features]
+    python -m benchmarks.suite compare base.json new.json [--threshold 0.10]
+
+`compare` exits 1 if any benchmark's median got slower by more than the
+threshold (a fraction, default 10%).
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SEED = 1234
+REPEATS = 5
+MIN_REPEAT_SECONDS = 0.1
+
+# name -> factory returning the zero-argument callable to time (or None to skip)
+BENCHMARKS: Dict[str, Callable[[], Optional[Callable[[], Any]]]] = {}
+
+
+def benchmark(name: str):
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+# ------------- INPUTS -------------
+
+def _interaction_logs(n: int, rng: random.Random) -> List[Dict[str, Any]]:
+    logs = []
+    for _ in range(n):
+        log = {
+            "isCorrect": rng.random() < 0.7,
+            "timeTaken": rng.randint(3, 120),
+            "difficultyRating": rng.choice([None, 1, 2, 3, 4, 5]),
+            "focusRating": rng.randint(1, 5),
+            "attentionScore": rng.random(),
+        }
+        if rng.random() < 0.3:
+            log["sentimentScore"] = rng.uniform(-1, 1)
+            log["confusionFlag"] = log["sentimentScore"] < -0.3
+        logs.append(log)
+    return logs
+
+
+FEEDBACK_TEXTS = [
+    "This was fun and easy!",
+    "I don't understand this question, it is confusing",
+    "too hard, I hate it",
+    "The picture was clear and I liked it",
+    "ok",
+]
+
+OLLAMA_RESPONSES = [
+    "Simplified: Find the word that goes with the picture.",
+    "Here's a simpler version: Pick the right word for the picture.",
+    "Match the picture to the correct word\nFind the word that fits the picture please",
+    "Match the picture to the correct word",
+]
+
+
+# ------------- BENCHMARKS -------------
+
+def _build_features(n: int):
+    from app.services.feature_builder import build_features
+
+    logs = _interaction_logs(n, random.Random(SEED))
+    return lambda: build_features(logs)
+
+
+@benchmark("build_features_10")
+def _bench_build_features_10():
+    return _build_features(10)
+
+
+@benchmark("build_features_50")
+def _bench_build_features_50():
+    return _build_features(50)
+
+
+@benchmark("build_features_500")
+def _bench_build_features_500():
+    return _build_features(500)
+
+
+def _training_chunk(users: int, rows_per_user: int) -> List[Dict[str, Any]]:
+    """One trainer chunk: each user's interactions together, in time order."""
+    logs = _interaction_logs(users * rows_per_user, random.Random(SEED))
+    for i, log in enumerate(logs):
+        log["userId"] = f"user{i // rows_per_user}"
+    return logs
+
+
+@benchmark("window_features_loop_5000")
+def _bench_window_features_loop():
+    """Training-row features one build_features call per row (the old trainer loop)."""
+    from app.services.feature_builder import build_features
+
+    logs = _training_chunk(100, 50)
+
+    def run():
+        history: List[Dict[str, Any]] = []
+        for log in logs:
+            if history and history[-1]["userId"] != log["userId"]:
+                history = []
+            build_features(history[-50:])
+            history.append(log)
+    return run
+
+
+@benchmark("window_features_columnar_5000")
+def _bench_window_features_columnar():
+    """The same 5000 rows of features in one build_window_features call (the trainer)."""
+    from app.services.feature_builder import build_window_features, columns_from_logs
+
+    logs = _training_chunk(100, 50)
+    return lambda: build_window_features(*columns_from_logs(logs), window=50)
+
+
+@benchmark("features_to_vector")
+def _bench_features_to_vector():
+    from app.services.feature_builder import build_features
+    from app.services.ml_engine import features_to_vector
+
+    features = build_features(_interaction_logs(50, random.Random(SEED)))
+    return lambda: features_to_vector(features)
+
+
+@benchmark("recommend_next")
+def _bench_recommend_next():
+    from app.services import ml_engine
+    from app.services.feature_builder import build_features
+
+    features = build_features(_interaction_logs(50, random.Random(SEED)))
+    ml_engine.load_models()
+    return lambda: ml_engine.recommend_next(features)
+
+
+@benchmark("analyze_feedback_keyword")
+def _bench_analyze_feedback_keyword():
+    from app.services import nlp_engine
+
+    def run():
+        for text in FEEDBACK_TEXTS:
+            nlp_engine._simple_sentiment_analysis(text)
+    return run
+
+
+@benchmark("analyze_feedback_transformer")
+def _bench_analyze_feedback_transformer():
+    from app.services import nlp_engine
+
+    if not (nlp_engine.TRANSFORMERS_AVAILABLE and nlp_engine._load_transformer()):
+        return None
+
+    def run():
+        for text in FEEDBACK_TEXTS:
+            nlp_engine.analyze_feedback(text)
+    return run
+
+
+@benchmark("get_next_activity_in_sequence")
+def _bench_next_in_sequence():
+    from app.data.activity_items import EXAMPLE_ACTIVITIES, get_next_activity_in_sequence
+
+    rng = random.Random(SEED)
+    m1 = [a.id for a in EXAMPLE_ACTIVITIES if a.moduleId == "M1"]
+    last_ids = [rng.choice(m1) for _ in range(10)]
+
+    def run():
+        for last_id in last_ids:
+            get_next_activity_in_sequence("M1", last_activity_id=last_id)
+    return run
+
+
+@benchmark("activity_item_serialize")
+def _bench_activity_item_serialize():
+    from app.data.activity_items import EXAMPLE_ACTIVITIES
+
+    item = EXAMPLE_ACTIVITIES[0]
+    dump = item.model_dump if hasattr(item, "model_dump") else item.dict
+    return lambda: dump()
+
+
+@benchmark("rephrase_postprocess")
+def _bench_rephrase_postprocess():
+    from app.services import nlp_engine
+
+    question = "Match the picture to the correct word"
+
+    def run():
+        for raw in OLLAMA_RESPONSES:
+            nlp_engine._clean_ollama_response(raw, question)
+    return run
+
+
+@benchmark("metrics_span")
+def _bench_metrics_span():
+    from app.services import metrics
+
+    def run():
+        with metrics.span("bench.noop"):
+            pass
+    return run
+
+
+@benchmark("metrics_histogram_observe")
+def _bench_metrics_histogram_observe():
+    from app.services import metrics
+
+    child = metrics.STAGE_SECONDS.labels("bench.observe")
+    return lambda: child.observe(0.0042)
+
+
+@benchmark("session_verify_token")
+def _bench_session_verify_token():
+    from app.services import sessions
+
+    token, _ = sessions.make_token("64b7f0c2e4b0a1a2b3c4d5e6")
+    return lambda: sessions.verify_token(token)
+
+
+# ------------- RUNNER -------------
+
+def _time(fn: Callable[[], Any]) -> Tuple[List[float], int]:
+    """Per-call seconds for each repeat, with the loop count calibrated to MIN_REPEAT_SECONDS."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_REPEAT_SECONDS:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(MIN_REPEAT_SECONDS / elapsed * 1.2))
+
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        timings.append((time.perf_counter() - start) / loops)
+    return timings, loops
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def run(only: Optional[str] = None) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for name, factory in BENCHMARKS.items():
+        if only and only not in name:
+            continue
+        random.seed(SEED)
+        np.random.seed(SEED)
+        fn = factory()
+        if fn is None:
+            results[name] = {"skipped": True}
+            print(f"{name:<32} skipped")
+            continue
+        # The code under test logs with print(); keep that off the report
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            fn()  # Warm-up (lazy loads, caches)
+            timings, loops = _time(fn)
+        results[name] = {
+            "median_s": statistics.median(timings),
+            "min_s": min(timings),
+            "loops": loops,
+            "repeats": REPEATS,
+        }
+        print(f"{name:<32} {results[name]['median_s'] * 1e6:>12.2f} us  (min {min(timings) * 1e6:.2f}, {loops} loops)")
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": SEED,
+        },
+        "results": results,
+    }
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float) -> List[str]:
+    """Print a comparison table. Returns the names that regressed beyond `threshold`."""
+    regressions = []
+    print(f"{'benchmark':<32} {'base us':>12} {'new us':>12} {'change':>8}")
+    for name, new_result in new["results"].items():
+        base_result = base["results"].get(name)
+        if not base_result or base_result.get("skipped") or new_result.get("skipped"):
+            print(f"{name:<32} {'-':>12} {'-':>12} {'n/a':>8}")
+            continue
+        change = new_result["median_s"] / base_result["median_s"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<32} {base_result['median_s'] * 1e6:>12.2f} {new_result['median_s'] * 1e6:>12.2f} "
+            f"{change:>+8.1%}{flag}"
+        )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backend microbenchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="Run the suite")
+    run_parser.add_argument("--out", help="Write results JSON here")
+    run_parser.add_argument("--only", help="Only benchmarks whose name contains this")
+    compare_parser = sub.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args.only)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"Results written to {args.out}")
+    else:
+        with open(args.base) as f:
+            base_report = json.load(f)
+        with open(args.new) as f:
+            new_report = json.load(f)
+        regressed = compare(base_report, new_report, args.threshold)
+        if regressed:
+            print(f"❌ {len(regressed)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.threshold:.0%}")
@@ -0,0 +1,133 @@
+"""
+The columnar feature builders agree with build_features.
+
+Run from Backend/:
+    python -m pytest tests
+"""
+
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.feature_builder import (  # noqa: E402
+    DEFAULT_FEATURES,
+    build_features,
+    build_features_columnar,
+    build_features_table,
+    build_window_features,
+    columns_from_logs,
+)
+
+# Every value the truthiness rules treat specially: missing, None, 0, False
+EDGE_LOGS = [
+    {"userId": "a"},
+    {"userId": "a", "isCorrect": True, "timeTaken": 0, "difficultyRating": None, "focusRating": 0,
+     "attentionScore": 0, "sentimentScore": 0.0, "confusionFlag": None},
+    {"userId": "a", "isCorrect": False, "timeTaken": None, "difficultyRating": 0, "focusRating": None,
+     "attentionScore": None, "sentimentScore": None, "confusionFlag": False},
+    {"userId": "a", "isCorrect": True, "timeTaken": 12.5, "difficultyRating": 4, "focusRating": 2,
+     "attentionScore": 0.5, "sentimentScore": -0.25, "confusionFlag": True},
+    {"userId": "b", "timeTaken": 0, "difficultyRating": 0, "focusRating": 0, "confusionFlag": False},
+    {"userId": None, "isCorrect": True, "timeTaken": 3},
+]
+
+
+def _random_logs(users: int, rng: random.Random):
+    logs = []
+    for user in range(users):
+        for _ in range(rng.randint(0, 60)):
+            log = {
+                "userId": f"u{user}",
+                "isCorrect": rng.choice([True, False, None]),
+                "timeTaken": rng.choice([None, 0, rng.randint(1, 120), rng.uniform(0, 60)]),
+                "difficultyRating": rng.choice([None, 0, 1, 2, 3, 4, 5]),
+                "focusRating": rng.choice([None, 0, 1, 3, 5]),
+                "attentionScore": rng.choice([None, 0, rng.random()]),
+            }
+            if rng.random() < 0.5:
+                log["sentimentScore"] = rng.choice([0.0, rng.uniform(-1, 1)])
+                log["confusionFlag"] = rng.choice([None, False, True])
+            logs.append(log)
+    return logs
+
+
+def _per_user(logs):
+    by_user = {}
+    for log in logs:
+        by_user.setdefault(log.get("userId"), []).append(log)
+    return by_user
+
+
+def _assert_features(columnar, index, expected, exact):
+    for name, value in expected.items():
+        if exact:
+            assert columnar[name][index] == value, name
+        else:
+            # Python >= 3.12 sums floats with compensation, so allow rounding
+            assert columnar[name][index] == pytest.approx(value, rel=1e-12, abs=1e-15), name
+
+
+def test_no_history_gives_the_defaults():
+    assert build_features([]) == DEFAULT_FEATURES
+    users, features = build_features_columnar(*columns_from_logs(EDGE_LOGS), users=["nobody"])
+    assert list(users) == ["nobody"]
+    _assert_features(features, 0, DEFAULT_FEATURES, exact=True)
+
+
+def test_columnar_matches_on_none_and_zero_values():
+    users, features = build_features_columnar(*columns_from_logs(EDGE_LOGS))
+    assert list(users) == ["a", "b", None]
+    for i, user in enumerate(users):
+        _assert_features(features, i, build_features(_per_user(EDGE_LOGS)[user]), exact=True)
+
+
+def test_columnar_matches_on_random_logs():
+    logs = _random_logs(200, random.Random(1234))
+    by_user = _per_user(logs)
+    users, features = build_features_columnar(*columns_from_logs(logs))
+    assert len(users) == len(by_user)
+    for i, user in enumerate(users):
+        _assert_features(features, i, build_features(by_user[user]), exact=False)
+
+
+def test_window_features_match_the_per_row_loop():
+    logs = EDGE_LOGS + _random_logs(40, random.Random(99))
+    window = 7
+    features = build_window_features(*columns_from_logs(logs), window=window)
+    for row, log in enumerate(logs):
+        history = [h for h in logs[max(0, row - window):row] if h.get("userId") == log.get("userId")]
+        _assert_features(features, row, build_features(history), exact=False)
+
+
+def test_window_features_after_start_use_earlier_rows_as_history():
+    logs = _random_logs(5, random.Random(5))
+    user_ids, columns = columns_from_logs(logs)
+    whole = build_window_features(user_ids, columns, window=10)
+    tail = build_window_features(user_ids, columns, window=10, start=len(logs) // 2)
+    for name, values in tail.items():
+        assert np.array_equal(values, whole[name][len(logs) // 2:]), name
+
+
+def test_table_matches_columns():
+    pa = pytest.importorskip("pyarrow")
+    logs = EDGE_LOGS + _random_logs(20, random.Random(7))
+    fields = ("userId", "isCorrect", "timeTaken", "difficultyRating", "focusRating",
+              "attentionScore", "sentimentScore", "confusionFlag")
+    table = pa.table({
+        field: pa.array(
+            [None if log.get(field) is None else float(log[field]) if field != "userId" else log[field]
+             for log in logs],
+            type=pa.string() if field == "userId" else pa.float64(),
+        )
+        for field in fields
+    })
+    table_users, from_table = build_features_table(table)
+    users, from_columns = build_features_columnar(*columns_from_logs(logs))
+    assert list(table_users) == list(users)
+    for name, values in from_columns.items():
+        assert np.array_equal(from_table[name], values), name
@@ -0,0 +1,70 @@
+"""
+Every named repository query must be answerable from an index.
+
+Explains each entry of repository.QUERIES, COUNTS and AGGREGATIONS against
+the MongoDB at MONGODB_URI, in the scratch database TEST_MONGODB_DB (created
+with the app's indexes, dropped afterwards). Skipped when no server answers.
+
+Run from Backend/:
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from pymongo.errors import PyMongoError  # noqa: E402
+
+from app.db import mongo, repository  # noqa: E402
+
+TEST_MONGODB_DB = os.getenv("TEST_MONGODB_DB", "neuro_learn_index_test")
+
+
+def _sample_docs():
+    """One document per queried collection, so the planner explains real plans, not EOF."""
+    return {
+        "interactions": {"userId": "sample", "clientId": "sample", "isCorrect": True, "confusionFlag": False,
+                         "difficultyRating": 3, "activityId": "M1_L1_Q1", "sentimentPending": True,
+                         "feedbackText": "sample", "timestamp": datetime.utcnow()},
+        "ml_predictions": {"userId": "sample", "actual_outcome": None, "timestamp": datetime.utcnow()},
+        "nlp_analyses": {"userId": "sample", "timestamp": datetime.utcnow()},
+        "users": {"email": "sample@example.com"},
+        "user_progress": {"_id": "sample", "attempts": 0},
+        "model_metrics": {"model_version": "sample", "userId": None, "updated_at": datetime.utcnow()},
+        "sketches": {"_id": "2000-01-01:M1", "day": "2000-01-01", "moduleId": "M1"},
+    }
+
+
+async def _uncovered():
+    client = AsyncIOMotorClient(mongo.MONGODB_URI, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f"No MongoDB at {mongo.MONGODB_URI}: {e}")
+
+    # ensure_indexes and get_db go through the shared client
+    mongo._client = client
+    mongo.MONGODB_DB = TEST_MONGODB_DB
+    db = client[TEST_MONGODB_DB]
+    try:
+        await client.drop_database(TEST_MONGODB_DB)
+        await mongo.ensure_indexes()
+        for collection, doc in _sample_docs().items():
+            await db[collection].insert_one(doc)
+        return await repository.check_index_coverage(db)
+    finally:
+        await client.drop_database(TEST_MONGODB_DB)
+        mongo.close_client()
+
+
+def test_every_query_uses_an_index():
+    uncovered = asyncio.run(_uncovered())
+    assert uncovered == [], f"Collection scans in: {', '.join(uncovered)}"
@@ -0,0 +1,172 @@
+"""
+Session tokens, the profile cache behind them, and the routes that trust them.
+
+Profiles are served from a dict in place of the users collection, so no
+MongoDB is needed.
+
+Run from Backend/:
+    python -m pytest tests
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from bson import ObjectId
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI, HTTPException  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.db import repository  # noqa: E402
+from app.db.mongo import get_db  # noqa: E402
+from app.routes import progress  # noqa: E402
+from app.services import sessions  # noqa: E402
+from app.services.sessions import (  # noqa: E402
+    InvalidToken,
+    ProfileCache,
+    UserProfile,
+    _b64decode,
+    _b64encode,
+    make_token,
+    optional_user,
+    verify_token,
+)
+
+USER_ID = str(ObjectId())
+OTHER_ID = str(ObjectId())
+
+
+@pytest.fixture
+def users(monkeypatch):
+    """user id -> users document, and the list of ids looked up."""
+    docs = {USER_ID: {"neuroFlags": ["ADHD"], "neuroType": "ADHD"}}
+    lookups = []
+
+    async def user_profile(db, user_id):
+        lookups.append(str(user_id))
+        return docs.get(str(user_id))
+
+    monkeypatch.setattr(repository, "user_profile", user_profile)
+    return docs, lookups
+
+
+def _tampered(token: str) -> str:
+    """The same token with its payload naming someone else, signature kept."""
+    payload, _, signature = token.partition(".")
+    claims = json.loads(_b64decode(payload))
+    claims["sub"] = OTHER_ID
+    return f"{_b64encode(json.dumps(claims).encode('utf-8'))}.{signature}"
+
+
+def _check(authorization: str):
+    return asyncio.run(optional_user(authorization, db=None))
+
+
+# ------------- TOKENS -------------
+
+def test_valid_token_names_its_user():
+    token, _ = make_token(USER_ID)
+    assert verify_token(token) == USER_ID
+
+
+def test_tampered_token_is_rejected():
+    token, _ = make_token(USER_ID)
+    with pytest.raises(InvalidToken, match="bad signature"):
+        verify_token(_tampered(token))
+    with pytest.raises(InvalidToken, match="bad signature"):
+        verify_token(token[:-2] + ("AA" if not token.endswith("AA") else "BB"))
+    with pytest.raises(HTTPException) as e:
+        _check(f"Bearer {_tampered(token)}")
+    assert e.value.status_code == 401
+
+
+def test_expired_token_is_rejected():
+    token, expires_at = make_token(USER_ID, ttl=-1)
+    with pytest.raises(InvalidToken, match="expired"):
+        verify_token(token)
+    with pytest.raises(HTTPException) as e:
+        _check(f"Bearer {token}")
+    assert e.value.status_code == 401
+
+
+def test_no_header_means_no_user():
+    assert _check(None) is None
+
+
+# ------------- PROFILE CACHE -------------
+
+def test_profile_cache_hits_until_invalidated(users):
+    docs, lookups = users
+    cache = ProfileCache(max_entries=10, ttl=60)
+
+    assert asyncio.run(cache.get(None, USER_ID)).neuroFlags == ["ADHD"]
+    assert asyncio.run(cache.get(None, USER_ID)).neuroFlags == ["ADHD"]
+    assert lookups == [USER_ID]
+
+    docs[USER_ID] = {"neuroFlags": ["Dyslexia"], "neuroType": "Dyslexia"}
+    cache.invalidate(USER_ID)
+    assert asyncio.run(cache.get(None, USER_ID)).neuroFlags == ["Dyslexia"]
+    assert lookups == [USER_ID, USER_ID]
+
+
+def test_profile_cache_expires_and_forgets_deleted_users(users):
+    docs, lookups = users
+    cache = ProfileCache(max_entries=10, ttl=-1)  # Every entry is already stale
+
+    asyncio.run(cache.get(None, USER_ID))
+    asyncio.run(cache.get(None, USER_ID))
+    assert lookups == [USER_ID, USER_ID]
+
+    del docs[USER_ID]
+    assert asyncio.run(cache.get(None, USER_ID)) is None
+    assert len(cache) == 0
+
+
+def test_deleted_user_token_is_rejected(users, monkeypatch):
+    monkeypatch.setattr(sessions, "profile_cache", ProfileCache())
+    token, _ = make_token(OTHER_ID)  # Validly signed, but no such user
+    with pytest.raises(HTTPException) as e:
+        _check(f"Bearer {token}")
+    assert e.value.status_code == 401
+
+
+# ------------- ROUTES -------------
+
+@pytest.fixture
+def client(users, monkeypatch):
+    """The progress routes, with every progress record empty."""
+    async def no_db():
+        return None
+
+    async def empty_progress(db, user_id):
+        return {}
+
+    monkeypatch.setattr(sessions, "profile_cache", ProfileCache())
+    monkeypatch.setattr(progress, "get_user_progress", empty_progress)
+    app = FastAPI()
+    app.include_router(progress.router, prefix="/api")
+    app.dependency_overrides[get_db] = no_db
+    return TestClient(app)
+
+
+def test_session_cannot_read_another_users_progress(client):
+    token, _ = make_token(USER_ID)
+    auth = {"Authorization": f"Bearer {token}"}
+
+    assert client.get(f"/api/progress?userId={USER_ID}", headers=auth).status_code == 200
+    assert client.get(f"/api/progress?userId={OTHER_ID}", headers=auth).status_code == 403
+    assert client.get(f"/api/progress/modules?userId={OTHER_ID}", headers=auth).status_code == 403
+    assert client.post("/api/progress/bulk", json={"userIds": [USER_ID, OTHER_ID]}, headers=auth).status_code == 403
+
+
+def test_bad_tokens_are_refused_by_progress_routes(client):
+    token, _ = make_token(USER_ID)
+    expired, _ = make_token(USER_ID, ttl=-1)
+    for bad in (_tampered(token), expired):
+        response = client.get("/api/progress/modules", headers={"Authorization": f"Bearer {bad}"})
+        assert response.status_code == 401
+        assert response.headers["WWW-Authenticate"] == "Bearer"
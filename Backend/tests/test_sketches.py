@@ -0,0 +1,134 @@
+"""
+Accuracy and merge behaviour of the analytics sketches.
+
+Run from Backend/:
+    python -m pytest tests
+"""
+
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.sketches import HyperLogLog, SketchBucket, TDigest, _merge_docs  # noqa: E402
+
+QUANTILES = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+def _hll(values):
+    hll = HyperLogLog()
+    for v in values:
+        hll.add(str(v))
+    return hll
+
+
+def _digest(values):
+    digest = TDigest()
+    for v in values:
+        digest.add(float(v))
+    return digest
+
+
+def _assert_quantiles(digest, values):
+    # t-digest error is in rank, so compare the rank of each estimate
+    values = np.sort(values)
+    for q in QUANTILES:
+        estimate = digest.quantile(q)
+        rank = np.searchsorted(values, estimate) / len(values)
+        assert rank == pytest.approx(q, abs=0.01), q
+
+
+# ------------- HYPERLOGLOG -------------
+
+@pytest.mark.parametrize("n", [10, 1000, 50000])
+def test_hll_count_is_within_error(n):
+    # About 1.6% standard error at p=12; 5% is over three standard errors
+    assert _hll(range(n)).count() == pytest.approx(n, rel=0.05)
+
+
+def test_hll_ignores_repeats():
+    assert _hll(list(range(2000)) * 5).count() == _hll(range(2000)).count()
+
+
+def test_hll_merge_is_the_union():
+    a = _hll(range(0, 30000))
+    b = _hll(range(20000, 50000))
+    a.merge(b)
+    assert a.registers == _hll(range(50000)).registers
+    assert a.count() == pytest.approx(50000, rel=0.05)
+
+
+def test_hll_survives_a_round_trip():
+    hll = _hll(range(5000))
+    assert HyperLogLog(registers=hll.to_bytes()).count() == hll.count()
+
+
+# ------------- T-DIGEST -------------
+
+def test_tdigest_quantiles_match_numpy():
+    rng = np.random.default_rng(7)
+    values = rng.lognormal(mean=3, sigma=1, size=20000)
+    digest = _digest(values)
+    _assert_quantiles(digest, values)
+    assert digest.quantile(0.0) == pytest.approx(values.min())
+    assert digest.quantile(1.0) == pytest.approx(values.max())
+
+
+def test_tdigest_merge_matches_one_digest():
+    rng = np.random.default_rng(11)
+    parts = [rng.normal(loc, 5, size=3000) for loc in (10, 40, 25, 60)]
+    merged = TDigest()
+    for part in parts:
+        merged.merge(_digest(part))
+    values = np.concatenate(parts)
+    assert merged.total == len(values)
+    _assert_quantiles(merged, values)
+
+
+def test_tdigest_stays_compact():
+    digest = _digest(random.Random(3).random() for _ in range(50000))
+    assert len(digest.means) <= digest.compression
+
+
+def test_empty_tdigest_has_no_quantiles():
+    assert TDigest().quantile(0.5) is None
+    assert TDigest.from_doc(TDigest().to_doc()).quantile(0.5) is None
+
+
+# ------------- BUCKETS -------------
+
+def _interactions(n, rng):
+    return [
+        {
+            "userId": f"u{rng.randrange(400)}",
+            "activityId": f"M1_A{rng.randrange(30)}",
+            "timeTaken": rng.uniform(1, 120),
+            "attentionScore": rng.random() if rng.random() < 0.8 else None,
+        }
+        for _ in range(n)
+    ]
+
+
+def test_stored_buckets_merge_like_one_bucket():
+    rng = random.Random(42)
+    days = [_interactions(2000, rng) for _ in range(5)]
+    whole = SketchBucket()
+    docs = []
+    for interactions in days:
+        bucket = SketchBucket()
+        for interaction in interactions:
+            whole.add(interaction)
+            bucket.add(interaction)
+        docs.append(bucket.to_doc())
+
+    merged = _merge_docs(docs)
+    assert merged.count == whole.count == 10000
+    for field in ("userId", "activityId"):
+        assert merged.distinct[field].registers == whole.distinct[field].registers
+    times = [i["timeTaken"] for interactions in days for i in interactions]
+    assert merged.percentiles["timeTaken"].total == len(times)
+    _assert_quantiles(merged.percentiles["timeTaken"], times)
@@ -0,0 +1,54 @@
+"""
+The TTS disk cache keys audio by every setting that changes it.
+
+Synthesis is replaced by a function writing the settings into the file, so
+no speech engine is needed.
+
+Run from Backend/:
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.tts_cache import TTSCache, cache_key, file_name  # noqa: E402
+
+
+def _fake_synthesize(text, voice):
+    async def synthesize():
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        with os.fdopen(fd, "w") as f:
+            f.write(f"{text}|{voice}")
+        return path, "audio/wav"
+    return synthesize
+
+
+def _cached(cache, text, voice):
+    name = file_name(cache_key(text, 0.9, 1.0, 1.0, voice, "pyttsx3"), "audio/wav")
+    return asyncio.run(cache.get_or_create(name, _fake_synthesize(text, voice)))
+
+
+def test_voices_get_their_own_files(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=1024 * 1024)
+    default = _cached(cache, "pig", None)
+    other = _cached(cache, "pig", "english+f3")
+
+    assert default != other
+    assert Path(default).read_text() == "pig|None"
+    assert Path(other).read_text() == "pig|english+f3"
+    # A second request for the default voice is a hit on its own file
+    assert _cached(cache, "pig", None) == default
+    assert cache.hits == 1 and cache.misses == 2
+
+
+def test_key_covers_every_setting():
+    base = ("pig", 0.9, 1.0, 1.0, None, "pyttsx3")
+    keys = {cache_key(*base)}
+    for i, changed in enumerate(["cow", 1.2, 1.1, 0.5, "english+f3", "gtts"]):
+        keys.add(cache_key(*base[:i], changed, *base[i + 1:]))
+    assert len(keys) == 7
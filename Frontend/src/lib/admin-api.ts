@@ -43,12 +43,12 @@ export interface UserStat {
 
 export async function getMLLogs(userId?: string, limit: number = 50) {
   const url = userId 
-    ? `${BASE_URL}/api/admin/ml-logs?userId=${userId}&limit=${limit}`
-    : `${BASE_URL}/api/admin/ml-logs?limit=${limit}`;
+    ? `${BASE_URL}/api/admin/ml-logs?userId=${userId}&limit=${limit}&include=features`
+    : `${BASE_URL}/api/admin/ml-logs?limit=${limit}&include=features`;
   
   const res = await fetch(url);
   if (!res.ok) throw new Error('Failed to fetch ML logs');
-  return res.json() as Promise<{ total: number; logs: MLLog[] }>;
+  return res.json() as Promise<{ total: number; logs: MLLog[]; next_cursor: string | null }>;
 }
 
 export async function getNLPLogs(userId?: string, limit: number = 50) {
@@ -58,7 +58,7 @@ export async function getNLPLogs(userId?: string, limit: number = 50) {
   
   const res = await fetch(url);
   if (!res.ok) throw new Error('Failed to fetch NLP logs');
-  return res.json() as Promise<{ total: number; logs: NLPLog[] }>;
+  return res.json() as Promise<{ total: number; logs: NLPLog[]; next_cursor: string | null }>;
 }
 
 export async function getAccuracyTrends(userId?: string, days: number = 7) {
@@ -89,3 +89,20 @@ export async function getRecentActivity(limit: number = 20) {
   return res.json();
 }
 
+
+export type LiveEventType = 'interaction' | 'prediction' | 'nlp_analysis';
+
+// Push-based feed of new interactions/predictions/NLP analyses.
+// EventSource reconnects on its own and resumes via Last-Event-ID.
+// `onReset` fires when events were missed and a snapshot should be refetched.
+export function subscribeLiveFeed(
+  onEvent: (type: LiveEventType, data: Record<string, unknown>) => void,
+  onReset?: () => void,
+) {
+  const source = new EventSource(`${BASE_URL}/api/admin/live`);
+  (['interaction', 'prediction', 'nlp_analysis'] as LiveEventType[]).forEach((type) => {
+    source.addEventListener(type, (e) => onEvent(type, JSON.parse((e as MessageEvent).data)));
+  });
+  if (onReset) source.addEventListener('reset', onReset);
+  return () => source.close();
+}
@@ -33,6 +33,7 @@ export interface ActivityOption {
   label: string;           // What we show (text or emoji, like "Pig" or "🦋 🦋")
   isCorrect: boolean;      // true/false
   ttsText?: string;        // What TTS should say (plain text)
+  ttsAudioUrl?: string;    // Pre-rendered audio of ttsText, when the backend has it
   imageUrl?: string;       // If option is an image
   imageAlt?: string;       // Description of the image for screen readers/TTS
   tags?: string[];         // e.g. ["target", "distractor", "bird", "green"]
@@ -61,6 +62,7 @@ export interface ActivityItem {
   // What the student sees / hears
   instruction: string;        // Onscreen text: "Click the sad boy."
   instructionTts?: string;    // Spoken version (can be simpler)
+  instructionAudioUrl?: string; // Pre-rendered audio of instructionTts, when the backend has it
   stimulusImageUrl?: string;  // If there is a main picture
   stimulusImageAlt?: string; // What that image means in text
   stimulusEmoji?: string;     // For emoji-only stimuli if needed